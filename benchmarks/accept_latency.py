@@ -0,0 +1,336 @@
+"""台本どおりに画面を切り替えて、承認までの遅延と見逃しを測るシミュレーション
+
+    python benchmarks/accept_latency.py [--timelines 1000] [--seed 0] [--cpu-scale 1.0] [--max-p95-ms 1500]
+
+実際の Controller（threaded=False）に、偽の時計と偽の画面（クリックを受け取る）をつないで
+次の台本（タイムライン）を再生する。画面はコーパスの画像を状態ごとに 1 枚選んで返す。
+
+    lobby → in_queue（マッチング画面）→ ready_check（t に承認ボタンが出る）→ champ_select / lobby
+
+自動開始・自動停止をオンにし、Controller.step() を 1 ティックずつ呼んで、戻り値の待ち時間だけ
+偽の時計を進める。クリック後の確認（verify）もティックごとに偽の時計で進むので、実時間より速く終わる。
+ボタンが出てから --fade-ms 以内のクリックは無視される（フェードイン）。ボタンの外へのクリックや
+ボタンが出ていないときのクリックは誤クリックとして数える。--accept-window 秒以内に受け付けられた
+クリックが無ければ見逃し（missed）とする。
+
+照合などの実際の処理時間は --cpu-scale 倍して偽の時計に加える（0 なら処理時間を含めない決定的な結果）。
+ボタンが出てから最初のクリックまで・受け付けられたクリックまでの遅延 (p50/p95/p99)、
+スキャン数（偽の時計・実時間あたり）、見逃しと誤クリックの数を JSON に保存する。
+見逃し・誤クリックがあるか、受け付けまでの p95 が --max-p95-ms を超えたら終了コード 1 を返す。
+画面もマウスも使わないので、ディスプレイの無い Linux でも動く。
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import make_corpus
+import numpy as np
+from run_benchmarks import (
+    BENCH_DIR,
+    OFFLINE_OVERRIDES,
+    create_auto_accept,
+    git_version,
+    load_corpus,
+    percentiles,
+)
+
+from capture import Frame
+from capture_backends import CaptureBackend
+from config_utils import get_section
+
+
+class FakeClock:
+    """偽の時計。sleep は待たずに時刻を進める
+
+    running() の間は実際の経過時間を cpu_scale 倍して時刻に加える（照合などの処理時間）。
+    """
+
+    def __init__(self, cpu_scale=1.0):
+        self.cpu_scale = cpu_scale
+        self.offset = 0.0
+        self.resumed = None
+
+    def monotonic(self):
+        now = self.offset
+        if self.resumed is not None:
+            now += (time.perf_counter() - self.resumed) * self.cpu_scale
+        return now
+
+    def sleep(self, seconds):
+        self.offset += max(0.0, seconds)
+
+    def running(self):
+        return _Running(self)
+
+
+class _Running:
+    def __init__(self, clock):
+        self.clock = clock
+
+    def __enter__(self):
+        self.clock.resumed = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.clock.offset = self.clock.monotonic()
+        self.clock.resumed = None
+
+
+class Timeline:
+    """1 回のキューの台本。時刻は偽の時計の絶対時刻（秒）"""
+
+    def __init__(self, resolution, start, queue_at, pop_at, fade_sec, window_sec, images, button):
+        self.resolution = resolution
+        self.start = start
+        self.queue_at = queue_at
+        self.pop_at = pop_at
+        # この時刻より前のクリックはフェードイン中として無視される
+        self.clickable_at = pop_at + fade_sec
+        self.expires_at = pop_at + window_sec
+        # 状態ごとの画像（BGR）と、ready_check の画像での承認ボタンの位置 (x0, y0, x1, y1)
+        self.images = images
+        self.button = button
+        self.clicks = []
+        self.accepted_at = None
+        self.false_clicks = 0
+
+    def state(self, now):
+        if now < self.queue_at:
+            return 'lobby'
+        if now < self.pop_at:
+            return 'in_queue'
+        if self.accepted_at is not None:
+            return 'champ_select'
+        if now < self.expires_at:
+            return 'ready_check'
+        # 受け付け時間が過ぎたらロビーに戻される
+        return 'lobby'
+
+    def click(self, now, point):
+        if self.state(now) != 'ready_check':
+            self.false_clicks += 1
+            return
+        x0, y0, x1, y1 = self.button
+        if not (x0 <= point[0] < x1 and y0 <= point[1] < y1):
+            self.false_clicks += 1
+            return
+        self.clicks.append(now)
+        if now >= self.clickable_at:
+            self.accepted_at = now
+
+
+class SimulatedScreen(CaptureBackend):
+    """タイムラインの状態に応じた画像を返し、クリックをタイムラインに渡す"""
+
+    name = 'simulated'
+
+    def __init__(self, clock, ring_size=3):
+        super().__init__(ring_size)
+        self.clock = clock
+        self.timeline = None
+        self.grabs = 0
+
+    def grab(self):
+        image = self.timeline.images[self.timeline.state(self.clock.monotonic())]
+        self.grabs += 1
+        slot = self.ring.next_slot()
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=slot.buffer('rgb', image.shape)).view()
+        return Frame(rgb, slot=slot)
+
+    def click(self, point):
+        self.timeline.click(self.clock.monotonic(), point)
+
+
+def locate_button(image, template):
+    """合成画面での承認ボタンの位置（正解）。make_corpus と同じ倍率で照合する"""
+    scale = image.shape[0] / make_corpus.BASE_HEIGHT
+    size = (round(template.shape[1] * scale), round(template.shape[0] * scale))
+    scaled = cv2.resize(template, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    scores = cv2.matchTemplate(image, scaled, cv2.TM_CCOEFF_NORMED)
+    _, _, _, (x, y) = cv2.minMaxLoc(scores)
+    return (x, y, x + size[0], y + size[1])
+
+
+def load_screens(corpus, resolutions):
+    """{解像度: {状態: [BGR 画像, ...]}} と、{解像度: [ready_check の画像ごとのボタンの位置, ...]}"""
+    manifest, frames = load_corpus(corpus)
+    template = make_corpus.load_template('accept_button.png')
+    screens = {}
+    buttons = {}
+    for entry, image in frames:
+        if resolutions and entry['resolution'] not in resolutions:
+            continue
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        states = screens.setdefault(entry['resolution'], {})
+        states.setdefault(entry['state'], []).append(image)
+        if entry['state'] == 'ready_check':
+            buttons.setdefault(entry['resolution'], []).append(locate_button(image, template))
+    if not screens:
+        raise SystemExit(f"解像度 {', '.join(resolutions)} のフレームがありません")
+    return screens, buttons
+
+
+def make_timeline(rng, start, screens, buttons, args):
+    resolution = sorted(screens)[int(rng.integers(len(screens)))]
+    states = screens[resolution]
+    choice = {state: int(rng.integers(len(states[state])))
+              for state in ('lobby', 'in_queue', 'ready_check', 'champ_select')}
+    images = {state: states[state][index] for state, index in choice.items()}
+    queue_at = start + rng.uniform(*args.lobby_sec)
+    pop_at = queue_at + rng.uniform(*args.queue_sec)
+    fade_sec = rng.uniform(0, args.fade_ms / 1000)
+    return Timeline(resolution, start, queue_at, pop_at, fade_sec, args.accept_window, images,
+                    buttons[resolution][choice['ready_check']])
+
+
+def simulate(controller, screen, clock, timeline):
+    """タイムラインを最後まで再生し、ティック数を返す"""
+    ticks = 0
+    idle_sec = controller.scheduler.intervals['idle']
+    while clock.monotonic() < timeline.expires_at and timeline.accepted_at is None:
+        with clock.running():
+            delay = controller.step()
+        ticks += 1
+        # 検出器が無い（自動開始の設定待ち）ときも、待機中の間隔で時計を進める
+        clock.sleep(idle_sec if delay is None else delay)
+    return ticks
+
+
+def run(corpus, args):
+    screens, buttons = load_screens(corpus, args.resolution)
+    from controller import Controller
+
+    clock = FakeClock(args.cpu_scale)
+    auto_accept = create_auto_accept(corpus, None, overrides=OFFLINE_OVERRIDES)
+    auto_accept.capture.close()
+    screen = SimulatedScreen(clock, get_section(auto_accept.config, 'capture')['ring_size'])
+    auto_accept.capture = screen
+    # スケジューラとクリック後の確認を偽の時計で動かす
+    auto_accept.scheduler.clock = clock.monotonic
+    auto_accept.verifier.clock = clock.monotonic
+    controller = Controller(auto_accept, threaded=False)
+    controller.set_options(auto_start=True, auto_stop=True)
+
+    rng = np.random.default_rng(args.seed)
+    first_click_ms = []
+    accept_ms = []
+    by_resolution = {}
+    missed = 0
+    false_clicks = 0
+    retried = 0
+    ticks = 0
+    started = time.perf_counter()
+    sim_start = clock.monotonic()
+    for _ in range(args.timelines):
+        timeline = make_timeline(rng, clock.monotonic(), screens, buttons, args)
+        screen.timeline = timeline
+        ticks += simulate(controller, screen, clock, timeline)
+        false_clicks += timeline.false_clicks
+        if timeline.clicks:
+            first_click_ms.append((timeline.clicks[0] - timeline.pop_at) * 1000)
+            retried += len(timeline.clicks) > 1
+        if timeline.accepted_at is None:
+            missed += 1
+        else:
+            latency = (timeline.accepted_at - timeline.pop_at) * 1000
+            accept_ms.append(latency)
+            by_resolution.setdefault(timeline.resolution, []).append(latency)
+        # 次のキューは監視していない状態から始める（見逃した場合は監視中のまま残っている）
+        controller.stop(reason='simulation')
+    wall_sec = time.perf_counter() - started
+    sim_sec = clock.monotonic() - sim_start
+    auto_accept.close()
+
+    return {
+        'version': git_version(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'corpus': {'path': str(corpus), 'resolutions': sorted(screens)},
+        'timelines': args.timelines,
+        'seed': args.seed,
+        'cpu_scale': args.cpu_scale,
+        'accepted': len(accept_ms),
+        'missed': missed,
+        'false_clicks': false_clicks,
+        'retried': retried,
+        'first_click_ms': percentiles(first_click_ms),
+        'accept_ms': percentiles(accept_ms),
+        'accept_ms_by_resolution': {
+            resolution: percentiles(samples) for resolution, samples in sorted(by_resolution.items())
+        },
+        'scans': {
+            'ticks': ticks,
+            'grabs': screen.grabs,
+            'per_simulated_sec': round(ticks / sim_sec, 2) if sim_sec else None,
+            'per_wall_sec': round(ticks / wall_sec, 1) if wall_sec else None,
+        },
+        'simulated_sec': round(sim_sec, 1),
+        'wall_sec': round(wall_sec, 2),
+        'speedup': round(sim_sec / wall_sec, 1) if wall_sec else None,
+    }
+
+
+def seconds_range(value):
+    low, _, high = value.partition(',')
+    return (float(low), float(high or low))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=str(make_corpus.DEFAULT_CORPUS))
+    parser.add_argument('--resolution', action='append', default=None,
+                        help='使う解像度（複数指定可。省略時はコーパスのすべて）')
+    parser.add_argument('--timelines', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lobby-sec', type=seconds_range, default=(0.5, 5.0), help='キューに入るまで（最小,最大）')
+    parser.add_argument('--queue-sec', type=seconds_range, default=(1.0, 20.0), help='マッチングの時間（最小,最大）')
+    parser.add_argument('--fade-ms', type=float, default=150.0, help='ボタンのフェードインの最大時間')
+    parser.add_argument('--accept-window', type=float, default=7.0, help='承認を受け付ける秒数')
+    parser.add_argument('--cpu-scale', type=float, default=1.0, help='実際の処理時間を偽の時計に加える倍率')
+    parser.add_argument('--max-p95-ms', type=float, default=1500.0, help='受け付けまでの p95 の予算')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    result = run(Path(args.corpus), args)
+    print(f"{result['timelines']} タイムライン: 承認 {result['accepted']}, 見逃し {result['missed']}, "
+          f"誤クリック {result['false_clicks']}, 再クリック {result['retried']}")
+    for key in ('first_click_ms', 'accept_ms'):
+        stats = result[key]
+        if stats:
+            print(f"{key:15} p50={stats['p50']:.0f}ms p95={stats['p95']:.0f}ms p99={stats['p99']:.0f}ms "
+                  f"max={stats['max']:.0f}ms")
+    scans = result['scans']
+    print(f"スキャン {scans['ticks']} 回: {scans['per_simulated_sec']}/秒（偽の時計）, "
+          f"{scans['per_wall_sec']}/秒（実時間）, {result['simulated_sec']}秒を {result['wall_sec']}秒で再生 "
+          f"(x{result['speedup']})")
+
+    failures = []
+    if result['missed']:
+        failures.append(f"見逃し {result['missed']} 回")
+    if result['false_clicks']:
+        failures.append(f"誤クリック {result['false_clicks']} 回")
+    p95 = result['accept_ms'].get('p95')
+    if p95 is not None and p95 > args.max_p95_ms:
+        failures.append(f"受け付けまでの p95 {p95}ms > {args.max_p95_ms}ms")
+    result['budget'] = {'accept_p95_ms': args.max_p95_ms}
+    result['failures'] = failures
+
+    output = Path(args.output) if args.output else (
+        BENCH_DIR / 'results' / f"accept-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=4), encoding='utf-8')
+    print(f"結果を保存しました: {output}")
+    if failures:
+        sys.exit("予算を超えました: " + "; ".join(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""全解像度マッチングとピラミッドマッチングの速度比較
+
+    python benchmarks/bench_matcher.py [--repeat 20]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from config_utils import load_config
+from lol_auto_accept import PyramidMatcher
+from templates import TemplateRegistry
+
+SCREENS = [(1280, 720), (1920, 1080), (2560, 1440), (3840, 2160)]
+
+
+def synthetic_frame(width, height, needle, rng):
+    """ぼかしたノイズの背景にテンプレートを埋め込んだフレーム"""
+    frame = rng.integers(20, 120, (height, width), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (7, 7), 0)
+    x = int(rng.integers(0, width - needle.shape[1]))
+    y = int(rng.integers(0, height - needle.shape[0]))
+    frame[y:y + needle.shape[0], x:x + needle.shape[1]] = needle
+    return frame, (x, y)
+
+
+def baseline(frame, template, confidence, scales):
+    """従来方式: 全解像度で倍率ごとに照合"""
+    for scale in scales:
+        needle = template.scaled(scale)
+        result = cv2.matchTemplate(frame, needle, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(result)
+        if score >= confidence:
+            return loc
+    return None
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    config = load_config()
+    confidence = config['template_matching']['confidence']
+    scales = config['template_matching'].get('scales', [1.0])
+    registry = TemplateRegistry(config, str(Path(__file__).resolve().parent.parent))
+    template = registry.get('accept_button')
+    matcher = PyramidMatcher(levels=config['template_matching'].get('pyramid_levels', 2))
+    rng = np.random.default_rng(0)
+
+    print(f"{'screen':>10} {'scale':>6} {'full(ms)':>9} {'pyramid(ms)':>12} {'speedup':>8} found")
+    for width, height in SCREENS:
+        # クライアント解像度はおおよそ画面解像度に合わせて拡縮される想定
+        scale = min(scales, key=lambda s: abs(s - height / 720))
+        frame, expected = synthetic_frame(width, height, template.scaled(scale), rng)
+        full_ms, _ = timed(lambda frame=frame: baseline(frame, template, confidence, scales), args.repeat)
+        pyr_ms, result = timed(lambda frame=frame: matcher.match(frame, template, confidence, scales), args.repeat)
+        found = result.box is not None and (result.box.left, result.box.top) == expected
+        print(f"{width}x{height:<5} {scale:>6} {full_ms:>9.1f} {pyr_ms:>12.1f} {full_ms / pyr_ms:>7.1f}x {found}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""常駐デーモンの待機中の RSS と CPU 使用率を予算と比べる
+
+    python benchmarks/idle_budget.py [--seconds 30] [--resolution 1920x1080] [--max-rss-mb 250] [--max-cpu-percent 1.0]
+
+デーモン（daemon.ControlServer と Controller）を子プロセスで起動し、キャプチャはコーパスのロビー画面
+（承認ボタンもマッチング画面も写っていない）をメモリから返す（memory_report.MemoryBackend。
+PNG のデコードは含めない）。daemon_client で接続し、次の状態で status の cpu_sec・rss_kb・captures を
+--seconds の前後で取って比べる。
+
+    idle:     監視も自動開始もオフ。キャプチャせず、設定ファイルの確認だけで起きる
+    armed:    自動開始だけオン。template_matching.interval_sec ごとにキャプチャしてマッチング画面を探す。
+              画面は 1 枚のロビーのまま変わらない（放置したデスクトップ）
+    changing: armed と同じだが、毎回異なるロビー画面を返す（変化検出で照合を省略できない最悪の場合）
+
+RSS か CPU 使用率が予算を超えたら終了コード 1 を返す。
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import make_corpus
+from run_benchmarks import (
+    BENCH_DIR,
+    OFFLINE_OVERRIDES,
+    create_auto_accept,
+    git_version,
+    load_corpus,
+)
+
+from config_utils import get_section
+from daemon import ControlServer
+from daemon_client import ControlClient, read_authkey
+
+IDLE = {'auto_start': False, 'auto_stop': False}
+ARMED = {'auto_start': True, 'auto_stop': True}
+# (状態, 設定, 全フレームを使うか)。フレームの組ごとに子プロセスを分ける
+STATES = [
+    ('idle', IDLE, False),
+    ('armed', ARMED, False),
+    ('changing', ARMED, True),
+]
+
+
+def serve(address, key_path, frames):
+    """子プロセス側: リプレイキャプチャのデーモンを起動し、shutdown されるまで待つ"""
+    from memory_report import MemoryBackend
+
+    from controller import Controller
+
+    # 利用者の履歴に再生したイベントを書き込まない
+    auto_accept = create_auto_accept(frames, None, overrides=OFFLINE_OVERRIDES)
+    images = [cv2.imread(str(path)) for path in sorted(frames.glob('*.png'))]
+    auto_accept.capture.close()
+    auto_accept.capture = MemoryBackend(images, get_section(auto_accept.config, 'capture')['ring_size'])
+    controller = Controller(auto_accept)
+    server = ControlServer(controller, address, key_path)
+    server.start()
+    try:
+        controller.exited.wait()
+    finally:
+        server.close()
+
+
+def lobby_frames(corpus, resolution, directory, count):
+    """指定した解像度のロビー画面を count 枚まで directory に写す"""
+    manifest, _ = load_corpus(corpus)
+    files = [entry['file'] for entry in manifest['frames']
+             if entry['state'] == 'lobby' and entry['resolution'] == resolution][:count]
+    if not files:
+        raise SystemExit(f"解像度 {resolution} のロビー画面がありません")
+    for name in files:
+        shutil.copy(corpus / name, directory / name)
+    return len(files)
+
+
+def connect(address, key_path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return ControlClient(address, read_authkey(key_path))
+        except (OSError, EOFError):
+            if time.monotonic() > deadline:
+                raise SystemExit("デーモンに接続できません") from None
+            time.sleep(0.2)
+
+
+def measure(client, seconds):
+    before = client.request('status')
+    start = time.monotonic()
+    time.sleep(seconds)
+    after = client.request('status')
+    elapsed = time.monotonic() - start
+    return {
+        'seconds': round(elapsed, 2),
+        'cpu_percent': round((after['cpu_sec'] - before['cpu_sec']) / elapsed * 100, 3),
+        'rss_mb': round(after['rss_kb'] / 1024, 1) if after['rss_kb'] is not None else None,
+        'captures': after['captures'] - before['captures'],
+        'detectors': after['detectors'],
+    }
+
+
+def start_daemon(workdir, frames):
+    if sys.platform == 'win32':
+        address = rf'\\.\pipe\lol_auto_accept_bench_{os.getpid()}_{frames.name}'
+    else:
+        address = str(workdir / f'{frames.name}.sock')
+    key_path = workdir / f'{frames.name}.key'
+    child = subprocess.Popen([sys.executable, __file__, '--child', '--address', address,
+                              '--key', str(key_path), '--frames', str(frames)])
+    client = connect(address, key_path)
+    while not client.request('status')['ready']:
+        time.sleep(0.2)
+    return child, client
+
+
+def stop_daemon(child, client):
+    try:
+        client.request('shutdown')
+        client.close()
+        child.wait(timeout=30)
+    finally:
+        if child.poll() is None:
+            child.kill()
+
+
+def run(corpus, resolution, seconds, settle):
+    workdir = Path(tempfile.mkdtemp(prefix='idle-budget-'))
+    frame_sets = {}
+    frame_counts = {}
+    for name, count in (('static', 1), ('changing', 10)):
+        frame_sets[name] = workdir / name
+        frame_sets[name].mkdir()
+        frame_counts[name] = lobby_frames(corpus, resolution, frame_sets[name], count)
+    states = {}
+    daemons = {}
+    try:
+        for name, options, changing in STATES:
+            frames = frame_sets['changing' if changing else 'static']
+            if frames not in daemons:
+                daemons[frames] = start_daemon(workdir, frames)
+            client = daemons[frames][1]
+            client.request('set_options', **options)
+            # 切り替え直後のテンプレートの読み込みや ROI の学習は含めない
+            time.sleep(settle)
+            states[name] = measure(client, seconds)
+    finally:
+        for child, client in daemons.values():
+            stop_daemon(child, client)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'version': git_version(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'corpus': {'path': str(corpus), 'frames': frame_counts, 'resolution': resolution},
+        'states': states,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=str(make_corpus.DEFAULT_CORPUS))
+    parser.add_argument('--resolution', default='1920x1080')
+    parser.add_argument('--seconds', type=float, default=30.0, help='各状態を測る時間')
+    parser.add_argument('--settle', type=float, default=3.0, help='状態を切り替えてから測り始めるまでの時間')
+    parser.add_argument('--max-rss-mb', type=float, default=250.0)
+    parser.add_argument('--max-idle-cpu-percent', type=float, default=0.2, help='idle（キャプチャなし）の予算')
+    parser.add_argument('--max-cpu-percent', type=float, default=1.0, help='armed（画面が変わらない）の予算')
+    parser.add_argument('--max-changing-cpu-percent', type=float, default=15.0, help='changing（毎回画面が変わる）の予算')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--address', help=argparse.SUPPRESS)
+    parser.add_argument('--key', help=argparse.SUPPRESS)
+    parser.add_argument('--frames', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        serve(args.address, args.key, Path(args.frames))
+        return
+
+    result = run(Path(args.corpus), args.resolution, args.seconds, args.settle)
+    budget = {'rss_mb': args.max_rss_mb, 'cpu_percent': {'idle': args.max_idle_cpu_percent,
+                                                         'armed': args.max_cpu_percent,
+                                                         'changing': args.max_changing_cpu_percent}}
+    result['budget'] = budget
+    failures = []
+    for name, state in result['states'].items():
+        print(f"{name:8} cpu={state['cpu_percent']:.3f}% rss={state['rss_mb']}MB "
+              f"captures={state['captures']} in {state['seconds']}s detectors={state['detectors']}")
+        if state['cpu_percent'] > budget['cpu_percent'][name]:
+            failures.append(f"{name}: CPU {state['cpu_percent']}% > {budget['cpu_percent'][name]}%")
+        if state['rss_mb'] is not None and state['rss_mb'] > budget['rss_mb']:
+            failures.append(f"{name}: RSS {state['rss_mb']}MB > {budget['rss_mb']}MB")
+    result['failures'] = failures
+
+    output = Path(args.output) if args.output else (
+        BENCH_DIR / 'results' / f"idle-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=4), encoding='utf-8')
+    print(f"結果を保存しました: {output}")
+    if failures:
+        sys.exit("予算を超えました: " + "; ".join(failures))
+
+
+if __name__ == '__main__':
+    main()
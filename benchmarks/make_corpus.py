@@ -0,0 +1,122 @@
+"""ベンチマーク用のラベル付きスクリーンショットコーパスを生成する
+
+    python benchmarks/make_corpus.py [--output benchmarks/corpus] [--per-state 10]
+
+実際のクライアント画面の代わりに、resources/ のテンプレートを合成した画面を作る。
+実機のスクリーンショットを使う場合は、同じ形式の manifest.json を書いて
+run_benchmarks.py の --corpus に渡せばよい。
+
+manifest.json の形式:
+    {"frames": [{"file": "0000_ready_check_1920x1080.png",
+                 "state": "ready_check",
+                 "resolution": "1920x1080",
+                 "labels": {"accept_button": true, "matching_screen": false}}]}
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CORPUS = Path(__file__).resolve().parent / 'corpus'
+
+# テンプレートは 1280x720 のクライアントから切り出したもの
+BASE_HEIGHT = 720
+RESOLUTIONS = [(1024, 576), (1280, 720), (1600, 900), (1920, 1080)]
+STATES = ['lobby', 'in_queue', 'ready_check', 'champ_select', 'in_game']
+
+
+def load_template(name):
+    path = ROOT / 'resources' / name
+    image = cv2.imdecode(np.fromfile(str(path), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        sys.exit(f"テンプレートを読み込めません: {path}")
+    return image
+
+
+def background(width, height, rng, tone):
+    """クライアントらしい暗めのグラデーションに矩形パネルを散らした背景"""
+    ramp = np.linspace(tone, tone + 40, width, dtype=np.float32)
+    image = np.repeat(ramp[None, :, None], height, axis=0).repeat(3, axis=2)
+    image += rng.normal(0, 6, image.shape).astype(np.float32)
+    for _ in range(int(rng.integers(6, 14))):
+        x0, y0 = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 20))
+        x1 = min(width, x0 + int(rng.integers(40, width // 3)))
+        y1 = min(height, y0 + int(rng.integers(20, height // 4)))
+        image[y0:y1, x0:x1] = rng.integers(10, 200, 3)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def paste(image, template, scale, x, y):
+    if scale != 1.0:
+        size = (round(template.shape[1] * scale), round(template.shape[0] * scale))
+        template = cv2.resize(template, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    h, w = template.shape[:2]
+    image[y:y + h, x:x + w] = template
+
+
+def render(state, width, height, templates, rng):
+    tone = {'lobby': 20, 'in_queue': 20, 'ready_check': 20, 'champ_select': 50, 'in_game': 80}[state]
+    image = background(width, height, rng, tone)
+    scale = height / BASE_HEIGHT
+    labels = {'accept_button': False, 'matching_screen': False}
+    if state in ('in_queue', 'ready_check'):
+        # マッチング中の表示はクライアント右上付近
+        x = int(width * 0.70 + rng.integers(-8, 8))
+        y = int(height * 0.02 + rng.integers(0, 6))
+        paste(image, templates['matching_screen'], scale, x, y)
+        labels['matching_screen'] = True
+    if state == 'ready_check':
+        # レディチェックは画面を暗くしたうえで中央下に承認ボタンを出す
+        image = (image * 0.4).astype(np.uint8)
+        w = round(templates['accept_button'].shape[1] * scale)
+        x = (width - w) // 2 + int(rng.integers(-4, 4))
+        y = int(height * 0.72 + rng.integers(-4, 4))
+        paste(image, templates['accept_button'], scale, x, y)
+        labels['accept_button'] = True
+    return image, labels
+
+
+def generate(output, per_state=10, seed=0):
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    templates = {
+        'accept_button': load_template('accept_button.png'),
+        'matching_screen': load_template('matching.png'),
+    }
+    frames = []
+    index = 0
+    for width, height in RESOLUTIONS:
+        for state in STATES:
+            for _ in range(per_state):
+                image, labels = render(state, width, height, templates, rng)
+                name = f"{index:04d}_{state}_{width}x{height}.png"
+                cv2.imwrite(str(output / name), image)
+                frames.append({
+                    'file': name,
+                    'state': state,
+                    'resolution': f"{width}x{height}",
+                    'labels': labels,
+                })
+                index += 1
+    manifest = {'synthetic': True, 'seed': seed, 'frames': frames}
+    (output / 'manifest.json').write_text(json.dumps(manifest, indent=4), encoding='utf-8')
+    print(f"{len(frames)} フレームを生成しました: {output}")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=str(DEFAULT_CORPUS))
+    parser.add_argument('--per-state', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.output, args.per_state, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""スキャンを繰り返したときのメモリ使用量のレポート
+
+    python benchmarks/memory_report.py [--scans 10000] [--resolution 1920x1080] [--ring-size 3]
+
+コーパスの画像をメモリに読み込み、キャプチャ方式と同じ手順（色変換をフレームリングに書き込む）で
+フレームを作って、パイプラインの 1 ティックと同じく承認ボタンとマッチング画面を照合する。
+tracemalloc で 1 スキャンあたりの一時的な確保量（ピーク）と、全体での増加量を測り、
+一定間隔で RSS を記録する。--ring-size 0 で毎回確保する場合と比較できる。
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import make_corpus
+import run_benchmarks
+from run_benchmarks import (
+    BENCH_DIR,
+    DETECTORS,
+    create_auto_accept,
+    git_version,
+    load_corpus,
+    percentiles,
+)
+
+from capture import Frame
+from capture_backends import CaptureBackend
+
+
+class MemoryBackend(CaptureBackend):
+    """読み込み済みの画像を順に返す。BGR→RGB の変換はリングの枠に書き込む（mss と同じ手順）"""
+
+    name = 'memory'
+
+    def __init__(self, images, ring_size=3):
+        super().__init__(ring_size)
+        self.images = images
+        self.position = 0
+
+    def grab(self):
+        image = self.images[self.position % len(self.images)]
+        self.position += 1
+        slot = self.ring.next_slot()
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=slot.buffer('rgb', image.shape)).view()
+        return Frame(rgb, slot=slot)
+
+    def click(self, point):
+        pass
+
+
+def current_rss_kb():
+    """現在の RSS。/proc が無い環境では最大 RSS で代用する"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        import resource
+        return pages * resource.getpagesize() // 1024
+    except (OSError, ImportError):
+        return run_benchmarks.max_rss_kb()
+
+
+def run(corpus, scans, resolution, ring_size, interval):
+    manifest, frames = load_corpus(corpus)
+    images = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for entry, image in frames
+              if resolution is None or entry['resolution'] == resolution]
+    # 対象外の解像度の画像は RSS に含めないよう手放す
+    del frames
+    if not images:
+        raise SystemExit(f"解像度 {resolution} のフレームがありません")
+    auto_accept = create_auto_accept(corpus, None)
+    auto_accept.capture.close()
+    auto_accept.capture = MemoryBackend(images, ring_size)
+
+    def scan():
+        frame = auto_accept.grab_frame()
+        auto_accept.detect_all(frame, DETECTORS)
+
+    # バッファやテンプレートのキャッシュが一通り確保されるまで回してから測る
+    for _ in range(len(images) * 2):
+        scan()
+
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    start_traced = tracemalloc.get_traced_memory()[0]
+    per_scan_kb = []
+    rss_samples = [current_rss_kb()]
+    start = time.perf_counter()
+    for i in range(1, scans + 1):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        scan()
+        per_scan_kb.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+        if i % interval == 0:
+            rss_samples.append(current_rss_kb())
+    elapsed = time.perf_counter() - start
+    end_traced = tracemalloc.get_traced_memory()[0]
+    growth = tracemalloc.take_snapshot().compare_to(baseline, 'lineno')
+    tracemalloc.stop()
+
+    return {
+        'version': git_version(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'corpus': {'path': str(corpus), 'frames': len(images), 'resolution': resolution},
+        'scans': scans,
+        'ring_size': ring_size,
+        'scan_ms_mean': round(elapsed * 1000 / scans, 3),
+        'per_scan_peak_kb': percentiles(per_scan_kb),
+        'traced_growth_kb': round((end_traced - start_traced) / 1024, 1),
+        'rss_kb': {
+            'samples': rss_samples,
+            'first': rss_samples[0],
+            'last': rss_samples[-1],
+            'min': min(rss_samples),
+            'max': max(rss_samples),
+        },
+        'top_growth': [
+            {'location': str(stat.traceback), 'size_kb': round(stat.size_diff / 1024, 1), 'count': stat.count_diff}
+            for stat in growth[:5]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=str(make_corpus.DEFAULT_CORPUS))
+    parser.add_argument('--scans', type=int, default=10000)
+    parser.add_argument('--resolution', default='1920x1080', help='対象の解像度（all で全解像度）')
+    parser.add_argument('--ring-size', type=int, default=3, help='フレームリングの枠数（0 で毎回確保）')
+    parser.add_argument('--interval', type=int, default=1000, help='RSS を記録する間隔（スキャン数）')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    resolution = None if args.resolution == 'all' else args.resolution
+    result = run(Path(args.corpus), args.scans, resolution, args.ring_size, args.interval)
+    output = Path(args.output) if args.output else (
+        BENCH_DIR / 'results' / f"memory-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=4), encoding='utf-8')
+
+    peak = result['per_scan_peak_kb']
+    rss = result['rss_kb']
+    print(f"{result['scans']} scans, ring_size={result['ring_size']}, {result['scan_ms_mean']}ms/scan")
+    print(f"per-scan peak allocation: p50={peak['p50']:.1f}KB p99={peak['p99']:.1f}KB max={peak['max']:.1f}KB")
+    print(f"traced growth: {result['traced_growth_kb']}KB")
+    print(f"RSS: first={rss['first']}KB last={rss['last']}KB min={rss['min']}KB max={rss['max']}KB")
+    print(f"結果を保存しました: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""スクリーンショットコーパスに対する検出速度と精度のベンチマーク
+
+    python benchmarks/run_benchmarks.py [--corpus DIR] [--passes 3] [--confidence 0.7] [--no-prefilter] [--output FILE]
+
+承認ボタンとマッチング画面を scan_frame・自動検出と同じ経路（LoLAutoAccept.locate）で検出し、
+LoLAutoAccept.detect_all による一括照合と合わせて、フレームごとの所要時間 (p50/p95/p99)、
+ピークメモリ、適合率・再現率を JSON に保存する。色による事前判定 (prefilter) については、
+照合前に除外したフレームの割合 (reject_rate) と、対象が写っているのに除外した割合
+(false_reject_rate) も記録する。--no-prefilter で事前判定なしの場合と比較できる。
+クリックとクリック後の確認は検出の所要時間に含めない（確認はボタン周辺の再キャプチャを待つため）。
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+import make_corpus  # noqa: E402
+
+from calibration import ScoreHistograms, calibrate_all  # noqa: E402
+from capture import Frame  # noqa: E402
+from config_utils import load_config  # noqa: E402
+from lol_auto_accept import LoLAutoAccept  # noqa: E402
+from roi import RoiStore  # noqa: E402
+
+DETECTORS = ['accept_button', 'matching_screen']
+# 検出だけを動かすベンチマーク・テストでは、履歴・クライアント API・設定ファイルの監視・メトリクスを使わない
+# （利用者の history.jsonl などに書き込まず、ポートも開かない）
+OFFLINE_OVERRIDES = {
+    'history': {'enabled': False},
+    'lcu': {'enabled': False},
+    'reload': {'enabled': False},
+    'metrics': {'enabled': False},
+}
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.asarray(samples)
+    return {
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3),
+        'max': round(float(values.max()), 3),
+    }
+
+
+def classification(counts):
+    tp, fp, fn = counts['tp'], counts['fp'], counts['fn']
+    return {
+        **counts,
+        'precision': round(tp / (tp + fp), 4) if tp + fp else None,
+        'recall': round(tp / (tp + fn), 4) if tp + fn else None,
+    }
+
+
+def max_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux は KB で返す
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def git_version():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'], cwd=ROOT, text=True,
+            stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def load_corpus(corpus):
+    manifest_path = corpus / 'manifest.json'
+    if not manifest_path.exists():
+        make_corpus.generate(corpus)
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    frames = []
+    for entry in manifest['frames']:
+        path = corpus / entry['file']
+        image = cv2.imdecode(np.fromfile(str(path), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            sys.exit(f"画像を読み込めません: {path}")
+        frames.append((entry, cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+    return manifest, frames
+
+
+def create_auto_accept(corpus, confidence, prefilter=True, overrides=None):
+    """overrides は {セクション名: {項目: 値}}。指定した項目だけ config.json の値を上書きする"""
+    config = load_config()
+    if confidence is not None:
+        config['template_matching']['confidence'] = confidence
+    if not prefilter:
+        config['prefilter'] = {'enabled': False}
+    for name, values in (overrides or {}).items():
+        config[name] = {**config.get(name, {}), **values}
+    # キャプチャはリプレイ方式にし、学習した ROI とスコアはディスクに書かない
+    config['capture'] = {'backend': 'replay', 'replay_path': str(corpus), 'replay_loop': True}
+    auto_accept = LoLAutoAccept(config)
+    auto_accept.roi = RoiStore(None, padding=auto_accept.roi.padding, max_misses=auto_accept.roi.max_misses)
+    auto_accept.scores = ScoreHistograms(None)
+    return auto_accept
+
+
+def rejected(auto_accept, name):
+    """これまでに事前判定で除外した回数"""
+    return auto_accept.prefilter.rejects.get(name, 0) if auto_accept.prefilter is not None else 0
+
+
+def prefilter_summary(counts):
+    positives = counts['positives']
+    frames = counts['frames']
+    return {
+        **counts,
+        'reject_rate': round(counts['rejects'] / frames, 4) if frames else None,
+        'false_reject_rate': round(counts['false_rejects'] / positives, 4) if positives else None,
+    }
+
+
+def run(corpus, passes, confidence, prefilter=True):
+    manifest, frames = load_corpus(corpus)
+    auto_accept = create_auto_accept(corpus, confidence, prefilter)
+    # 一括照合は ROI や変化検出の状態を共有しないよう別インスタンスで測る
+    batch_accept = create_auto_accept(corpus, confidence, prefilter)
+    latencies = {name: [] for name in DETECTORS}
+    frame_latencies = []
+    batch_latencies = []
+    by_resolution = {}
+    counts = {name: {'tp': 0, 'fp': 0, 'fn': 0, 'tn': 0} for name in DETECTORS}
+    prefilter_counts = {name: {'frames': 0, 'positives': 0, 'rejects': 0, 'false_rejects': 0} for name in DETECTORS}
+
+    tracemalloc.start()
+    for _ in range(passes):
+        for entry, image in frames:
+            # 実際のキャプチャと同様に、フレームごとに新しい Frame を作る
+            frame = Frame(image)
+            before = {name: rejected(auto_accept, name) for name in DETECTORS}
+            start = time.perf_counter()
+            found = {'accept_button': auto_accept.locate('accept_button', frame) is not None}
+            middle = time.perf_counter()
+            found['matching_screen'] = auto_accept.locate('matching_screen', frame) is not None
+            end = time.perf_counter()
+
+            latencies['accept_button'].append((middle - start) * 1000)
+            latencies['matching_screen'].append((end - middle) * 1000)
+            frame_latencies.append((end - start) * 1000)
+            by_resolution.setdefault(entry['resolution'], []).append((end - start) * 1000)
+
+            batch_frame = Frame(image)
+            start = time.perf_counter()
+            batch_accept.detect_all(batch_frame, DETECTORS)
+            batch_latencies.append((time.perf_counter() - start) * 1000)
+
+            for name in DETECTORS:
+                expected = entry['labels'].get(name, False)
+                key = ('tp' if expected else 'fp') if found[name] else ('fn' if expected else 'tn')
+                counts[name][key] += 1
+                was_rejected = rejected(auto_accept, name) > before[name]
+                prefilter_counts[name]['frames'] += 1
+                prefilter_counts[name]['positives'] += expected
+                prefilter_counts[name]['rejects'] += was_rejected
+                prefilter_counts[name]['false_rejects'] += was_rejected and expected
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'version': git_version(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {
+            'path': str(corpus),
+            'frames': len(frames),
+            'synthetic': manifest.get('synthetic', False),
+            'passes': passes,
+        },
+        'config': {
+            'confidence': auto_accept.confidence,
+            'scales': auto_accept.scales,
+            'pyramid_levels': auto_accept.matcher.levels,
+            'prefilter': auto_accept.prefilter is not None,
+        },
+        'detectors': {
+            name: {'latency_ms': percentiles(latencies[name]), **classification(counts[name]),
+                   'prefilter': prefilter_summary(prefilter_counts[name])}
+            for name in DETECTORS
+        },
+        'frame_latency_ms': percentiles(frame_latencies),
+        'batch_latency_ms': percentiles(batch_latencies),
+        'frame_latency_ms_by_resolution': {
+            resolution: percentiles(samples) for resolution, samples in sorted(by_resolution.items())
+        },
+        'memory': {
+            'tracemalloc_peak_kb': peak // 1024,
+            'max_rss_kb': max_rss_kb(),
+        },
+        'scan_stats': auto_accept.scan_stats(),
+        'calibration': calibration_summary(auto_accept.scores),
+    }
+
+
+def calibration_summary(scores):
+    """コーパスで記録したスコアから calibration.py と同じ方法で求めた閾値（コーパスは小さいので最小サンプル数を下げる）"""
+    results, overall = calibrate_all(dict(scores.items()), min_samples=5)
+    return {
+        'overall': overall._asdict() if overall else None,
+        'by_template': {
+            f"{name}@{resolution}": result._asdict() if result else None
+            for (resolution, name), result in sorted(results.items())
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=str(make_corpus.DEFAULT_CORPUS))
+    parser.add_argument('--passes', type=int, default=3)
+    parser.add_argument('--confidence', type=float, default=None)
+    parser.add_argument('--no-prefilter', action='store_true', help='色による事前判定を無効にする')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    result = run(Path(args.corpus), args.passes, args.confidence, prefilter=not args.no_prefilter)
+    output = Path(args.output) if args.output else (
+        BENCH_DIR / 'results' / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=4, sort_keys=True), encoding='utf-8')
+
+    for name, stats in result['detectors'].items():
+        latency = stats['latency_ms']
+        print(f"{name:16} p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms "
+              f"precision={stats['precision']} recall={stats['recall']}")
+        if result['config']['prefilter']:
+            prefilter = stats['prefilter']
+            print(f"{'':16} prefilter reject_rate={prefilter['reject_rate']} "
+                  f"false_reject_rate={prefilter['false_reject_rate']}")
+    overall = result['calibration']['overall']
+    if overall:
+        print(f"calibrated confidence={overall['threshold']} margin={overall['margin']:+.3f}")
+    print(f"peak memory: {result['memory']['tracemalloc_peak_kb']} KB (tracemalloc)")
+    print(f"結果を保存しました: {output}")
+
+
+if __name__ == '__main__':
+    main()
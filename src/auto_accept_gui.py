@@ -1,17 +1,12 @@
 import tkinter as tk
 from tkinter import ttk
-import threading
-import time
 import logging
 import sys
 import os
 from pathlib import Path
-import pyautogui
 from PIL import Image, ImageTk
 
-from lol_auto_accept import LoLAutoAccept
-from controller import Controller
-from config_utils import load_config, save_config
+from metrics import stats_line
 
 class AutoAcceptGUI:
     def __init__(self, controller=None):
@@ -26,6 +21,8 @@ class AutoAcceptGUI:
         try:
             # Use provided controller or create a new one
             if controller is None:
+                from controller import Controller
+                from lol_auto_accept import LoLAutoAccept
                 self.auto_accept = LoLAutoAccept()
                 self.controller = Controller(self.auto_accept, self)
             else:
@@ -100,6 +97,7 @@ class AutoAcceptGUI:
         # 自動停止チェックボックス
         self.auto_stop_var = tk.BooleanVar(value=True)
         self.auto_stop_checkbox = tk.Checkbutton(checkbox_frame, text="自動で停止する", variable=self.auto_stop_var,
+                                              command=self.update_options,
                                               bg="#1E1E1E", fg="#E0E0E0", selectcolor="#252525",
                                               activebackground="#1E1E1E", activeforeground="#FFFFFF")
         self.auto_stop_checkbox.pack(anchor=tk.W, pady=(0, 5))
@@ -107,6 +105,7 @@ class AutoAcceptGUI:
         # 自動開始チェックボックス
         self.auto_start_var = tk.BooleanVar(value=True)  # デフォルトでオン
         self.auto_start_checkbox = tk.Checkbutton(checkbox_frame, text="マッチング時に自動開始", variable=self.auto_start_var,
+                                               command=self.update_options,
                                                bg="#1E1E1E", fg="#E0E0E0", selectcolor="#252525",
                                                activebackground="#1E1E1E", activeforeground="#FFFFFF")
         self.auto_start_checkbox.pack(anchor=tk.W, pady=(0, 5))
@@ -120,16 +119,34 @@ class AutoAcceptGUI:
                                    activeforeground="#FFFFFF", relief=tk.RAISED, bd=1)
         self.exit_button.pack(fill=tk.X)
         
+        # コントローラからの通知は Tk のスレッドでまとめて反映する
+        self.controller.ui.subscribe(self.on_ui_message, lambda callback: self.root.after(0, callback))
+        self.update_options()
+
         # ステータスラベル
-        self.status_label = tk.Label(self.app_frame, text="待機中", bg="#1E1E1E", fg="#E0E0E0")
+        # 検出機能はバックグラウンドで読み込まれるため、準備ができるまでは初期化中と表示する
+        # （準備ができると 'ready' が届く）
+        status = "待機中" if self.controller.ready.is_set() else "初期化中..."
+        self.status_label = tk.Label(self.app_frame, text=status, bg="#1E1E1E", fg="#E0E0E0")
         self.status_label.pack(fill=tk.X, pady=(10, 0))
+        # デーモンに接続した場合は既に監視中のことがある
+        if self.controller.monitoring:
+            self.update_ui_on_start()
+        
+        # 計測が有効な場合はスキャン時間の要約を表示する（デーモンに接続した場合はデーモン側の計測）
+        self.stats_label = None
+        if self.read_stats().get('metrics_enabled'):
+            self.root.geometry("250x240")
+            self.stats_label = tk.Label(self.app_frame, text="", bg="#1E1E1E", fg="#808080",
+                                        font=("TkDefaultFont", 7))
+            self.stats_label.pack(fill=tk.X)
+            self.update_stats()
         
         try:
             # Configure window close event to hide instead of quit
             self.root.protocol("WM_DELETE_WINDOW", self.hide_window)
-            
-            # Start auto detection
-            self.start_auto_detection()
+            # F5 で config.json を今すぐ読み込み直す（保存すれば自動でも反映される）
+            self.root.bind("<F5>", lambda event: self.load_settings())
         except Exception as e:
             logging.error(f"GUIの初期化中にエラーが発生しました: {str(e)}")
             self.root.destroy()
@@ -167,66 +184,67 @@ class AutoAcceptGUI:
             y = self.root.winfo_y() + deltay
             self.root.geometry(f"+{x}+{y}")
         
-    def start_auto_detection(self):
-        """マッチング画像の検出を監視し、検出時に自動で監視を開始するスレッド"""
-        def auto_detect():
-            logging.info("自動検出を開始しました")
-            rel = self.auto_accept.config['images']['matching_screen']
-            base = getattr(self.auto_accept, 'button_image_path', '')
-            image_dir = os.path.dirname(base) if base else os.getcwd()
-            matching_image_path = os.path.join(image_dir, rel)
-            
-            # 画像ファイルの存在確認
-            if not os.path.exists(matching_image_path):
-                logging.error(f"マッチング画像が見つかりません: {matching_image_path}")
+    def update_options(self):
+        """チェックボックスの状態をコントローラに伝える（マッチング画面の検出は自動開始がオンの間だけ行う）"""
+        self.controller.set_options(auto_start=self.auto_start_var.get(), auto_stop=self.auto_stop_var.get())
+
+    def on_ui_message(self, kind, value):
+        """コントローラのコアループからの通知を反映する（Tk のスレッドで呼ばれる）"""
+        if kind == 'ready':
+            self.update_ui_on_ready()
+        elif kind == 'monitoring':
+            monitoring, message = value
+            if monitoring:
+                self.update_ui_on_start()
             else:
-                logging.info(f"マッチング画像を読み込みました: {matching_image_path}")
-            
-            while self.controller.running:
-                try:
-                    # ファイルの存在を毎回確認
-                    if not os.path.exists(matching_image_path):
-                        time.sleep(5)  # ファイルがない場合は5秒待機
-                        continue
-                        
-                    if not self.controller.monitoring and self.auto_start_var.get():
-                        # マッチング画像を検出
-                        matching_pos = pyautogui.locateOnScreen(matching_image_path, confidence=self.auto_accept.confidence)
-                        if matching_pos is not None:
-                            logging.info("マッチング画面を検出しました。自動監視を開始します。")
-                            # GUIスレッドから実行するために、after()を使用
-                            self.root.after(0, self.start_monitoring)
-                except pyautogui.ImageNotFoundException:
-                    # 画像が見つからない場合は正常な状態なのでログ出力しない
-                    pass
-                except FileNotFoundError as e:
-                    logging.error(f"画像ファイルが見つかりません: {str(e)}")
-                    time.sleep(10)  # エラー発生時は長めの待機
-                except Exception as e:
-                    import traceback
-                    logging.error(f"自動検出中にエラーが発生しました: {str(e)}")
-                    logging.error(traceback.format_exc())  # スタックトレースを出力
-                    time.sleep(5)  # エラー発生時は長めの待機
-                
-                time.sleep(self.auto_accept.interval_sec)  # 設定間隔で検出
-        
-        self.auto_monitor_thread = threading.Thread(target=auto_detect, daemon=True)
-        self.auto_monitor_thread.start()
+                self.update_ui_on_stop(message)
+        elif kind == 'config':
+            if value:
+                self.status_label.config(text="設定をリロードしました", fg="#00AAFF")  # 青色のテキスト
+            else:
+                self.status_label.config(text="設定を反映できません", fg="#FF5555")
+        elif kind == 'profile':
+            profiling, summary = value
+            if not profiling and summary:
+                self.status_label.config(text=f"プロファイルを保存しました: {summary}", fg="#00AAFF")
+        elif kind == 'show':
+            self.show()
+        elif kind == 'quit':
+            self.quit()
         
+    def read_stats(self):
+        """コントローラの計測値のスナップショット。取得できなければ空"""
+        try:
+            return self.controller.stats()
+        except Exception as e:
+            logging.debug(f"計測値を取得できません: {e}")
+            return {}
+
+    def update_stats(self):
+        """ステータス欄のスキャン時間表示を定期的に更新する"""
+        self.stats_label.config(text=stats_line(self.read_stats().get('metrics', {})))
+        self.root.after(2000, self.update_stats)
+
     def start_monitoring(self):
         self.controller.start()
         
     def update_ui_on_start(self):
-        """Called by controller when monitoring starts"""
+        """Called on the 'monitoring' message when monitoring starts"""
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
         self.status_label.config(text="監視中...", fg="#00FF00")  # 緑色のテキスト
 
+    def update_ui_on_ready(self):
+        """Called on the 'ready' message once detection has finished loading"""
+        self.auto_accept = self.controller.auto_accept
+        if not self.controller.monitoring:
+            self.status_label.config(text="待機中", fg="#E0E0E0")
+
     def stop_monitoring(self):
         self.controller.stop()
         
     def update_ui_on_stop(self, message="停止中"):
-        """Called by controller when monitoring stops"""
+        """Called on the 'monitoring' message when monitoring stops"""
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.status_label.config(text=message, fg="#E0E0E0")  # 通常の文字色に戻す
@@ -249,16 +267,15 @@ class AutoAcceptGUI:
         self.root.quit()
 
     def load_settings(self):
-        cfg = load_config()
-        # 設定反映
-        self.auto_accept.config = cfg
-        self.auto_accept.confidence = cfg['template_matching']['confidence']
-        self.auto_accept.interval_sec = cfg['template_matching']['interval_sec']
-        self.status_label.config(text="設定をリロードしました", fg="#00AAFF")  # 青色のテキスト
+        # 結果は 'config' の通知で届く
+        self.controller.reload_config()
 
     def save_settings(self):
-        save_config(self.auto_accept.config)
-        self.status_label.config(text="設定を保存しました", fg="#00AAFF")  # 青色のテキスト
+        # デーモンに接続している場合は手元に設定が無いので、デーモン側で保存する
+        if self.controller.save_config():
+            self.status_label.config(text="設定を保存しました", fg="#00AAFF")  # 青色のテキスト
+        else:
+            self.status_label.config(text="設定を保存できません", fg="#FF5555")
 
     def run(self):
         self.root.mainloop()
@@ -0,0 +1,173 @@
+"""照合スコアの記録と confidence の自動調整
+
+LoLAutoAccept はスキャンのたびに最良スコアをテンプレート・解像度ごとのヒストグラムに加える。
+ボタンが無い画面のスコア（低い山）と、ある画面のスコア（高い山）を大津の方法で分け、
+その間に閾値を置く。
+
+    python src/calibration.py            # 推奨値と余裕 (margin) を表示
+    python src/calibration.py --write    # config.json の template_matching.confidence に書き込む
+"""
+import argparse
+import json
+import logging
+from collections import namedtuple
+
+from config_utils import get_data_path, load_config, save_config, write_atomic
+
+# スコア 0.00〜1.00 を 0.01 刻みで数える（負のスコアは 0 に含める）
+BINS = 100
+
+# threshold: 推奨値 / margin: 陽性の下端と陰性の上端の差（負なら分離できていない）
+Calibration = namedtuple('Calibration', 'threshold margin negative_high positive_low negatives positives')
+
+
+def _bin(score):
+    return min(BINS - 1, max(0, int(score * BINS)))
+
+
+class ScoreHistograms:
+    """照合スコアのヒストグラムをテンプレート・解像度ごとに保持し、ときどきディスクに書き出す"""
+
+    def __init__(self, path, flush_every=200):
+        self.path = path
+        self.flush_every = flush_every
+        self.pending = 0
+        self.histograms = self._load()
+
+    def _load(self):
+        # path が None の場合はディスクに保存しない（ベンチマークなど）
+        if self.path is None:
+            return {}
+        try:
+            if self.path.exists():
+                return json.loads(self.path.read_text(encoding='utf-8'))
+        except Exception as e:
+            logging.error(f"スコア記録の読み込み失敗: {e}")
+        return {}
+
+    def record(self, name, width, height, score):
+        counts = self.histograms.setdefault(f"{width}x{height}", {}).setdefault(name, [0] * BINS)
+        counts[_bin(score)] += 1
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.path is None or not self.pending:
+            return
+        try:
+            write_atomic(self.path, json.dumps(self.histograms, separators=(',', ':')))
+            self.pending = 0
+        except Exception as e:
+            logging.error(f"スコア記録の保存失敗: {e}")
+
+    def items(self):
+        """((解像度, テンプレート名), ヒストグラム) を列挙する"""
+        for resolution, templates in self.histograms.items():
+            for name, counts in templates.items():
+                yield (resolution, name), counts
+
+
+def _percentile_bin(counts, lo, hi, fraction):
+    """counts[lo:hi] の累積が fraction に達するビン"""
+    total = sum(counts[lo:hi])
+    target = total * fraction
+    seen = 0
+    for i in range(lo, hi):
+        seen += counts[i]
+        if seen >= target and counts[i]:
+            return i
+    return hi - 1
+
+
+def otsu_bin(counts):
+    """クラス間分散が最大になる分割位置（このビン以上を陽性とする）"""
+    total = sum(counts)
+    weighted = sum(i * c for i, c in enumerate(counts))
+    best, best_bin = -1.0, None
+    low_count = low_weighted = 0
+    for i in range(1, len(counts)):
+        low_count += counts[i - 1]
+        low_weighted += (i - 1) * counts[i - 1]
+        high_count = total - low_count
+        if not low_count or not high_count:
+            continue
+        mean_low = low_weighted / low_count
+        mean_high = (weighted - low_weighted) / high_count
+        variance = low_count * high_count * (mean_high - mean_low) ** 2
+        if variance > best:
+            best, best_bin = variance, i
+    return best_bin
+
+
+def calibrate(counts, min_samples=20, tail=0.005):
+    """ヒストグラムから閾値を求める。どちらかの山のサンプルが足りなければ None
+
+    陰性の上端・陽性の下端は外れ値を除くため、それぞれ tail の割合を切り捨てた位置とする
+    """
+    split = otsu_bin(counts)
+    if split is None:
+        return None
+    negatives = sum(counts[:split])
+    positives = sum(counts[split:])
+    if negatives < min_samples or positives < min_samples:
+        return None
+    negative_high = (_percentile_bin(counts, 0, split, 1 - tail) + 1) / BINS
+    positive_low = _percentile_bin(counts, split, len(counts), tail) / BINS
+    margin = positive_low - negative_high
+    threshold = (negative_high + positive_low) / 2 if margin > 0 else split / BINS
+    return Calibration(round(threshold, 3), round(margin, 3), negative_high, positive_low, negatives, positives)
+
+
+def calibrate_all(histograms, min_samples=20):
+    """テンプレート・解像度ごとの結果と、すべてを満たす共通の閾値を返す
+
+    config.json の confidence は 1 つなので、陰性の上端の最大と陽性の下端の最小の間を取る
+    """
+    results = {key: calibrate(counts, min_samples) for key, counts in histograms.items()}
+    usable = [r for r in results.values() if r is not None]
+    if not usable:
+        return results, None
+    negative_high = max(r.negative_high for r in usable)
+    positive_low = min(r.positive_low for r in usable)
+    margin = positive_low - negative_high
+    threshold = (negative_high + positive_low) / 2 if margin > 0 else max(r.threshold for r in usable)
+    overall = Calibration(round(threshold, 3), round(margin, 3), negative_high, positive_low,
+                          sum(r.negatives for r in usable), sum(r.positives for r in usable))
+    return results, overall
+
+
+def main():
+    parser = argparse.ArgumentParser(description='記録した照合スコアから confidence を求める')
+    parser.add_argument('--write', action='store_true', help='求めた値を config.json に書き込む')
+    parser.add_argument('--min-samples', type=int, default=20, help='陽性・陰性それぞれに必要なスキャン数')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    histograms = ScoreHistograms(get_data_path('score_histograms.json'))
+    results, overall = calibrate_all(dict(histograms.items()), args.min_samples)
+    for (resolution, name), result in sorted(results.items()):
+        if result is None:
+            print(f"{name:16} {resolution:>10}  サンプル不足")
+            continue
+        print(f"{name:16} {resolution:>10}  threshold={result.threshold:.3f} margin={result.margin:+.3f} "
+              f"(negative<={result.negative_high:.2f} n={result.negatives}, "
+              f"positive>={result.positive_low:.2f} n={result.positives})")
+    if overall is None:
+        print("ボタンがある画面とない画面の両方のスコアがまだ足りません")
+        return
+
+    config = load_config()
+    current = config['template_matching']['confidence']
+    print(f"推奨 confidence: {overall.threshold:.3f} (現在 {current}, margin {overall.margin:+.3f})")
+    if not args.write:
+        return
+    if overall.margin <= 0:
+        logging.warning("陽性と陰性のスコアが重なっているため書き込みません")
+        return
+    config['template_matching']['confidence'] = overall.threshold
+    save_config(config)
+
+
+if __name__ == '__main__':
+    main()
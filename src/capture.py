@@ -0,0 +1,325 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# 仮想スクリーン（OS のクリック座標）上のディスプレイの位置
+Display = namedtuple('Display', 'index left top width height')
+
+
+class FrameSlot:
+    """フレームリングの 1 枠。キャプチャ画像と、そこから作るグレースケール・縮小画像のバッファを持つ"""
+
+    # 縮小画像と間引き画像は探索範囲の大きさごとにバッファを持つので、これを超えたらその分だけ作り直す
+    MAX_BUFFERS = 32
+
+    __slots__ = ('buffers',)
+
+    def __init__(self):
+        self.buffers = {}
+
+    def buffer(self, key, shape, dtype=np.uint8):
+        """key ごとの使い回しのバッファ。形が変わったときだけ確保し直す"""
+        buffer = self.buffers.get(key)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            if len(self.buffers) >= self.MAX_BUFFERS:
+                for stale in [k for k in self.buffers if isinstance(k, tuple)]:
+                    del self.buffers[stale]
+            buffer = self.buffers[key] = np.empty(shape, dtype)
+        return buffer
+
+
+class FrameRing:
+    """事前に確保したフレームバッファを順番に使い回す
+
+    キャプチャ・色変換・グレースケール化・縮小はすべて枠のバッファに直接書き込むので、
+    定常状態ではティックごとの大きな確保が発生しない。フレームは同じティック内で消費されるため、
+    size 回先のキャプチャで上書きされても問題ない。他のディスプレイを探すキャプチャはリングを使わない
+    （CaptureBackend.grab_display の sweep）ので、1 ティックで使う枠は 1 つだけになる。
+    size が 0 の場合は毎回新しく確保する。
+    """
+
+    def __init__(self, size=3):
+        self.slots = [FrameSlot() for _ in range(size)]
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def next_slot(self):
+        if not self.slots:
+            return FrameSlot()
+        with self.lock:
+            slot = self.slots[self.position % len(self.slots)]
+            self.position += 1
+        return slot
+
+
+class Frame:
+    """1 回分のキャプチャ。全検出器で共有するため読み取り専用にしている
+
+    origin は画像の左上がスクリーン座標のどこにあたるか。クリック位置の変換に使う。
+    slot を渡すとグレースケール・縮小画像もその枠のバッファに書き込む
+    """
+
+    def __init__(self, image, timestamp=None, origin=(0, 0), slot=None):
+        image.flags.writeable = False
+        self.image = image
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.origin = origin
+        self.slot = slot
+        self._gray = None
+        self._thumbnails = {}
+        self._pyramid = {}
+        self._samples = {}
+        self._shape_uses = {}
+
+    def _output(self, key, shape):
+        """変換先のバッファ。リングの枠が無ければ None（OpenCV が新しく確保する）"""
+        if self.slot is None:
+            return None
+        return self.slot.buffer(key, shape)
+
+    def _scratch(self, kind, shape):
+        """範囲ごとに作る画像の変換先。バッファは大きさで使い回す（ROI が少し動いても確保し直さない）
+
+        同じフレームで同じ大きさの画像を複数作る場合は別のバッファにする
+        """
+        uses = self._shape_uses.get((kind, shape), 0)
+        self._shape_uses[(kind, shape)] = uses + 1
+        return self._output((kind, shape, uses), shape)
+
+    @property
+    def width(self):
+        return self.image.shape[1]
+
+    @property
+    def height(self):
+        return self.image.shape[0]
+
+    @property
+    def gray(self):
+        """グレースケール版。最初に参照した検出器が変換し、以降は使い回す"""
+        if self._gray is None:
+            if self.image.ndim == 2:
+                gray = self.image
+            else:
+                gray = cv2.cvtColor(self.image, cv2.COLOR_RGB2GRAY,
+                                    dst=self._output('gray', self.image.shape[:2])).view()
+                gray.flags.writeable = False
+            self._gray = gray
+        return self._gray
+
+    def pyramid(self, factor):
+        """画面全体を 1/factor（2 の累乗）に縮小したグレースケール画像
+
+        1 つ前の段を半分にして作るので、1/4 は 1/2 の段から作られ、段はフレームに 1 つずつしかない
+        """
+        level = self._pyramid.get(factor)
+        if level is None:
+            source = self.gray if factor == 2 else self.pyramid(factor // 2)
+            size = (max(1, source.shape[1] // 2), max(1, source.shape[0] // 2))
+            level = cv2.resize(source, size, dst=self._output(('pyramid', factor), size[::-1]),
+                               interpolation=cv2.INTER_AREA).view()
+            level.flags.writeable = False
+            self._pyramid[factor] = level
+        return level
+
+    def thumbnail(self, downscale, region=None):
+        """1/downscale に縮小したグレースケール画像
+
+        変化検出とピラミッドマッチングの粗い段で使う。downscale が 2 の累乗なら画面全体の
+        ピラミッドから範囲を切り出すので、範囲の違う検出器同士でも縮小は 1 回で済む
+        """
+        if downscale > 1 and downscale & (downscale - 1) == 0:
+            level = self.pyramid(downscale)
+            if region is None:
+                return level
+            x0, y0, x1, y1 = region
+            return level[y0 // downscale:max(y0 // downscale + 1, y1 // downscale),
+                         x0 // downscale:max(x0 // downscale + 1, x1 // downscale)]
+        key = (downscale, region)
+        thumb = self._thumbnails.get(key)
+        if thumb is None:
+            gray = self.gray
+            if region is not None:
+                x0, y0, x1, y1 = region
+                gray = gray[y0:y1, x0:x1]
+            size = (max(1, gray.shape[1] // downscale), max(1, gray.shape[0] // downscale))
+            thumb = cv2.resize(gray, size, dst=self._scratch('thumb', size[::-1]),
+                               interpolation=cv2.INTER_AREA).view()
+            thumb.flags.writeable = False
+            self._thumbnails[key] = thumb
+        return thumb
+
+    def color_sample(self, step, region=None):
+        """step 画素おきに間引いた HSV 画像。色による事前判定で使う（グレースケール化より安い）"""
+        key = (step, region)
+        sample = self._samples.get(key)
+        if sample is None:
+            image = self.image
+            if region is not None:
+                x0, y0, x1, y1 = region
+                image = image[y0:y1, x0:x1]
+            # 最近傍での縮小は画素を間引くだけなので、スライスのコピーより速い
+            size = (max(1, image.shape[1] // step), max(1, image.shape[0] // step))
+            shape = (size[1], size[0], 3)
+            rgb = cv2.resize(image, size, dst=self._scratch('sample_rgb', shape), interpolation=cv2.INTER_NEAREST)
+            sample = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV, dst=self._scratch('sample', shape)).view()
+            sample.flags.writeable = False
+            self._samples[key] = sample
+        return sample
+
+    def to_screen(self, point):
+        """フレーム内の座標をスクリーン座標に変換する"""
+        return (self.origin[0] + point[0], self.origin[1] + point[1])
+
+
+class DisplayTracker:
+    """クライアントが最後に表示されていたディスプレイを覚えておく
+
+    普段はそのディスプレイだけをキャプチャし、sweep_after 回続けて見つからなかったときだけ
+    他のディスプレイも探す。最初はプライマリ（原点を含む）ディスプレイから始め、すぐに一度探す
+    """
+
+    def __init__(self, displays, sweep_after=10):
+        self.displays = list(displays)
+        self.sweep_after = sweep_after
+        primary = next((d for d in self.displays if d.left <= 0 < d.left + d.width
+                        and d.top <= 0 < d.top + d.height), self.displays[0])
+        self.preferred = primary
+        self.misses = {}
+        # 最初の 1 回目で他のディスプレイも探すよう、カウントを閾値の手前から始める
+        self.initial_misses = sweep_after - 1
+
+    def record_hit(self, name):
+        self.misses[name] = 0
+
+    def record_miss(self, name):
+        """見つからなかったことを記録し、他のディスプレイを探す時期なら True を返す"""
+        misses = self.misses.get(name, self.initial_misses) + 1
+        if misses >= self.sweep_after:
+            self.misses[name] = 0
+            return True
+        self.misses[name] = misses
+        return False
+
+    def others(self):
+        return [d for d in self.displays if d != self.preferred]
+
+    def prefer(self, display):
+        if display != self.preferred:
+            logging.info(f"ディスプレイ {display.index} でクライアントを検出しました "
+                         f"({display.width}x{display.height} at {display.left},{display.top})")
+        self.preferred = display
+        self.misses = {}
+        self.initial_misses = 0
+
+
+class ChangeGate:
+    """前回見つからなかったときから画面が変わっていなければマッチングを省略する"""
+
+    def __init__(self, threshold=8, max_contexts=4):
+        # 縮小画像の画素ごとの差の最大値がこれ以下なら「変化なし」とみなす
+        self.threshold = threshold
+        # ROI での探索と全画面での探索が交互に来ても両方省略できるよう、
+        # 「見つからなかった画面」はテンプレートごとに context 別に最大 max_contexts 個覚える
+        self.max_contexts = max_contexts
+        self.negatives = {}
+        self.checks = {}
+        self.skips = {}
+
+    def should_skip(self, name, context, thumb):
+        """context（探索範囲やテンプレートの版など）が同じで、画面も変わっていなければ True"""
+        self.checks[name] = self.checks.get(name, 0) + 1
+        last = self.negatives.get(name, {}).get(context)
+        if last is None or last.shape != thumb.shape:
+            return False
+        if cv2.absdiff(last, thumb).max() > self.threshold:
+            return False
+        self.skips[name] = self.skips.get(name, 0) + 1
+        return True
+
+    def record_negative(self, name, context, thumb):
+        # thumb はフレームリングのバッファなので、後で上書きされないよう自前のバッファに写す
+        entries = self.negatives.setdefault(name, {})
+        last = entries.pop(context, None)
+        if last is not None and last.shape == thumb.shape:
+            np.copyto(last, thumb)
+        else:
+            last = thumb.copy()
+        # 挿入順を使用順として、古い context から捨てる
+        while len(entries) >= self.max_contexts:
+            del entries[next(iter(entries))]
+        entries[context] = last
+
+    def invalidate(self, name):
+        self.negatives.pop(name, None)
+
+    def stats(self):
+        """テンプレートごとのマッチング省略率"""
+        return {
+            name: {
+                'checks': checks,
+                'skips': self.skips.get(name, 0),
+                'skip_ratio': round(self.skips.get(name, 0) / checks, 3),
+            }
+            for name, checks in self.checks.items()
+        }
+
+
+class CapturePipeline:
+    """1 ティックに 1 回だけ画面をキャプチャし、登録された検出器すべてに配る
+
+    自前のスレッドは持たず、コアループ（core_loop.CoreLoop）が step を繰り返し呼ぶ。
+    register / unregister / step はコアループのスレッドからだけ呼ぶ。
+    """
+
+    def __init__(self, grab, scheduler):
+        self.grab = grab
+        # 次のティックまでの間隔はスケジューラが状態に応じて決める
+        self.scheduler = scheduler
+        self.detectors = {}
+        # キャプチャしたティックの数（待機中に起きていないことの確認用）
+        self.ticks = 0
+
+    def register(self, name, detector):
+        """検出器を登録する。detector はフレームを 1 つ受け取る呼び出し可能オブジェクト"""
+        if not self.detectors:
+            logging.info("キャプチャを開始しました")
+        self.detectors[name] = detector
+
+    def unregister(self, name):
+        if self.detectors.pop(name, None) is not None and not self.detectors:
+            logging.info("キャプチャを停止しました")
+
+    def step(self):
+        """1 ティック分キャプチャして検出し、次のティックまでの秒数を返す
+
+        検出器が無ければキャプチャせず None（登録されるまで待つ）を返す
+        """
+        if not self.detectors:
+            return None
+        self.ticks += 1
+        self._tick(list(self.detectors.items()))
+        return self.scheduler.next_delay()
+
+    def _tick(self, detectors):
+        try:
+            frame = self.grab()
+        except Exception as e:
+            logging.error(f"キャプチャ中にエラーが発生しました: {str(e)}")
+            self.scheduler.on_error()
+            return
+        failed = False
+        for name, detector in detectors:
+            try:
+                detector(frame)
+            except Exception as e:
+                logging.error(f"検出中にエラーが発生しました ({name}): {str(e)}")
+                failed = True
+        if failed:
+            self.scheduler.on_error()
+        else:
+            self.scheduler.on_success()
@@ -0,0 +1,265 @@
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from capture import Display, Frame, FrameRing, FrameSlot
+from config_utils import get_section
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class CaptureBackend:
+    """画面キャプチャとクリックの差し替え口"""
+
+    name = 'base'
+
+    def __init__(self, ring_size=3):
+        # キャプチャ結果とその変換先を使い回すバッファ
+        self.ring = FrameRing(ring_size)
+        # 他のディスプレイを探すとき (sweep) のキャプチャ先。ディスプレイごとに 1 枠
+        self.sweep_slots = {}
+
+    def grab(self):
+        """画面全体をキャプチャして Frame を返す"""
+        raise NotImplementedError
+
+    def displays(self):
+        """ディスプレイ (Display) の一覧。個別にキャプチャできない場合は None（grab で全体を扱う）"""
+        return None
+
+    def grab_display(self, display, sweep=False):
+        """1 つのディスプレイだけをキャプチャする
+
+        sweep=True は同じティックの中で他のディスプレイを探すときのキャプチャ。リングの枠ではなく
+        ディスプレイごとの枠に書き込むので、ディスプレイの数がリングより多くても、
+        このティックで処理中のフレームを上書きしない
+        """
+        x0, y0 = display.left, display.top
+        return self.grab_region((x0, y0, x0 + display.width, y0 + display.height))
+
+    def _display_slot(self, display, sweep):
+        if not sweep:
+            return self.ring.next_slot()
+        slot = self.sweep_slots.get(display.index)
+        if slot is None:
+            slot = self.sweep_slots[display.index] = FrameSlot()
+        return slot
+
+    def grab_region(self, region):
+        """スクリーン座標の region (x0, y0, x1, y1) だけをキャプチャする。既定では全体から切り出す"""
+        x0, y0, x1, y1 = region
+        frame = self.grab()
+        ox, oy = frame.origin
+        return Frame(np.ascontiguousarray(frame.image[y0 - oy:y1 - oy, x0 - ox:x1 - ox]), origin=(x0, y0))
+
+    def click(self, point):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiBackend(CaptureBackend):
+    """pyautogui (PIL) によるキャプチャ。従来の locateOnScreen と同じ経路"""
+
+    name = 'pyautogui'
+
+    def __init__(self, ring_size=3):
+        super().__init__(ring_size)
+        import pyautogui
+        pyautogui.FAILSAFE = True
+        self.pyautogui = pyautogui
+
+    @staticmethod
+    def _to_array(screenshot):
+        # 多くの環境で最初から RGB なので、変換によるコピーは必要なときだけ行う
+        if screenshot.mode != 'RGB':
+            screenshot = screenshot.convert('RGB')
+        return np.asarray(screenshot)
+
+    def grab(self):
+        # PIL の画像は毎回確保されるが、グレースケール化と縮小はリングのバッファに書き込む
+        return Frame(self._to_array(self.pyautogui.screenshot()), slot=self.ring.next_slot())
+
+    def grab_region(self, region):
+        x0, y0, x1, y1 = region
+        screenshot = self.pyautogui.screenshot(region=(x0, y0, x1 - x0, y1 - y0))
+        return Frame(self._to_array(screenshot), origin=(x0, y0))
+
+    def click(self, point):
+        self.pyautogui.click(point)
+
+
+class MssBackend(PyAutoGuiBackend):
+    """mss によるキャプチャ。BGRA から RGB への変換はフレームリングのバッファに直接書き込む
+
+    mss のインスタンスはスレッドをまたいで使えないので、スレッドごとに作る。
+    クリックは pyautogui を使う。
+    """
+
+    name = 'mss'
+
+    def __init__(self, ring_size=3):
+        super().__init__(ring_size)
+        import mss
+        self.mss = mss
+        self.local = threading.local()
+        self.instances = []
+        self.lock = threading.Lock()
+
+    @property
+    def sct(self):
+        sct = getattr(self.local, 'sct', None)
+        if sct is None:
+            sct = self.local.sct = self.mss.mss()
+            with self.lock:
+                self.instances.append(sct)
+        return sct
+
+    def _grab(self, monitor, slot=None):
+        """slot が None の場合（確認用の小さな範囲）は新しい配列に変換する"""
+        shot = self.sct.grab(monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        dst = slot.buffer('rgb', (shot.height, shot.width, 3)) if slot is not None else None
+        image = cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=dst).view()
+        return Frame(image, origin=(monitor['left'], monitor['top']), slot=slot)
+
+    def grab(self):
+        # monitors[0] は全ディスプレイを含む仮想スクリーン
+        return self._grab(self.sct.monitors[0], self.ring.next_slot())
+
+    def displays(self):
+        monitors = self.sct.monitors[1:]
+        if len(monitors) < 2:
+            return None
+        return [Display(i, m['left'], m['top'], m['width'], m['height']) for i, m in enumerate(monitors, 1)]
+
+    def grab_display(self, display, sweep=False):
+        monitor = {'left': display.left, 'top': display.top, 'width': display.width, 'height': display.height}
+        return self._grab(monitor, self._display_slot(display, sweep))
+
+    def grab_region(self, region):
+        x0, y0, x1, y1 = region
+        return self._grab({'left': x0, 'top': y0, 'width': x1 - x0, 'height': y1 - y0})
+
+    def close(self):
+        with self.lock:
+            instances, self.instances = self.instances, []
+        for sct in instances:
+            sct.close()
+
+
+class ReplayBackend(CaptureBackend):
+    """録画済みの画像ディレクトリまたは動画を順に再生する。画面もマウスも使わない"""
+
+    name = 'replay'
+
+    def __init__(self, path, loop=True, displays=None, ring_size=3):
+        super().__init__(ring_size)
+        self.path = path
+        self.loop = loop
+        # 録画を複数ディスプレイの仮想スクリーンとみなす場合の配置 [[left, top, width, height], ...]
+        self.layout = [Display(i, *bounds) for i, bounds in enumerate(displays or [], 1)]
+        self.current = None
+        self.seen = set()
+        # 複数ディスプレイとして切り出す場合の元画像はリングとは別に持つ
+        self.source_slot = FrameSlot()
+        self.video_buffer = None
+        self.clicks = []
+        self.video = None
+        self.files = []
+        self.position = 0
+        if os.path.isdir(path):
+            self.files = sorted(
+                os.path.join(path, f) for f in os.listdir(path)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            if not self.files:
+                raise FileNotFoundError(f"リプレイ画像が見つかりません: {path}")
+        else:
+            self.video = cv2.VideoCapture(path)
+            if not self.video.isOpened():
+                raise FileNotFoundError(f"リプレイ動画を開けません: {path}")
+        logging.info(f"リプレイキャプチャを使用します: {path}")
+
+    def grab(self):
+        return self._advance(self.ring.next_slot())
+
+    def _advance(self, slot):
+        """次の録画フレームを slot のバッファに RGB で書き込む"""
+        image = self._read_video() if self.video is not None else self._read_file()
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=slot.buffer('rgb', image.shape)).view()
+        self.current = Frame(rgb, slot=slot)
+        self.seen.clear()
+        return self.current
+
+    def displays(self):
+        return self.layout if len(self.layout) > 1 else None
+
+    def grab_display(self, display, sweep=False):
+        # 同じティック内では同じ録画フレームから切り出し、同じディスプレイを 2 回目に
+        # 求められたら次のティックとみなして進める
+        if self.current is None or display.index in self.seen:
+            self._advance(self.source_slot)
+        self.seen.add(display.index)
+        x0, y0 = display.left, display.top
+        source = self.current.image[y0:y0 + display.height, x0:x0 + display.width]
+        slot = self._display_slot(display, sweep)
+        image = slot.buffer('rgb', source.shape)
+        np.copyto(image, source)
+        return Frame(image.view(), origin=(x0, y0), slot=slot)
+
+    def _read_file(self):
+        if self.position >= len(self.files):
+            if not self.loop:
+                raise EOFError("リプレイが終了しました")
+            self.position = 0
+        path = self.files[self.position]
+        self.position += 1
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"画像をデコードできません: {path}")
+        return image
+
+    def _read_video(self):
+        # デコード先も使い回す（BGR のまま。RGB への変換はリングの枠に書き込む）
+        ok, image = self.video.read(self.video_buffer)
+        if not ok:
+            if not self.loop:
+                raise EOFError("リプレイが終了しました")
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self.video.read(self.video_buffer)
+            if not ok:
+                raise EOFError("リプレイ動画からフレームを読み込めません")
+        self.video_buffer = image
+        return image
+
+    def click(self, point):
+        # 実際にはクリックせず記録だけ残す
+        self.clicks.append(point)
+        logging.info(f"リプレイ: クリック {point}")
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+
+
+def create_backend(config):
+    """config.json の capture.backend に応じたキャプチャ方式を生成する"""
+    section = get_section(config, 'capture')
+    backend = section['backend']
+    ring_size = section['ring_size']
+    if backend == 'replay':
+        return ReplayBackend(section['replay_path'], loop=section['replay_loop'],
+                             displays=section['replay_displays'], ring_size=ring_size)
+    if backend == 'mss':
+        try:
+            return MssBackend(ring_size)
+        except ImportError:
+            logging.warning("mss が見つからないため pyautogui でキャプチャします")
+    elif backend != 'pyautogui':
+        logging.warning(f"不明なキャプチャ方式です: {backend}。pyautogui を使用します")
+    return PyAutoGuiBackend(ring_size)
@@ -1,6 +1,11 @@
+import copy
 import json
 import logging
+import os
+import shutil
 import sys
+import tempfile
+import threading
 import argparse
 from pathlib import Path
 
@@ -12,7 +17,84 @@ DEFAULT_CONFIG = {
     },
     "template_matching": {
         "confidence": 0.7,
+        "interval_sec": 1.0,
+        "scales": [1.0, 0.8, 1.25, 1.5],
+        "pyramid_levels": 2,
+        "worker_processes": 0
+    },
+    "template_pack": {
+        "enabled": True,
+        "locale": ""
+    },
+    "roi": {
+        "padding": 40,
+        "max_misses": 5
+    },
+    "scheduler": {
+        "in_queue_sec": 0.25,
+        "ready_check_sec": 0.1,
+        "post_accept_sec": 3.0,
+        "backoff_max_sec": 30.0
+    },
+    "change_gate": {
+        "enabled": True,
+        "downscale": 8,
+        "threshold": 8
+    },
+    "prefilter": {
+        "enabled": True,
+        "step": 8,
+        "slack": 0.5
+    },
+    "capture": {
+        "backend": "pyautogui",
+        "replay_path": "",
+        "replay_loop": True,
+        "replay_displays": [],
+        "ring_size": 3
+    },
+    "metrics": {
+        "enabled": False,
+        "log_interval_sec": 60,
+        "prometheus_file": "",
+        "prometheus_port": 0
+    },
+    "displays": {
+        "enabled": True,
+        "sweep_after": 10
+    },
+    "verify": {
+        "window_sec": 2.0,
+        "interval_sec": 0.05,
+        "retry_sec": 0.3,
+        "max_clicks": 3,
+        "confirm_misses": 2
+    },
+    "calibration": {
+        "record_scores": True
+    },
+    "history": {
+        "enabled": True,
+        "max_bytes": 1048576,
+        "backups": 20
+    },
+    "lcu": {
+        "enabled": True,
+        "lockfile": "",
+        "retry_sec": 5.0
+    },
+    "reload": {
+        "enabled": True,
         "interval_sec": 1.0
+    },
+    "daemon": {
+        "address": "",
+        "auto_start": True,
+        "auto_stop": True
+    },
+    "profiler": {
+        "interval_ms": 5,
+        "duration_sec": 30
     }
 }
 
@@ -22,29 +104,257 @@ def get_config_path():
     else:
         return Path(__file__).resolve().parent.parent / 'config.json'
 
+def get_data_path(filename):
+    """学習結果などの保存先。凍結ビルドでは一時展開先ではなく実行ファイルの隣に置く"""
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).resolve().parent / filename
+    else:
+        return Path(__file__).resolve().parent.parent / filename
+
+def get_section(config, name):
+    """設定のセクションを取得する。古い config.json に無い項目はデフォルト値で補う"""
+    section = dict(DEFAULT_CONFIG.get(name, {}))
+    section.update(config.get(name, {}))
+    return section
+
 def load_config():
     path = get_config_path()
     if path.exists():
         try:
-            return json.loads(path.read_text(encoding='utf-8'))
+            config = json.loads(path.read_text(encoding='utf-8'))
         except Exception as e:
             logging.error(f"設定ファイル読み込み失敗: {e}")
+        else:
+            # 再読み込みと同じ検証をかけ、通らなければ（ファイルは残したまま）デフォルト設定で起動する
+            try:
+                return validate_config(config)
+            except (ValueError, TypeError) as e:
+                logging.warning(f"設定ファイルを反映できません（デフォルト設定を使います）: {e}")
+                return copy.deepcopy(DEFAULT_CONFIG)
     try:
-        path.write_text(json.dumps(DEFAULT_CONFIG, indent=4), encoding='utf-8')
+        write_atomic(path, json.dumps(DEFAULT_CONFIG, indent=4))
         logging.info(f"デフォルト設定作成: {path}")
     except Exception as e:
         logging.error(f"設定ファイル作成失敗: {e}")
-    return DEFAULT_CONFIG.copy()
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+def _current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# os.umask は読むだけでも書き換えが要るので、スレッドが増える前（import 時）に 1 度だけ読む
+_UMASK = _current_umask()
+
+def write_atomic(path, text, mode=None):
+    """同じディレクトリの一時ファイルに書き込んでから置き換える。途中で落ちても元のファイルは壊れない
+
+    mkstemp の一時ファイルは本人だけが読める 0600 で作られるので、置き換える前に
+    既存のファイルのパーミッション（無ければ umask に従った通常の値）に揃える。
+    mode を指定した場合はそのパーミッションにする（認証キーなど）。
+    """
+    path = Path(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(temp_path, mode)
+        elif path.exists():
+            shutil.copymode(path, temp_path)
+        else:
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
 
 def save_config(config):
+    """config.json に保存する。保存できたら True"""
     path = get_config_path()
     try:
-        path.write_text(json.dumps(config, indent=4), encoding='utf-8')
+        write_atomic(path, json.dumps(config, indent=4))
         logging.info(f"設定ファイル保存: {path}")
+        return True
     except Exception as e:
         logging.error(f"設定ファイル保存失敗: {e}")
+        return False
+
+def _require(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _is_display(value):
+    return isinstance(value, (list, tuple)) and len(value) == 4 and all(_is_int(v) for v in value)
+
+_POSITIVE = (lambda v: _is_number(v) and v > 0, "正の数")
+_NON_NEGATIVE = (lambda v: _is_number(v) and v >= 0, " 0 以上の数")
+_COUNT = (lambda v: _is_int(v) and v >= 1, " 1 以上の整数")
+_NON_NEGATIVE_INT = (lambda v: _is_int(v) and v >= 0, " 0 以上の整数")
+_BOOL = (lambda v: isinstance(v, bool), " true か false ")
+_STRING = (lambda v: isinstance(v, str), "文字列")
+
+# (セクション, 項目, (検証, 説明))。images・confidence・scales・scheduler・profiler は validate_config で個別に確かめる
+_FIELDS = [
+    ('template_matching', 'interval_sec', _POSITIVE),
+    ('template_matching', 'pyramid_levels', _NON_NEGATIVE_INT),
+    ('template_matching', 'worker_processes', _NON_NEGATIVE_INT),
+    ('template_pack', 'enabled', _BOOL),
+    ('template_pack', 'locale', _STRING),
+    ('roi', 'padding', _NON_NEGATIVE_INT),
+    ('roi', 'max_misses', _COUNT),
+    ('change_gate', 'enabled', _BOOL),
+    ('change_gate', 'downscale', _COUNT),
+    ('change_gate', 'threshold', _NON_NEGATIVE),
+    ('prefilter', 'enabled', _BOOL),
+    ('prefilter', 'step', _COUNT),
+    ('prefilter', 'slack', _NON_NEGATIVE),
+    ('capture', 'backend', _STRING),
+    ('capture', 'replay_path', _STRING),
+    ('capture', 'replay_loop', _BOOL),
+    ('capture', 'replay_displays', (lambda v: isinstance(v, (list, tuple)) and all(_is_display(d) for d in v),
+                                    " [left, top, width, height] の配列")),
+    ('capture', 'ring_size', _NON_NEGATIVE_INT),
+    ('metrics', 'enabled', _BOOL),
+    ('metrics', 'log_interval_sec', _POSITIVE),
+    ('metrics', 'prometheus_file', _STRING),
+    ('metrics', 'prometheus_port', (lambda v: _is_int(v) and 0 <= v <= 65535, " 0 から 65535 の整数")),
+    ('displays', 'enabled', _BOOL),
+    ('displays', 'sweep_after', _NON_NEGATIVE_INT),
+    ('verify', 'window_sec', _NON_NEGATIVE),
+    ('verify', 'interval_sec', _NON_NEGATIVE),
+    ('verify', 'retry_sec', _NON_NEGATIVE),
+    ('verify', 'max_clicks', _COUNT),
+    ('verify', 'confirm_misses', _COUNT),
+    ('calibration', 'record_scores', _BOOL),
+    ('history', 'enabled', _BOOL),
+    ('history', 'max_bytes', _COUNT),
+    ('history', 'backups', _NON_NEGATIVE_INT),
+    ('lcu', 'enabled', _BOOL),
+    ('lcu', 'lockfile', _STRING),
+    ('lcu', 'retry_sec', _POSITIVE),
+    ('reload', 'enabled', _BOOL),
+    ('reload', 'interval_sec', _POSITIVE),
+    ('daemon', 'address', _STRING),
+    ('daemon', 'auto_start', _BOOL),
+    ('daemon', 'auto_stop', _BOOL),
+]
+
+def validate_config(config):
+    """読み込んだ設定を検証する。型や範囲が合わない値は ValueError にする"""
+    _require(isinstance(config, dict), "設定がオブジェクトではありません")
+    for name, section in config.items():
+        _require(name not in DEFAULT_CONFIG or isinstance(section, dict), f"{name} がオブジェクトではありません")
+    images = config.get('images', DEFAULT_CONFIG['images'])
+    _require(all(isinstance(v, str) and v for v in images.values()), "images の値はファイル名にしてください")
+    _require('accept_button' in images, "images.accept_button がありません")
+    matching = get_section(config, 'template_matching')
+    _require(_is_number(matching['confidence']) and 0 < matching['confidence'] <= 1,
+             "template_matching.confidence は 0 より大きく 1 以下にしてください")
+    scales = matching['scales']
+    _require(isinstance(scales, (list, tuple)) and scales and all(_is_number(v) and v > 0 for v in scales),
+             "template_matching.scales は正の数の配列にしてください")
+    for name, key, (valid, description) in _FIELDS:
+        _require(valid(get_section(config, name)[key]), f"{name}.{key} は{description}にしてください")
+    for key, value in get_section(config, 'scheduler').items():
+        _require(_is_number(value) and value >= 0, f"scheduler.{key} は 0 以上の数にしてください")
+    for key, value in get_section(config, 'profiler').items():
+        _require(_is_number(value) and value > 0, f"profiler.{key} は正の数にしてください")
+    return config
+
+
+class FrozenDict(dict):
+    """変更できない dict。json.dumps や get_section はそのまま使える"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("設定のスナップショットは変更できません")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        # ワーカープロセスへ pickle で渡すときは通常の dict のように中身から作り直す
+        return (FrozenDict, (dict(self),))
+
+def freeze_config(config):
+    """スキャン中に読むための不変なスナップショット。配列はタプルになる"""
+    if isinstance(config, dict):
+        return FrozenDict((key, freeze_config(value)) for key, value in config.items())
+    if isinstance(config, (list, tuple)):
+        return tuple(freeze_config(value) for value in config)
+    return config
+
+
+class ConfigWatcher:
+    """config.json の更新を更新時刻で検出し、検証済みのスナップショットを on_change に渡す
+
+    保存は write_atomic による置き換えなので、書きかけのファイルを読むことはない。
+    検証に失敗した場合や on_change が False を返した場合は、それまでの設定を使い続ける。
+    自前のスレッドは持たず、コアループが interval_sec ごとに check を呼ぶ。
+    """
+
+    def __init__(self, on_change, path=None, interval_sec=1.0):
+        self.on_change = on_change
+        self.path = Path(path) if path else get_config_path()
+        self.interval_sec = interval_sec
+        self.signature = self._signature()
+        # 検証や反映に失敗したときのファイルの状態
+        self.rejected = None
+        self.lock = threading.Lock()
+
+    def _signature(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, getattr(stat, 'st_ino', 0))
+
+    def mark_current(self):
+        """現在のファイルを反映済みとみなす（反映中の設定を保存したときに読み直さない）"""
+        with self.lock:
+            self.signature = self._signature()
+            self.rejected = None
+
+    def check(self, force=False):
+        """変更があれば読み込んで通知する。通知したら True"""
+        with self.lock:
+            signature = self._signature()
+            if signature is None or (signature in (self.signature, self.rejected) and not force):
+                return False
+            try:
+                config = validate_config(json.loads(self.path.read_text(encoding='utf-8')))
+            except (OSError, ValueError, TypeError) as e:
+                logging.warning(f"設定ファイルを反映できません（以前の設定を使います）: {e}")
+                # 同じ内容で警告を繰り返さない。保存し直されれば改めて読む
+                self.rejected = signature
+                return False
+        logging.info(f"設定ファイルの変更を検出しました: {self.path}")
+        if self.on_change(freeze_config(config)) is False:
+            with self.lock:
+                self.rejected = signature
+            return False
+        with self.lock:
+            # 反映できた内容だけを現在の設定とみなす
+            self.signature = signature
+            self.rejected = None
+        return True
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='LoL Auto Accept - マッチング画面の自動承認ツール')
     parser.add_argument('--nogui', action='store_true', help='GUIを表示せずにコマンドラインで実行')
+    parser.add_argument('--startup-profile', action='store_true', help='起動時の import と初期化の所要時間を表示')
+    parser.add_argument('--daemon', action='store_true', help='GUI・トレイなしで常駐し、ローカルのソケットで操作を受け付ける')
+    parser.add_argument('--attach', action='store_true', help='起動中のデーモンに接続する（GUI・トレイは表示だけを行う）')
+    parser.add_argument('--profile', type=float, metavar='SECONDS', nargs='?', const=0, default=None,
+                        help='起動直後からスキャンのスレッドをサンプリングし、profiles/ に結果を書き出す（秒数省略時は profiler.duration_sec）')
     return parser.parse_args()
@@ -1,77 +1,480 @@
-import threading
 import logging
-import time
-from pathlib import Path
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from config_utils import ConfigWatcher, get_data_path, get_section, save_config
+from core_loop import CoreLoop, UiQueue
+from history import (
+    BUTTON_SEEN,
+    CLICK,
+    MATCHING_SEEN,
+    STARTED,
+    STOPPED,
+    VERIFIED,
+    history,
+    start_history,
+)
+from metrics import metrics, start_metrics
+from sampling_profiler import SamplingProfiler
+from scheduler import IDLE
+from startup_profile import StartupProfile
+
 
 class Controller:
-    def __init__(self, auto_accept, gui=None):
-        self.auto_accept = auto_accept
+    """Owns the monitoring state; every change to it runs on the core loop thread
+
+    Public methods (start, stop, set_options, reload_config, show_window, exit) may be
+    called from any thread and are forwarded to the core loop. The GUI and tray icon
+    subscribe to self.ui and receive ('ready' | 'monitoring' | 'config' | 'show' | 'quit')
+    messages instead of being called directly.
+    With threaded=False no loop thread is started: commands run on the caller's thread
+    and captures happen only when step() is called.
+    """
+    def __init__(self, auto_accept=None, gui=None, threaded=True):
+        self.auto_accept = None
         self.gui = gui
         self.monitoring = False
-        self.monitor_thread = None
         self.running = True
-        self.tray_icon = None
+        self.scheduler = None
+        self.pipeline = None
+        self.capture_ticker = None
+        self.metrics_exporter = None
+        self.instrumented = False
+        # Screen state from the last queue check (lobby, in_queue, ready_check, ...); None when not looking
+        self.client_state = None
+        # Scans in the current monitoring session, written to the history on stop
+        self.session_scans = 0
+        self.lcu = None
+        # A client API accept is in flight on the executor
+        self.api_accepting = False
+        self.config_watcher = None
+        # Options from the GUI checkboxes: start on the matching screen / stop after an accept
+        self.auto_start = False
+        self.auto_stop = False
+        # Detection (templates, capture backend) may still be loading in the background
+        self.ready = threading.Event()
+        self.exited = threading.Event()
+        self.exit_lock = threading.Lock()
+        self.exiting = False
+        # On-demand sampling of the core loop, toggled from the tray, --profile or the daemon client
+        self.profiler = None
+        self.profile_lock = threading.Lock()
+        self.ui = UiQueue()
+        self.core = CoreLoop()
+        if threaded:
+            self.core.start()
+        if auto_accept is not None:
+            self.attach(auto_accept)
+
+    def initialize_async(self, config, profile=None):
+        """Load LoLAutoAccept (cv2, templates, capture backend) on a background thread"""
+        profile = profile or StartupProfile()
+        self._start_instrumentation(config)
+
+        def initialize():
+            try:
+                with profile.stage('import lol_auto_accept'):
+                    from lol_auto_accept import LoLAutoAccept
+                with profile.stage('LoLAutoAccept()'):
+                    auto_accept = LoLAutoAccept(config)
+            except (Exception, SystemExit) as e:
+                logging.error(f"検出機能の初期化に失敗しました: {str(e)}")
+                self.exit()
+                return
+            self.attach(auto_accept)
+            profile.mark('detection ready')
+            profile.report('detection ready')
+
+        threading.Thread(target=initialize, name='initialize', daemon=True).start()
+
+    def _start_instrumentation(self, config):
+        """Start metrics and the match history once, as early as the config is known"""
+        if self.instrumented:
+            return
+        self.instrumented = True
+        self.metrics_exporter = start_metrics(get_section(config, 'metrics'))
+        start_history(get_section(config, 'history'), get_data_path('history.jsonl'))
+
+    def attach(self, auto_accept):
+        """Wire up the capture pipeline once LoLAutoAccept is available"""
+        from capture import CapturePipeline
+
+        self.auto_accept = auto_accept
+        self.scheduler = auto_accept.scheduler
+        # 承認ボタン検出とマッチング画面検出で 1 つのキャプチャを共有する
+        self.pipeline = CapturePipeline(auto_accept.grab_frame, self.scheduler)
+        self._start_instrumentation(auto_accept.config)
+        reload_config = get_section(auto_accept.config, 'reload')
+        if reload_config['enabled']:
+            # config.json を保存すると次のキャプチャから新しい設定で検出する
+            self.config_watcher = ConfigWatcher(self._on_config_change, interval_sec=reload_config['interval_sec'])
+        self.core.call(self._on_attached)
+        if get_section(auto_accept.config, 'lcu')['enabled']:
+            from lcu import LcuWatcher
+
+            # クライアント API が使える間は画面キャプチャを止め、イベントで承認する
+            # イベントは LCU のスレッドで届くので、処理はコアループに渡す
+            self.lcu = LcuWatcher(auto_accept.config,
+                                  on_ready_check=self._in_core(self._on_ready_check),
+                                  on_phase=self._in_core(self._on_phase),
+                                  on_connect=self._in_core(self._on_lcu_connect),
+                                  on_disconnect=self._in_core(self._on_lcu_disconnect))
+            self.lcu.start()
+
+    def _in_core(self, callback):
+        return lambda *args: self.core.call(callback, *args)
+
+    def _on_attached(self):
+        self.capture_ticker = self.core.periodic(self.pipeline.step, 'capture', timer='sleep')
+        if self.config_watcher:
+            self.core.periodic(self._check_config, 'config')
+        self.ready.set()
+        logging.info("検出機能の準備ができました")
+        # 画像ファイル（またはテンプレートパック）の存在確認
+        if not self.auto_accept.templates.available('matching_screen'):
+            logging.error(f"マッチング画像が見つかりません: {self.auto_accept.templates.path('matching_screen')}")
+        # Monitoring may have been requested while still loading
+        self._update_detectors()
+        self.ui.post('ready')
+
+    def step(self):
+        """Run one capture tick on the calling thread (threaded=False); returns the delay before the next one
+
+        None means nothing is registered and no capture was made. 0 means a detector was
+        registered during the tick and, as on the loop, should run without waiting.
+        """
+        if self.pipeline is None:
+            return None
+        self.capture_ticker.woken = False
+        delay = self.pipeline.step()
+        return 0 if self.capture_ticker.woken else delay
+
+    def set_options(self, auto_start=None, auto_stop=None):
+        """Update the GUI options; the matching screen detector follows auto_start"""
+        self.core.call(self._set_options, auto_start, auto_stop)
+
+    def _set_options(self, auto_start, auto_stop):
+        if auto_start is not None:
+            self.auto_start = auto_start
+        if auto_stop is not None:
+            self.auto_stop = auto_stop
+        self._update_detectors()
     
+    def reload_config(self, wait=False):
+        """Re-read config.json now instead of waiting for the next check; the result is posted as 'config'
+
+        With wait=True, block until it has been checked and return True if it was applied.
+        """
+        if wait:
+            return self.core.run(self._reload_config, timeout=5)
+        self.core.call(self._reload_config)
+
+    def _reload_config(self):
+        applied = self.config_watcher is not None and self.config_watcher.check(force=True)
+        if not applied:
+            self.ui.post('config', False)
+        return applied
+
+    def save_config(self):
+        """Write the settings in use to config.json; returns True if saved"""
+        return self.core.run(self._save_config, timeout=5)
+
+    def _save_config(self):
+        if self.auto_accept is None or not save_config(self.auto_accept.config):
+            return False
+        if self.config_watcher is not None:
+            # The file now holds what is already applied, so don't reload it
+            self.config_watcher.mark_current()
+        return True
+
+    def _check_config(self):
+        self.config_watcher.check()
+        return self.config_watcher.interval_sec
+
+    def _on_config_change(self, config):
+        """Validated snapshot from the config watcher, applied right away on the core loop
+
+        Returns False, keeping the previous settings, if it could not be applied.
+        """
+        self.auto_accept.publish_config(config)
+        applied = self.auto_accept.apply_published_config()
+        self.ui.post('config', applied)
+        return applied
+
+    def lcu_connected(self):
+        return self.lcu is not None and self.lcu.connected.is_set()
+
+    def _update_detectors(self):
+        """Register exactly the screen detectors the current state needs on the capture pipeline
+
+        Nothing is captured while the client API is connected. The matching screen is
+        looked for while monitoring (it sets the polling rate) or while auto start is on,
+        and before the accept button so each tick sees the queue state first.
+        """
+        if self.pipeline is None:
+            return
+        wanted = {}
+        if self.running and not self.lcu_connected():
+            if (self.monitoring or self.auto_start) and self.auto_accept.templates.available('matching_screen'):
+                wanted['matching_screen'] = self._detect_queue
+            if self.monitoring:
+                wanted['accept_button'] = self.monitor
+        added = False
+        for name, detector in wanted.items():
+            if name not in self.pipeline.detectors:
+                self.pipeline.register(name, detector)
+                added = True
+        for name in list(self.pipeline.detectors):
+            if name not in wanted:
+                self.pipeline.unregister(name)
+        if 'matching_screen' not in wanted:
+            self.client_state = None
+        if added and self.capture_ticker:
+            self.capture_ticker.wake()
+
+    def _on_lcu_connect(self):
+        self._update_detectors()
+        logging.info("クライアント API で検出するため画面キャプチャを停止しました")
+
+    def _on_lcu_disconnect(self):
+        self._update_detectors()
+        logging.info("クライアント API が使えないため画面検出に切り替えました")
+
+    def _on_phase(self, phase):
+        """Gameflow phase from the client API; entering the queue replaces the matching screen detector"""
+        if phase != 'Matchmaking':
+            return
+        history.record(MATCHING_SEEN, via='api')
+        if not self.monitoring and self.auto_start:
+            logging.info("キューの開始を検出しました。自動監視を開始します。")
+            self._start()
+
+    def _on_ready_check(self, ready_check):
+        """Accept a ready check reported by the client API
+
+        The POST runs off the core loop so ticks and commands don't wait on HTTP;
+        the result comes back to _on_api_accepted on the loop.
+        """
+        if not (self.monitoring and self.running) or self.api_accepting:
+            return
+        if ready_check.get('state') != 'InProgress' or ready_check.get('playerResponse') != 'None':
+            return
+        history.record(BUTTON_SEEN, via='api')
+        history.record(CLICK, via='api')
+        self.api_accepting = True
+        self.core.offload(self._accept_api, self._on_api_accepted)
+
+    def _accept_api(self):
+        """Runs on the executor; errors count as not accepted"""
+        try:
+            with metrics.timer('accept_api'):
+                return self.lcu.accept()
+        except Exception as e:
+            logging.error(f"クライアント API での承認に失敗しました: {str(e)}")
+            return False
+
+    def _on_api_accepted(self, accepted):
+        self.api_accepting = False
+        if not accepted:
+            return
+        history.record(VERIFIED, via='api')
+        metrics.increment('api_accepts')
+        logging.info("クライアント API でマッチを承認しました")
+        # Monitoring may have been stopped while the request was in flight
+        if self.monitoring:
+            self._on_accepted()
+
+    def _detect_queue(self, frame):
+        """Look for the matching screen in a captured frame
+
+        Whether it is visible sets the polling rate (in_queue or idle), and it starts
+        monitoring when auto start is on. Optional state templates (decline_button,
+        champ_select, in_game) are matched on the same frame with detect_all to
+        track client_state.
+        """
+        if self.scheduler.paused() or self.scheduler.verifying():
+            # After a click the button's surroundings are all that matter until it is confirmed
+            return
+        with metrics.timer('auto_detect'):
+            frame, matching_pos = self.auto_accept.locate_any('matching_screen', frame)
+            # The accept button is searched by monitor() after this detector, so use what it last saw
+            state = self.auto_accept.detect_state(frame, {'matching_screen': matching_pos,
+                                                          'accept_button': self.scheduler.button_visible})
+        self.scheduler.observe(queue=matching_pos is not None)
+        if state != self.client_state:
+            logging.debug(f"クライアントの状態: {state}")
+            self.client_state = state
+        if matching_pos is not None and not self.monitoring and self.auto_start:
+            logging.info("マッチング画面を検出しました。自動監視を開始します。")
+            history.record(MATCHING_SEEN, via='screen')
+            self._start()
+
     def start(self):
         """Start monitoring for accept button"""
-        if self.monitoring:
+        self.core.call(self._start)
+
+    def _start(self):
+        if self.monitoring or not self.running:
             return
         
         self.monitoring = True
-        if self.gui:
-            self.gui.update_ui_on_start()
-        # Update tray icon if available
-        if self.tray_icon:
-            self.tray_icon.update_menu_state(True)
-        
-        def monitor():
-            logging.info("監視を開始しました")
-            while self.monitoring and self.running:
-                try:
-                    is_accepted = self.auto_accept.scan_screen()
-                    if is_accepted and self.gui and self.gui.auto_stop_var.get():
-                        # Set monitoring to false first to avoid recursion
-                        self.monitoring = False
-                        if self.gui:
-                            self.gui.update_ui_on_stop("承認完了 - 停止中")
-                        # Update tray icon if available
-                        if self.tray_icon:
-                            self.tray_icon.update_menu_state(False)
-                        break
-                except Exception as e:
-                    logging.error(f"監視中にエラーが発生しました: {str(e)}")
-                time.sleep(1)
-        
-        self.monitor_thread = threading.Thread(target=monitor, daemon=True)
-        self.monitor_thread.start()
+        self.session_scans = 0
+        history.record(STARTED)
+        logging.info("監視を開始しました")
+        # The polling rate follows what the next tick sees, not the monitoring flag
+        self._update_detectors()
+        self.ui.post('monitoring', (True, "監視中..."))
+
+    def monitor(self, frame):
+        """Look for the accept button in a captured frame
+
+        Errors propagate to the capture pipeline, which logs them and backs off.
+        """
+        if not (self.monitoring and self.running) or self.scheduler.paused():
+            return
+        self.session_scans += 1
+        with metrics.timer('monitor'):
+            is_accepted = self.auto_accept.scan_frame(frame)
+        if is_accepted:
+            self._on_accepted()
+
+    def _on_accepted(self):
+        """Stop monitoring after an accept if auto stop is on"""
+        if not self.auto_stop:
+            return
+        self.monitoring = False
+        history.record(STOPPED, reason='accepted', scans=self.session_scans)
+        self.scheduler.set_state(IDLE)
+        self._update_detectors()
+        self.ui.post('monitoring', (False, "承認完了 - 停止中"))
     
-    def stop(self):
+    def stop(self, reason='user'):
         """Stop monitoring for accept button"""
+        self.core.call(self._stop, reason)
+
+    def _stop(self, reason='user'):
         if not self.monitoring:
             return
-            
+
         self.monitoring = False
-        if self.monitor_thread and self.monitor_thread.is_alive():
-            self.monitor_thread.join(timeout=1)
-        
-        if self.gui:
-            self.gui.update_ui_on_stop()
-        # Update tray icon if available
-        if self.tray_icon:
-            self.tray_icon.update_menu_state(False)
+        history.record(STOPPED, reason=reason, scans=self.session_scans)
+        if self.pipeline:
+            self.auto_accept.cancel_click()
+            self.scheduler.set_state(IDLE)
+            logging.info(f"スキャン統計: {self.auto_accept.scan_stats()}")
+        self._update_detectors()
+        self.ui.post('monitoring', (False, "停止中"))
     
+    def status(self):
+        """Snapshot of the monitoring state, taken on the core loop"""
+        return self.core.run(self._status, timeout=5)
+
+    def _status(self):
+        return {
+            'ready': self.ready.is_set(),
+            'monitoring': self.monitoring,
+            'auto_start': self.auto_start,
+            'auto_stop': self.auto_stop,
+            'lcu_connected': self.lcu_connected(),
+            'detectors': sorted(self.pipeline.detectors) if self.pipeline else [],
+            'scheduler_state': self.scheduler.state if self.scheduler else None,
+            'client_state': self.client_state,
+            'captures': self.pipeline.ticks if self.pipeline else 0,
+        }
+
+    def stats(self):
+        """Stage timings, event counters and per-template scan statistics"""
+        return self.core.run(self._stats, timeout=5)
+
+    def _stats(self):
+        return {
+            'metrics_enabled': metrics.enabled,
+            'metrics': metrics.summary(),
+            'counters': dict(metrics.counters),
+            'scans': self.auto_accept.scan_stats() if self.auto_accept else {},
+        }
+
     def show_window(self):
         """Show the GUI window if it exists"""
-        if self.gui:
-            self.gui.show()
+        self.ui.post('show')
     
-    def exit(self):
-        """Exit the application completely"""
+    def start_profile(self, duration_sec=None, config=None):
+        """Sample the core loop (and display sweeps) for a bounded window
+
+        Results go to profiles/ as a collapsed stack file and a per-stage summary.
+        Returns False if a profile is already running.
+        """
+        if config is None:
+            config = self.auto_accept.config if self.auto_accept else {}
+        section = get_section(config, 'profiler')
+        with self.profile_lock:
+            if self.profiler and self.profiler.running:
+                return False
+            self.profiler = SamplingProfiler(
+                threads=(self.core.name, 'display'),
+                interval_sec=section['interval_ms'] / 1000,
+                duration_sec=duration_sec or section['duration_sec'],
+                output_dir=get_data_path('profiles'),
+                on_finish=self._on_profile_finished,
+            )
+            self.profiler.start()
+        self.ui.post('profile', (True, None))
+        return True
+
+    def stop_profile(self):
+        """Stop a running profile early; its results are still written"""
+        with self.profile_lock:
+            if not (self.profiler and self.profiler.running):
+                return False
+            self.profiler.stop()
+        return True
+
+    def toggle_profile(self, duration_sec=None):
+        """Start a profile, or stop the running one. Returns True if one was started"""
+        if self.stop_profile():
+            return False
+        return self.start_profile(duration_sec)
+
+    def _on_profile_finished(self, paths):
+        # Called on the profiler thread after the files are written
+        self.ui.post('profile', (False, str(paths['summary']) if paths else None))
+
+    def _shutdown(self):
+        self._stop(reason='exit')
         self.running = False
-        self.stop()
-        if self.gui:
-            self.gui.quit()
-        else:
-            # If no GUI, we need to exit the application directly
+        self._update_detectors()
+
+    def exit(self):
+        """Exit the application completely
+
+        Shuts down in a fixed order: client API events, then the core loop (after the
+        current tick finishes), then the capture backend, metrics and history.
+        Safe to call more than once and from any thread.
+        """
+        with self.exit_lock:
+            if self.exiting:
+                return
+            self.exiting = True
+        if self.lcu:
+            self.lcu.stop()
+        if self.stop_profile():
+            # Let the profiler write what it has before the process ends
+            self.profiler.thread.join(timeout=5)
+        try:
+            self.core.run(self._shutdown, timeout=5)
+        except FutureTimeoutError:
+            logging.warning("監視の停止が時間内に完了しませんでした")
+            self.running = False
+        self.core.stop()
+        if self.auto_accept:
+            self.auto_accept.close()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        history.close()
+        self.exited.set()
+        self.ui.post('quit')
+        if not self.gui and threading.current_thread() is threading.main_thread():
+            # If no GUI, we need to exit the application directly; on other threads (the daemon's
+            # shutdown request) SystemExit would only end that thread, and the main thread waits on exited
             import sys
             sys.exit(0)
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import metrics
+
+
+class CoreLoop:
+    """スケジューリング・キャプチャ・検出を 1 つのスレッドの asyncio ループで行う
+
+    コントローラの状態（監視中かどうか、登録された検出器など）はこのスレッドだけが変更する。
+    GUI・トレイ・クライアント API のスレッドからは call / run で処理を依頼する。
+    start しなければスレッドを作らず、call は呼び出し元でそのまま実行する（リプレイでの検証用）。
+    """
+
+    def __init__(self, name='core'):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.tickers = []
+
+    @property
+    def threaded(self):
+        return self.thread is not None
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(started.set)
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name=self.name, daemon=True)
+        self.thread.start()
+        started.wait()
+
+    def in_loop(self):
+        return self.thread is None or threading.current_thread() is self.thread
+
+    def call(self, callback, *args):
+        """callback をループのスレッドで実行する（結果は待たない）"""
+        if self.in_loop():
+            self._guard(callback, args)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._guard, callback, args)
+        except RuntimeError:
+            # 終了後に届いた依頼は捨てる
+            pass
+
+    def run(self, callback, *args, timeout=None):
+        """callback をループのスレッドで実行し、結果を待って返す"""
+        if self.in_loop():
+            return callback(*args)
+        future = Future()
+
+        def invoke():
+            try:
+                future.set_result(callback(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        self.loop.call_soon_threadsafe(invoke)
+        return future.result(timeout)
+
+    def offload(self, func, callback):
+        """ブロックする func（クライアント API への HTTP など）をスレッドプールで実行し、
+        戻り値を callback に渡してループのスレッドで実行する（ティックを止めない）
+
+        start していなければその場で実行する。func の例外はログに残し、callback は呼ばない
+        """
+        if not self.threaded:
+            try:
+                result = func()
+            except Exception:
+                logging.exception(f"コアループ外の処理でエラーが発生しました: {getattr(func, '__name__', func)}")
+                return
+            self._guard(callback, (result,))
+            return
+
+        def done(future):
+            try:
+                result = future.result()
+            except Exception:
+                logging.exception(f"コアループ外の処理でエラーが発生しました: {getattr(func, '__name__', func)}")
+                return
+            self._guard(callback, (result,))
+
+        self.call(lambda: self.loop.run_in_executor(None, func).add_done_callback(done))
+
+    @staticmethod
+    def _guard(callback, args):
+        try:
+            callback(*args)
+        except Exception:
+            logging.exception(f"コアループの処理でエラーが発生しました: {getattr(callback, '__name__', callback)}")
+
+    def periodic(self, step, name, timer=None):
+        """step() を繰り返し実行するタスクを作る。step は次の実行までの秒数（None なら wake まで待つ）を返す
+
+        timer を指定すると待機時間をその名前で計測する
+        """
+        ticker = Ticker(self, step, name, timer)
+        self.tickers.append(ticker)
+        if self.threaded:
+            self.call(ticker.schedule)
+        return ticker
+
+    def stop(self, timeout=5.0):
+        """タスクを止めてループを終了する。実行中のティックは最後まで実行される"""
+        if not self.threaded or self.loop.is_closed():
+            return
+        if threading.current_thread() is self.thread:
+            # ループのスレッドからは終了を予約するだけ（自分自身は待てない）
+            self.loop.create_task(self._finish())
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._finish(), self.loop)
+        except RuntimeError:
+            return
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            logging.warning("コアループが時間内に終了しませんでした")
+
+    async def _finish(self):
+        tasks = [ticker.task for ticker in self.tickers if ticker.task is not None]
+        for task in tasks:
+            task.cancel()
+        # キャンセルが各タスクに届いてからループを止める
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+
+class Ticker:
+    """CoreLoop.periodic で作る繰り返しタスク。wake で待機を打ち切れる"""
+
+    def __init__(self, core, step, name, timer=None):
+        self.core = core
+        self.step = step
+        self.name = name
+        self.timer = timer
+        self.task = None
+        self.event = None
+        self.woken = False
+
+    def schedule(self):
+        self.task = self.core.loop.create_task(self._run())
+
+    def wake(self):
+        """待機を打ち切ってすぐに次の step を実行する（どのスレッドからでも呼べる）"""
+        self.core.call(self._set)
+
+    def _set(self):
+        self.woken = True
+        if self.event is not None:
+            self.event.set()
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def _run(self):
+        # Event はループの中で作る（3.9 以前は作成時のループに結び付くため）
+        self.event = asyncio.Event()
+        while True:
+            self.woken = False
+            try:
+                delay = self.step()
+            except Exception:
+                logging.exception(f"{self.name} の実行中にエラーが発生しました")
+                delay = 1.0
+            if self.woken:
+                continue
+            self.event.clear()
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.event.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            if self.timer:
+                metrics.observe(self.timer, (time.perf_counter() - start) * 1000)
+
+
+class UiQueue:
+    """コアループから GUI・トレイへの通知
+
+    受け手ごとに種類 (kind) ごとの最新の値だけを溜め、まとめて 1 回で反映する。
+    schedule(callback) には受け手のスレッドで callback を実行する方法を渡す（Tk なら root.after）。
+    """
+
+    def __init__(self):
+        self.channels = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, handler, schedule=None):
+        channel = _UiChannel(handler, schedule)
+        with self.lock:
+            self.channels.append(channel)
+        return channel
+
+    def unsubscribe(self, channel):
+        with self.lock:
+            if channel in self.channels:
+                self.channels.remove(channel)
+
+    def post(self, kind, value=None):
+        with self.lock:
+            channels = list(self.channels)
+        for channel in channels:
+            channel.post(kind, value)
+
+
+class _UiChannel:
+    def __init__(self, handler, schedule):
+        self.handler = handler
+        # schedule が無ければ通知したスレッドでそのまま反映する
+        self.schedule = schedule or (lambda callback: callback())
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def post(self, kind, value):
+        with self.lock:
+            first = not self.pending
+            # 同じ種類の通知は最新の値で上書きする（順序は最初に届いたときのまま）
+            self.pending[kind] = value
+        if first:
+            try:
+                self.schedule(self.drain)
+            except Exception as e:
+                logging.debug(f"UI への通知を反映できません: {e}")
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for kind, value in pending.items():
+            try:
+                self.handler(kind, value)
+            except Exception:
+                logging.exception(f"UI の更新中にエラーが発生しました: {kind}")
@@ -0,0 +1,238 @@
+"""常駐デーモン: 画面キャプチャと検出だけを行い、ローカルのソケットで操作を受け付ける
+
+    python src/main.py --daemon
+    python src/daemon_client.py status
+
+GUI（tkinter, PIL.ImageTk）やトレイは読み込まない。操作は daemon_client.py か、
+--attach で接続した GUI・トレイから行う。通信は multiprocessing.connection で、
+Unix ドメインソケット（Windows では名前付きパイプ）と daemon.key による認証を使う。
+"""
+import logging
+import os
+import queue
+import secrets
+import signal
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+from config_utils import get_data_path, get_section, write_atomic
+from daemon_client import KEY_FILE, default_address, read_authkey
+
+
+def current_rss_kb():
+    """現在の RSS。/proc が無い環境では最大 RSS で代用する（Windows では None）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS はバイト、Linux は KB
+        return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+class ControlServer:
+    """Controller の操作と UI 通知をローカルのソケットで公開する
+
+    要求 {'command': 名前, 'args': {...}} に {'ok': bool, 'result' | 'error': ...} を返す。
+    'subscribe' を送った接続には、以降 UI 通知の (kind, value) を流す。
+    接続ごとにスレッドを使い、通知が無い間は起きない。
+    """
+
+    def __init__(self, controller, address=None, key_path=None):
+        self.controller = controller
+        self.address = address or default_address()
+        self.key_path = Path(key_path) if key_path else get_data_path(KEY_FILE)
+        self.authkey = None
+        self.listener = None
+        self.closed = False
+        self.started = time.time()
+
+    def start(self):
+        """待ち受けを始める。既に別のデーモンが動いていれば RuntimeError"""
+        if self._running_elsewhere():
+            raise RuntimeError(f"デーモンは既に起動しています: {self.address}")
+        if not self.address.startswith('\\\\') and os.path.exists(self.address):
+            # 前回異常終了したときのソケットファイル
+            os.unlink(self.address)
+        token = secrets.token_hex(32)
+        # 本人だけが読めるようにする
+        write_atomic(self.key_path, token, mode=0o600)
+        self.authkey = token.encode()
+        self.listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self._accept_loop, name='control', daemon=True).start()
+        logging.info(f"操作を受け付けています: {self.address}")
+
+    def _running_elsewhere(self):
+        try:
+            Client(self.address, authkey=read_authkey(self.key_path)).close()
+        except (OSError, EOFError, AuthenticationError):
+            return False
+        return True
+
+    def close(self):
+        if self.closed or self.listener is None:
+            return
+        self.closed = True
+
+        def wake():
+            # accept で待っているスレッドを起こす（既に抜けていれば誰も応答しないので待たない）
+            try:
+                Client(self.address, authkey=self.authkey).close()
+            except (OSError, EOFError, AuthenticationError):
+                pass
+
+        threading.Thread(target=wake, daemon=True).start()
+        # ソケットファイルは Listener.close が消す
+        self.listener.close()
+        try:
+            self.key_path.unlink()
+        except OSError:
+            pass
+
+    def _accept_loop(self):
+        while not self.closed:
+            try:
+                connection = self.listener.accept()
+            except AuthenticationError:
+                logging.warning("認証に失敗した接続を拒否しました")
+                continue
+            except (OSError, EOFError):
+                # 閉じた後か、認証の途中で切断された接続
+                if self.closed:
+                    break
+                continue
+            if self.closed:
+                connection.close()
+                break
+            threading.Thread(target=self._serve, args=(connection,), name='control-client', daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            while True:
+                request = connection.recv()
+                command = request.get('command')
+                if command == 'subscribe':
+                    self._stream(connection)
+                    return
+                try:
+                    reply = {'ok': True, 'result': self.handle(command, request.get('args', {}))}
+                except Exception as e:
+                    reply = {'ok': False, 'error': str(e)}
+                connection.send(reply)
+                if command == 'shutdown':
+                    logging.info("クライアントの要求によりデーモンを終了します")
+                    threading.Thread(target=self.controller.exit, name='shutdown', daemon=True).start()
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def handle(self, command, args):
+        controller = self.controller
+        if command == 'status':
+            return self.status()
+        if command == 'start':
+            controller.start()
+            return self.status()
+        if command == 'stop':
+            controller.stop()
+            return self.status()
+        if command == 'set_options':
+            controller.set_options(**args)
+            return self.status()
+        if command == 'reload':
+            return controller.reload_config(wait=True)
+        if command == 'save':
+            return controller.save_config()
+        if command == 'metrics':
+            return controller.stats()
+        if command == 'profile':
+            return controller.toggle_profile(args.get('duration_sec'))
+        if command == 'shutdown':
+            return None
+        raise ValueError(f"不明なコマンドです: {command}")
+
+    def status(self):
+        status = self.controller.status()
+        status.update(
+            pid=os.getpid(),
+            uptime_sec=round(time.time() - self.started, 1),
+            rss_kb=current_rss_kb(),
+            cpu_sec=round(time.process_time(), 3),
+        )
+        return status
+
+    def _stream(self, connection):
+        """UI 通知をこの接続に流す。送信は別スレッドで行い、このスレッドは切断を待つ"""
+        pending = queue.SimpleQueue()
+
+        def forward(kind, value):
+            # ウィンドウの表示はクライアント側の操作なので流さない
+            if kind != 'show':
+                try:
+                    connection.send((kind, value))
+                except OSError:
+                    pending.put(None)
+
+        def send_loop():
+            while True:
+                drain = pending.get()
+                if drain is None:
+                    return
+                drain()
+
+        # 状態は送るときに取るので、購読を始めてからの通知を取りこぼさない（重複はしうる）
+        pending.put(lambda: forward('status', self.status()))
+        channel = self.controller.ui.subscribe(forward, pending.put)
+        try:
+            sender = threading.Thread(target=send_loop, name='control-events', daemon=True)
+            sender.start()
+            # 通知用の接続には何も送られてこないので、recv は切断されたときだけ戻る
+            while True:
+                connection.recv()
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.controller.ui.unsubscribe(channel)
+            pending.put(None)
+
+
+def run_daemon(config, profile=None, profile_sec=None):
+    """デーモンとして起動し、終了するまで戻らない（profile_sec を渡すと起動直後からプロファイルする）"""
+    from controller import Controller
+
+    controller = Controller()
+    if profile_sec is not None:
+        controller.start_profile(profile_sec, config)
+    section = get_section(config, 'daemon')
+    controller.set_options(auto_start=section['auto_start'], auto_stop=section['auto_stop'])
+    server = ControlServer(controller, default_address(config))
+    try:
+        server.start()
+    except (RuntimeError, OSError) as e:
+        logging.error(f"デーモンを起動できません: {e}")
+        controller.core.stop()
+        sys.exit(1)
+    controller.initialize_async(config, profile)
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        # exit() は終了処理を終えると exited をセットする（Ctrl+C を受け付けるよう 1 秒ごとに戻る）
+        while not controller.exited.wait(1):
+            pass
+    except KeyboardInterrupt:
+        logging.info("デーモンを終了します")
+    finally:
+        server.close()
+        controller.exit()
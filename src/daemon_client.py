@@ -0,0 +1,202 @@
+"""常駐デーモンのクライアント
+
+    python src/daemon_client.py status          # 監視状態・RSS・CPU 時間
+    python src/daemon_client.py start           # 監視を開始（stop で停止）
+    python src/daemon_client.py metrics         # スキャン計測とテンプレートごとの統計
+    python src/daemon_client.py reload          # config.json を今すぐ読み込み直す
+    python src/daemon_client.py save            # デーモンが使っている設定を config.json に保存する
+    python src/daemon_client.py profile         # プロファイルを開始（実行中なら停止して書き出す）
+    python src/daemon_client.py shutdown        # デーモンを終了する
+
+デーモン（python src/main.py --daemon）とはローカルのソケット（Windows では名前付きパイプ）で通信する。
+接続の認証には、デーモンが起動のたびに作り直す daemon.key（本人だけが読める）を使う。
+RemoteController は Controller と同じ操作と UI 通知を提供するので、GUI とトレイは
+--attach を付けるとデーモンに接続する薄いクライアントとして動く。
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+from config_utils import get_data_path, get_section, load_config
+from core_loop import UiQueue
+
+KEY_FILE = 'daemon.key'
+SOCKET_FILE = 'daemon.sock'
+PIPE_NAME = r'\\.\pipe\lol_auto_accept'
+COMMANDS = ('status', 'start', 'stop', 'metrics', 'reload', 'save', 'profile', 'shutdown')
+
+
+def default_address(config=None):
+    """daemon.address、無ければ Unix ドメインソケット（Windows では名前付きパイプ）"""
+    address = get_section(config or {}, 'daemon')['address']
+    if address:
+        return address
+    if sys.platform == 'win32':
+        return PIPE_NAME
+    return str(get_data_path(SOCKET_FILE))
+
+
+def read_authkey(path=None):
+    path = path or get_data_path(KEY_FILE)
+    with open(path, encoding='utf-8') as f:
+        return f.read().strip().encode()
+
+
+class ControlClient:
+    """デーモンへの要求と応答。1 つの接続を複数のスレッドから使えるよう要求ごとに直列化する"""
+
+    def __init__(self, address=None, authkey=None):
+        self.address = address or default_address()
+        self.authkey = authkey if authkey is not None else read_authkey()
+        self.connection = Client(self.address, authkey=self.authkey)
+        self.lock = threading.Lock()
+
+    def request(self, command, **args):
+        with self.lock:
+            self.connection.send({'command': command, 'args': args})
+            reply = self.connection.recv()
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply['result']
+
+    def subscribe(self):
+        """通知用の接続を開く。最初に ('status', 状態) が届き、以降は UI 通知の (kind, value) が届く"""
+        connection = Client(self.address, authkey=self.authkey)
+        connection.send({'command': 'subscribe', 'args': {}})
+        return connection
+
+    def close(self):
+        self.connection.close()
+
+
+class RemoteController:
+    """デーモンの Controller を操作する代理。GUI・トレイからは Controller と同じように使える
+
+    終了 (exit) はこのクライアントだけを閉じ、デーモンは動き続ける。
+    デーモンが終了したり接続が切れたりした場合もクライアントを終了する。
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.gui = None
+        # 検出はデーモン側にあるので手元には無い
+        self.auto_accept = None
+        self.monitoring = False
+        self.ready = threading.Event()
+        self.exited = threading.Event()
+        self.exit_lock = threading.Lock()
+        self.exiting = False
+        self.ui = UiQueue()
+        self.events = client.subscribe()
+        # GUI が初期表示に使うので、最初の状態は受け取ってから返す
+        kind, status = self.events.recv()
+        self.monitoring = status['monitoring']
+        if status['ready']:
+            self.ready.set()
+        threading.Thread(target=self._receive, name='daemon-events', daemon=True).start()
+
+    def _receive(self):
+        try:
+            while True:
+                kind, value = self.events.recv()
+                if kind == 'quit':
+                    logging.info("デーモンが終了しました")
+                    break
+                if kind == 'ready':
+                    self.ready.set()
+                elif kind == 'monitoring':
+                    self.monitoring = value[0]
+                self.ui.post(kind, value)
+        except (EOFError, OSError, TypeError):
+            # exit で閉じた接続の recv は TypeError になる
+            if not self.exiting:
+                logging.warning("デーモンとの接続が切れました")
+        self.exit()
+
+    def start(self):
+        self.client.request('start')
+
+    def stop(self, reason='user'):
+        self.client.request('stop')
+
+    def set_options(self, auto_start=None, auto_stop=None):
+        self.client.request('set_options', auto_start=auto_start, auto_stop=auto_stop)
+
+    def status(self):
+        # デーモン側の状態に pid・RSS・CPU 時間を足したもの
+        return self.client.request('status')
+
+    def save_config(self):
+        # デーモンが使っている設定をデーモン側の config.json に保存する
+        return self.client.request('save')
+
+    def stats(self):
+        return self.client.request('metrics')
+
+    def reload_config(self, wait=False):
+        # 結果は 'config' の通知でも届く
+        applied = self.client.request('reload')
+        return applied if wait else None
+
+    def toggle_profile(self, duration_sec=None):
+        # 結果はデーモン側の profiles/ に書き出され、'profile' の通知で届く
+        return self.client.request('profile', duration_sec=duration_sec)
+
+    def show_window(self):
+        self.ui.post('show')
+
+    def exit(self):
+        """Detach from the daemon and quit this client"""
+        with self.exit_lock:
+            if self.exiting:
+                return
+            self.exiting = True
+        for connection in (self.events, self.client):
+            try:
+                connection.close()
+            except OSError:
+                pass
+        self.exited.set()
+        self.ui.post('quit')
+        if not self.gui and threading.current_thread() is threading.main_thread():
+            sys.exit(0)
+
+
+def connect(config=None):
+    """デーモンに接続する。起動していなければ None"""
+    try:
+        return ControlClient(default_address(config))
+    except (OSError, EOFError, AuthenticationError) as e:
+        logging.debug(f"デーモンに接続できません: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='常駐デーモンを操作する')
+    parser.add_argument('command', choices=COMMANDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    client = connect(load_config())
+    if client is None:
+        sys.exit("デーモンに接続できません（python src/main.py --daemon で起動してください）")
+    try:
+        result = client.request(args.command)
+    except RuntimeError as e:
+        sys.exit(f"エラー: {e}")
+    finally:
+        client.close()
+    if args.command == 'reload':
+        print("設定を反映しました" if result else "設定を反映できません（変更が無いか、値が不正です）")
+    elif args.command == 'profile':
+        print("プロファイルを開始しました" if result else "プロファイルを停止しました（結果はデーモンのログと profiles/ に出力されます）")
+    elif result is not None:
+        print(json.dumps(result, indent=2, ensure_ascii=False, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
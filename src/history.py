@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+import time
+
+# 記録するイベント
+STARTED = 'started'                # 監視を開始した
+MATCHING_SEEN = 'matching_seen'    # マッチング画面（キュー開始）を検出した
+BUTTON_SEEN = 'button_seen'        # レディチェックの承認ボタンを初めて検出した
+CLICK = 'click'                    # クリック（API の場合は承認リクエスト）を送った
+VERIFIED = 'verified'              # ボタンが消えたことを確認した（承認完了）
+VERIFY_FAILED = 'verify_failed'    # 確認の時間内にボタンが消えなかった
+STOPPED = 'stopped'                # 監視を停止した
+
+
+class EventLog:
+    """マッチングの履歴を 1 行 1 イベントの JSON で追記するログ
+
+    ファイルが max_bytes を超えたら history.jsonl → history.1.jsonl → ... とずらし、
+    backups 個より古いものは削除する（0 なら現在のファイルを捨てる）。読み出しは history_query が 1 行ずつ行う。
+    """
+
+    def __init__(self, path=None, max_bytes=1 << 20, backups=20):
+        self.enabled = False
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.file = None
+
+    def configure(self, path, max_bytes, backups):
+        with self.lock:
+            self._close()
+            self.path = path
+            self.max_bytes = max_bytes
+            self.backups = backups
+            self.enabled = True
+
+    def record(self, event, **fields):
+        """イベントを 1 行追記する。無効な場合は何もしない"""
+        if not self.enabled:
+            return
+        line = json.dumps({'t': round(time.time(), 3), 'e': event, **fields},
+                          separators=(',', ':'), ensure_ascii=False) + '\n'
+        with self.lock:
+            try:
+                if self.file is None:
+                    self.file = open(self.path, 'a', encoding='utf-8')
+                self.file.write(line)
+                self.file.flush()
+                if self.file.tell() >= self.max_bytes:
+                    self._rotate()
+            except OSError as e:
+                logging.error(f"履歴の書き込み失敗: {e}")
+                self._close()
+
+    def _rotate(self):
+        self._close()
+        if self.backups == 0:
+            # 古いファイルを残さない設定では、現在のファイルを捨てて書き直す
+            os.unlink(self.path)
+            return
+        # 古い順にずらす。backups 番目は上書きされて消える
+        for i in range(self.backups, 0, -1):
+            source = rotated_path(self.path, i - 1)
+            if os.path.exists(source):
+                os.replace(source, rotated_path(self.path, i))
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+
+def rotated_path(path, index):
+    """index 0 が現在のファイル、1 以降が古いファイル"""
+    if index == 0:
+        return str(path)
+    root, ext = os.path.splitext(str(path))
+    return f"{root}.{index}{ext}"
+
+
+# プロセス全体で共有する履歴
+history = EventLog()
+
+
+def start_history(section, path):
+    """config.json の history セクションに従って記録を有効化する"""
+    if not section['enabled']:
+        history.enabled = False
+        return
+    history.configure(path, section['max_bytes'], section['backups'])
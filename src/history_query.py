@@ -0,0 +1,186 @@
+"""マッチング履歴の集計
+
+    python src/history_query.py                  # 全期間の集計
+    python src/history_query.py --since 2026-10-01 --sessions
+
+ローテーションされたファイルを古い順に 1 行ずつ読み、セッション（監視の開始から停止まで）
+ごとに集計する。保持するのはセッション 1 つ分の状態と承認までの時間の一覧だけなので、
+数か月分の履歴でも全体を読み込まない。
+"""
+import argparse
+import json
+import logging
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from config_utils import get_data_path
+from history import (
+    BUTTON_SEEN,
+    CLICK,
+    MATCHING_SEEN,
+    STARTED,
+    STOPPED,
+    VERIFIED,
+    VERIFY_FAILED,
+    rotated_path,
+)
+
+# accept_ms: ボタン（レディチェック）の検出から承認確認までの時間の一覧
+# misses: 承認の確認が取れないまま終わったレディチェックの数
+# verify_retries: 確認に失敗してクリックし直した回数（後で承認できたレディチェックの分も含む）
+Session = namedtuple('Session', 'start end scans queues ready_checks accepts clicks misses verify_retries '
+                                'accept_ms stop_reason')
+
+HISTORY_FILE = 'history.jsonl'
+
+
+def iter_events(path, since=None):
+    """ローテーション済みのファイルも含め、古い順にイベントを返す（壊れた行は飛ばす）"""
+    index = 0
+    while os.path.exists(rotated_path(path, index + 1)):
+        index += 1
+    for i in range(index, -1, -1):
+        file_path = rotated_path(path, i)
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or event.get('t', 0) >= since:
+                    yield event
+
+
+class _SessionBuilder:
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.scans = 0
+        self.queues = 0
+        self.ready_checks = 0
+        self.accepts = 0
+        self.clicks = 0
+        self.misses = 0
+        self.verify_retries = 0
+        self.accept_ms = []
+        self.pending = None
+        self.stop_reason = None
+
+    def add(self, event):
+        kind, t = event.get('e'), event.get('t', self.end)
+        self.end = t
+        if kind == MATCHING_SEEN:
+            self.queues += 1
+        elif kind == BUTTON_SEEN:
+            if self.pending is not None:
+                # 前のレディチェックが承認されないまま次が来た
+                self.misses += 1
+            self.ready_checks += 1
+            self.pending = t
+        elif kind == CLICK:
+            self.clicks += 1
+        elif kind == VERIFIED:
+            self.accepts += 1
+            if self.pending is not None:
+                self.accept_ms.append(round((t - self.pending) * 1000, 1))
+                self.pending = None
+        elif kind == VERIFY_FAILED:
+            # 同じレディチェックが後で承認されることもあるので、ここでは失敗に数えない
+            self.verify_retries += 1
+        elif kind == STOPPED:
+            self.scans = event.get('scans', self.scans)
+            self.stop_reason = event.get('reason')
+
+    def build(self):
+        misses = self.misses + (1 if self.pending is not None else 0)
+        return Session(self.start, self.end, self.scans, self.queues, self.ready_checks, self.accepts,
+                       self.clicks, misses, self.verify_retries, self.accept_ms, self.stop_reason)
+
+
+def sessions(events):
+    """イベント列をセッションごとにまとめて返す。停止の記録が無い（強制終了など）場合は次の開始で区切る"""
+    current = None
+    for event in events:
+        kind = event.get('e')
+        if kind == STARTED:
+            if current is not None:
+                yield current.build()
+            current = _SessionBuilder(event.get('t'))
+            continue
+        if current is None:
+            # 監視開始前のキュー検出などはそのイベントからセッションを始める
+            current = _SessionBuilder(event.get('t'))
+        current.add(event)
+        if kind == STOPPED:
+            yield current.build()
+            current = None
+    if current is not None:
+        yield current.build()
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(session_iter, on_session=None):
+    """全セッションの合計と承認までの時間の分布"""
+    totals = dict(sessions=0, scans=0, queues=0, ready_checks=0, accepts=0, clicks=0, misses=0,
+                  verify_retries=0)
+    accept_ms = []
+    for session in session_iter:
+        if on_session is not None:
+            on_session(session)
+        totals['sessions'] += 1
+        for key in ('scans', 'queues', 'ready_checks', 'accepts', 'clicks', 'misses', 'verify_retries'):
+            totals[key] += getattr(session, key)
+        accept_ms.extend(session.accept_ms)
+    if accept_ms:
+        totals['accept_ms'] = {
+            'count': len(accept_ms),
+            'p50': _percentile(accept_ms, 0.5),
+            'p95': _percentile(accept_ms, 0.95),
+            'max': max(accept_ms),
+        }
+    return totals
+
+
+def _format_time(t):
+    return datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S') if t else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='マッチング履歴の集計')
+    parser.add_argument('--path', default=str(get_data_path(HISTORY_FILE)))
+    parser.add_argument('--since', default=None, help='この日時以降のみ (例: 2026-10-01)')
+    parser.add_argument('--sessions', action='store_true', help='セッションごとの結果も表示する')
+    parser.add_argument('--json', action='store_true', help='集計結果を JSON で出力する')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+
+    def print_session(session):
+        latency = f" accept={','.join(f'{ms:.0f}' for ms in session.accept_ms)}ms" if session.accept_ms else ''
+        print(f"{_format_time(session.start)} - {_format_time(session.end)} scans={session.scans} "
+              f"ready_checks={session.ready_checks} accepts={session.accepts} misses={session.misses}"
+              f" retries={session.verify_retries}{latency} ({session.stop_reason or '-'})")
+
+    totals = summarize(sessions(iter_events(args.path, since)), print_session if args.sessions else None)
+    if args.json:
+        print(json.dumps(totals, indent=4))
+        return
+    print(f"sessions={totals['sessions']} scans={totals['scans']} queues={totals['queues']} "
+          f"ready_checks={totals['ready_checks']} accepts={totals['accepts']} misses={totals['misses']} "
+          f"retries={totals['verify_retries']}")
+    if 'accept_ms' in totals:
+        latency = totals['accept_ms']
+        print(f"time to accept: p50={latency['p50']:.0f}ms p95={latency['p95']:.0f}ms "
+              f"max={latency['max']:.0f}ms (n={latency['count']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import select
+import socket
+import ssl
+import struct
+import threading
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from pathlib import Path
+
+from config_utils import get_section
+
+# クライアントの起動中だけ存在するファイル。name:pid:port:password:protocol の形式
+Lockfile = namedtuple('Lockfile', 'name pid port password protocol')
+
+DEFAULT_LOCKFILES = [
+    r'C:\Riot Games\League of Legends\lockfile',
+    '/Applications/League of Legends.app/Contents/LoL/lockfile',
+]
+
+READY_CHECK_URI = '/lol-matchmaking/v1/ready-check'
+ACCEPT_URI = '/lol-matchmaking/v1/ready-check/accept'
+GAMEFLOW_URI = '/lol-gameflow/v1/gameflow-phase'
+EVENTS = {
+    READY_CHECK_URI: 'OnJsonApiEvent_lol-matchmaking_v1_ready-check',
+    GAMEFLOW_URI: 'OnJsonApiEvent_lol-gameflow_v1_gameflow-phase',
+}
+
+# WAMP 風のメッセージ種別 (5: subscribe, 8: event)
+SUBSCRIBE = 5
+EVENT = 8
+
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION, OP_TEXT, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x8, 0x9, 0xA
+
+
+def read_lockfile(path):
+    """lockfile を読む。無い・読めない場合は None"""
+    try:
+        text = Path(path).read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+    parts = text.split(':')
+    if len(parts) != 5:
+        logging.warning(f"lockfile の形式が不正です: {path}")
+        return None
+    name, pid, port, password, protocol = parts
+    return Lockfile(name, int(pid), int(port), password, protocol)
+
+
+def find_lockfile(configured=''):
+    """設定されたパス、既定のインストール先の順に lockfile を探す"""
+    candidates = [configured] if configured else DEFAULT_LOCKFILES
+    for path in candidates:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+def encode_frame(payload, opcode=OP_TEXT, mask=True):
+    """WebSocket のフレームを 1 つ作る。クライアントから送る場合はマスクが必須"""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    length = len(payload)
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack('!H', length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('!Q', length)
+    if not mask:
+        return bytes(header) + payload
+    key = os.urandom(4)
+    masked = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + key + masked
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("接続が閉じられました")
+        data += chunk
+    return bytes(data)
+
+
+def read_frame(sock):
+    """フレームを 1 つ読み、(fin, opcode, payload) を返す"""
+    first, second = _recv_exact(sock, 2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', _recv_exact(sock, 8))[0]
+    key = _recv_exact(sock, 4) if second & 0x80 else None
+    payload = _recv_exact(sock, length)
+    if key:
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+def _ssl_context():
+    # クライアントは自己署名証明書を使い、接続先は常に 127.0.0.1 なので検証しない
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class LcuClient:
+    """ゲームクライアントのローカル API (HTTP と WebSocket) の最小限のクライアント"""
+
+    def __init__(self, lockfile, timeout=2.0):
+        self.lockfile = lockfile
+        self.timeout = timeout
+        self.secure = lockfile.protocol == 'https'
+        token = base64.b64encode(f'riot:{lockfile.password}'.encode()).decode()
+        self.authorization = f'Basic {token}'
+        self.sock = None
+        self.send_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f'{self.lockfile.protocol}://127.0.0.1:{self.lockfile.port}'
+
+    def request(self, method, uri, body=None):
+        """JSON を返す。404 (ready-check が無いなど) の場合は None"""
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + uri, data=data, method=method, headers={
+            'Authorization': self.authorization,
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+        })
+        context = _ssl_context() if self.secure else None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout, context=context) as response:
+                content = response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+        return json.loads(content) if content else None
+
+    def accept(self):
+        self.request('POST', ACCEPT_URI)
+
+    def gameflow_phase(self):
+        return self.request('GET', GAMEFLOW_URI)
+
+    def ready_check(self):
+        return self.request('GET', READY_CHECK_URI)
+
+    def connect(self, uris=tuple(EVENTS)):
+        """WebSocket に接続し、指定した URI のイベントを購読する"""
+        sock = socket.create_connection(('127.0.0.1', self.lockfile.port), timeout=self.timeout)
+        if self.secure:
+            sock = _ssl_context().wrap_socket(sock, server_hostname='127.0.0.1')
+        key = base64.b64encode(os.urandom(16)).decode()
+        sock.sendall((
+            'GET / HTTP/1.1\r\n'
+            f'Host: 127.0.0.1:{self.lockfile.port}\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\n'
+            'Sec-WebSocket-Version: 13\r\n'
+            f'Authorization: {self.authorization}\r\n'
+            '\r\n'
+        ).encode())
+        response = bytearray()
+        while b'\r\n\r\n' not in response:
+            response += _recv_exact(sock, 1)
+        status, *headers = response.decode('latin-1').split('\r\n')
+        if status.split()[1:2] != ['101']:
+            sock.close()
+            raise ConnectionError(f"WebSocket の接続に失敗しました: {status}")
+        expected = ws_accept_key(key)
+        if not any(h.lower().startswith('sec-websocket-accept:') and h.split(':', 1)[1].strip() == expected
+                   for h in headers):
+            sock.close()
+            raise ConnectionError("WebSocket の応答が不正です")
+        self.sock = sock
+        for uri in uris:
+            self.send([SUBSCRIBE, EVENTS[uri]])
+
+    def send(self, message, opcode=OP_TEXT):
+        with self.send_lock:
+            self.sock.sendall(encode_frame(json.dumps(message) if opcode == OP_TEXT else message, opcode))
+
+    def _readable(self, timeout):
+        # TLS の場合は復号済みのデータがソケットの外に残っていることがある
+        if self.secure and self.sock.pending():
+            return True
+        return bool(select.select([self.sock], [], [], timeout)[0])
+
+    def receive(self, timeout=1.0):
+        """イベントを 1 つ待って (uri, event_type, data) を返す。timeout 秒届かなければ None
+
+        フレームの途中でタイムアウトすると読み位置がずれるので、待つのはフレームの先頭だけにする
+        """
+        fragments = bytearray()
+        while True:
+            if not fragments and not self._readable(timeout):
+                return None
+            fin, opcode, payload = read_frame(self.sock)
+            if opcode == OP_PING:
+                self.send(payload, OP_PONG)
+                continue
+            if opcode == OP_CLOSE:
+                raise ConnectionError("クライアントが接続を閉じました")
+            if opcode not in (OP_TEXT, OP_CONTINUATION):
+                continue
+            fragments += payload
+            if not fin:
+                continue
+            if not fragments:
+                continue
+            message = json.loads(fragments.decode('utf-8'))
+            fragments = bytearray()
+            if isinstance(message, list) and len(message) == 3 and message[0] == EVENT:
+                event = message[2]
+                return event.get('uri'), event.get('eventType'), event.get('data')
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.sendall(encode_frame(b'', OP_CLOSE))
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+
+
+class LcuWatcher:
+    """ゲームクライアントのイベントを購読し、レディチェックとゲームフローの変化を通知する
+
+    画面キャプチャは一切行わない。lockfile が無い間は retry_sec ごとに存在だけを確認し、
+    接続・切断は on_connect / on_disconnect で呼び出し側に伝える（切断中は画面検出で代替する）。
+    """
+
+    def __init__(self, config, on_ready_check=None, on_phase=None, on_connect=None, on_disconnect=None):
+        section = get_section(config, 'lcu')
+        self.lockfile_path = section['lockfile']
+        self.retry_sec = float(section['retry_sec'])
+        self.on_ready_check = on_ready_check
+        self.on_phase = on_phase
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.client = None
+        self.phase = None
+        self.connected = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._loop, name='lcu', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+
+    def accept(self):
+        """レディチェックを承認する。未接続の場合は False"""
+        client = self.client
+        if client is None or not self.connected.is_set():
+            return False
+        client.accept()
+        return True
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            path = find_lockfile(self.lockfile_path)
+            lockfile = read_lockfile(path) if path else None
+            if lockfile is None:
+                self.stopping.wait(self.retry_sec)
+                continue
+            try:
+                self._session(lockfile)
+            except Exception as e:
+                if not self.stopping.is_set():
+                    logging.info(f"クライアント API との接続が切れました: {str(e)}")
+            finally:
+                self._disconnected()
+            self.stopping.wait(self.retry_sec)
+
+    def _session(self, lockfile):
+        client = LcuClient(lockfile)
+        client.connect()
+        self.client = client
+        self.connected.set()
+        logging.info(f"クライアント API に接続しました (port {lockfile.port})")
+        if self.on_connect:
+            self.on_connect()
+        # 接続前に始まっていたキューやレディチェックも取りこぼさない
+        self._dispatch(GAMEFLOW_URI, 'Update', client.gameflow_phase())
+        ready_check = client.ready_check()
+        if ready_check is not None:
+            self._dispatch(READY_CHECK_URI, 'Update', ready_check)
+        while not self.stopping.is_set():
+            event = client.receive()
+            if event is not None:
+                self._dispatch(*event)
+
+    def _dispatch(self, uri, event_type, data):
+        try:
+            if uri == GAMEFLOW_URI and data != self.phase:
+                self.phase = data
+                logging.info(f"ゲームフロー: {data}")
+                if self.on_phase:
+                    self.on_phase(data)
+            elif uri == READY_CHECK_URI and event_type != 'Delete' and data and self.on_ready_check:
+                self.on_ready_check(data)
+        except Exception as e:
+            logging.error(f"クライアント API のイベント処理中にエラーが発生しました: {str(e)}")
+
+    def _disconnected(self):
+        was_connected = self.connected.is_set()
+        self.connected.clear()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.phase = None
+        if was_connected and self.on_disconnect:
+            self.on_disconnect()
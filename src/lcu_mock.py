@@ -0,0 +1,237 @@
+"""ゲームクライアントのローカル API の代用サーバー
+
+Windows やクライアントが無い環境（Linux など）で LcuWatcher を動かすためのもの。
+lockfile を書き出し、ゲームフローとレディチェックの HTTP エンドポイントと
+WebSocket のイベント配信だけを再現する。プロトコルは http（TLS なし）。
+
+    python src/lcu_mock.py --lockfile /tmp/lockfile --queue-sec 5
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lcu import (
+    ACCEPT_URI,
+    EVENT,
+    EVENTS,
+    GAMEFLOW_URI,
+    OP_CLOSE,
+    OP_PING,
+    OP_PONG,
+    OP_TEXT,
+    READY_CHECK_URI,
+    SUBSCRIBE,
+    encode_frame,
+    read_frame,
+    ws_accept_key,
+)
+
+
+class MockLcuServer:
+    """lockfile・HTTP・WebSocket を備えた最小限のクライアント API"""
+
+    def __init__(self, password=None):
+        self.password = password or secrets.token_urlsafe(16)
+        self.phase = 'None'
+        self.ready_check = None
+        self.accepts = 0
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.lockfile = None
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self, lockfile=None):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='lcu-mock', daemon=True)
+        self.thread.start()
+        if lockfile:
+            self.write_lockfile(lockfile)
+        return self
+
+    def write_lockfile(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'LeagueClient:{os.getpid()}:{self.port}:{self.password}:http')
+        self.lockfile = path
+
+    def stop(self):
+        if self.lockfile and os.path.exists(self.lockfile):
+            os.remove(self.lockfile)
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for sock, _ in subscribers:
+            try:
+                sock.sendall(encode_frame(b'', OP_CLOSE, mask=False))
+            except OSError:
+                pass
+        self.server.shutdown()
+        self.server.server_close()
+
+    def set_phase(self, phase):
+        with self.lock:
+            self.phase = phase
+        self._publish(GAMEFLOW_URI, 'Update', phase)
+
+    def pop_ready_check(self, timer=12.0):
+        """マッチが見つかった状態にする（レディチェック開始）"""
+        with self.lock:
+            self.phase = 'ReadyCheck'
+            self.ready_check = {'state': 'InProgress', 'playerResponse': 'None', 'timer': timer}
+            ready_check = dict(self.ready_check)
+        self._publish(GAMEFLOW_URI, 'Update', 'ReadyCheck')
+        self._publish(READY_CHECK_URI, 'Create', ready_check)
+
+    def finish_ready_check(self):
+        """全員が承認したものとしてチャンピオン選択に進める"""
+        with self.lock:
+            self.ready_check = None
+        self._publish(READY_CHECK_URI, 'Delete', None)
+        self.set_phase('ChampSelect')
+
+    def accept(self):
+        with self.lock:
+            if self.ready_check is None:
+                return False
+            self.accepts += 1
+            self.ready_check['playerResponse'] = 'Accepted'
+            ready_check = dict(self.ready_check)
+        self._publish(READY_CHECK_URI, 'Update', ready_check)
+        return True
+
+    def _publish(self, uri, event_type, data):
+        message = json.dumps([EVENT, EVENTS[uri], {'uri': uri, 'eventType': event_type, 'data': data}])
+        frame = encode_frame(message, mask=False)
+        # 送信が重なるとフレームが混ざるのでロックを持ったまま送る
+        with self.lock:
+            for sock, events in self.subscribers:
+                if EVENTS[uri] not in events:
+                    continue
+                try:
+                    sock.sendall(frame)
+                except OSError:
+                    pass
+
+    def _get(self, uri):
+        with self.lock:
+            if uri == GAMEFLOW_URI:
+                return 200, self.phase
+            if uri == READY_CHECK_URI and self.ready_check is not None:
+                return 200, dict(self.ready_check)
+        return 404, {'message': 'not found'}
+
+
+def _handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+        def _authorized(self):
+            token = base64.b64encode(f'riot:{mock.password}'.encode()).decode()
+            if self.headers.get('Authorization') == f'Basic {token}':
+                return True
+            self._reply(401, {'message': 'unauthorized'})
+            return False
+
+        def _reply(self, status, body=None):
+            content = json.dumps(body).encode() if body is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.headers.get('Upgrade', '').lower() == 'websocket':
+                self._websocket()
+                return
+            self._reply(*mock._get(self.path))
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            self.rfile.read(length)
+            if self.path == ACCEPT_URI:
+                self._reply(204 if mock.accept() else 404)
+            else:
+                self._reply(404, {'message': 'not found'})
+
+        def _websocket(self):
+            self.send_response(101)
+            self.send_header('Upgrade', 'websocket')
+            self.send_header('Connection', 'Upgrade')
+            self.send_header('Sec-WebSocket-Accept', ws_accept_key(self.headers['Sec-WebSocket-Key']))
+            self.end_headers()
+            self.wfile.flush()
+            sock = self.connection
+            sock.settimeout(None)
+            events = set()
+            with mock.lock:
+                mock.subscribers.append((sock, events))
+            try:
+                while True:
+                    _, opcode, payload = read_frame(sock)
+                    if opcode == OP_CLOSE:
+                        break
+                    if opcode == OP_PING:
+                        sock.sendall(encode_frame(payload, OP_PONG, mask=False))
+                    elif opcode == OP_TEXT:
+                        message = json.loads(payload)
+                        if message[0] == SUBSCRIBE:
+                            events.add(message[1])
+            except (ConnectionError, OSError, ValueError):
+                pass
+            finally:
+                with mock.lock:
+                    mock.subscribers = [s for s in mock.subscribers if s[0] is not sock]
+                self.close_connection = True
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='クライアント API の代用サーバー')
+    parser.add_argument('--lockfile', default='lockfile', help='書き出す lockfile のパス（設定の lcu.lockfile に指定する）')
+    parser.add_argument('--queue-sec', type=float, default=5.0, help='キュー開始からレディチェックまでの秒数')
+    parser.add_argument('--accept-timeout', type=float, default=12.0, help='レディチェックの制限時間')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    mock = MockLcuServer().start(args.lockfile)
+    logging.info(f"代用サーバーを起動しました: port {mock.port}, lockfile {args.lockfile}")
+    try:
+        while True:
+            mock.set_phase('Lobby')
+            time.sleep(1)
+            mock.set_phase('Matchmaking')
+            time.sleep(args.queue_sec)
+            mock.pop_ready_check(args.accept_timeout)
+            deadline = time.monotonic() + args.accept_timeout
+            while time.monotonic() < deadline and not mock.accepts:
+                time.sleep(0.05)
+            logging.info("承認されました" if mock.accepts else "承認されませんでした")
+            mock.accepts = 0
+            mock.finish_ready_check()
+            time.sleep(3)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,54 +1,643 @@
-import pyautogui
-import cv2
-import time
 import logging
 import sys
-import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from config_utils import load_config
+import cv2
+import numpy as np
+
+from calibration import ScoreHistograms
+from capture import ChangeGate, DisplayTracker
+from capture_backends import create_backend
+from config_utils import freeze_config, get_data_path, get_section, load_config
+from history import BUTTON_SEEN, CLICK, VERIFIED, VERIFY_FAILED, history
+from match_worker import MatchWorkerPool
+from metrics import metrics
+from prefilter import ColorPrefilter
+from roi import RoiStore
+from scheduler import POST_ACCEPT, READY_CHECK, VERIFYING, Scheduler
+from templates import Box, TemplateRegistry
+from verify import ClickVerifier
+
+# score は最良位置の正規化相互相関 (confidence と同じ尺度)。box は score が閾値以上のときだけ設定される
+MatchResult = namedtuple('MatchResult', 'score box scale')
+
+
+# 1 テンプレート分の探索。job はワーカープロセスに渡す (name, region, scales)
+Search = namedtuple('Search', 'name template region haystack context thumb job')
+
+# 画面状態の判定順。先に一致したものを優先する
+# decline_button / champ_select / in_game は同梱していない。config.json の images に追加すると判定に使われる
+CLIENT_STATES = [
+    ('in_game', 'in_game'),
+    ('champ_select', 'champ_select'),
+    ('accept_button', 'ready_check'),
+    ('decline_button', 'ready_check'),
+    ('matching_screen', 'in_queue'),
+]
+# 承認ボタンとマッチング画面以外の、状態の判定だけに使うテンプレート
+STATE_TEMPLATES = [name for name, _ in CLIENT_STATES if name not in ('accept_button', 'matching_screen')]
+
+
+def client_state(hits):
+    """detect_all の結果（見つかったものは Box か True）からクライアントの状態を推定する"""
+    for name, state in CLIENT_STATES:
+        if hits.get(name):
+            return state
+    return 'lobby'
+
+
+class PyramidMatcher:
+    """縮小画像で候補を探し、元の解像度では候補の周辺だけを照合する"""
+
+    def __init__(self, levels=2, candidates=3, coarse_margin=0.2, min_side=12):
+        self.levels = levels
+        self.candidates = candidates
+        # 縮小画像では相関が下がるため、候補は confidence より低い閾値で拾う
+        self.coarse_margin = coarse_margin
+        self.min_side = min_side
+        # 照合結果や縮小画像の出力先。スレッドごとに形ごとに使い回す
+        self.local = threading.local()
+
+    def _buffer(self, key, shape, dtype=np.uint8):
+        buffers = getattr(self.local, 'buffers', None)
+        if buffers is None:
+            buffers = self.local.buffers = {}
+        buffer = buffers.get(key)
+        if buffer is None or buffer.shape != shape:
+            if len(buffers) >= 64:
+                buffers.clear()
+            buffer = buffers[key] = np.empty(shape, dtype)
+        return buffer
+
+    def _scores(self, haystack, needle, kind='scores'):
+        """TM_CCOEFF_NORMED の結果を使い回しのバッファに書き込む
+
+        粗い段の結果は候補を探す間ずっと参照するので、kind を変えて別のバッファにする
+        """
+        shape = (haystack.shape[0] - needle.shape[0] + 1, haystack.shape[1] - needle.shape[1] + 1)
+        return cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED,
+                                 result=self._buffer((kind, shape), shape, np.float32))
+
+    def match(self, haystack, template, confidence, scales=(1.0,), downsample=None):
+        """scales を順に試し、閾値を超えた時点で打ち切る
+
+        downsample(factor) を渡すと縮小画像をそこから受け取る。複数テンプレートで
+        同じフレームを照合するとき、縮小処理を共有するために使う
+        """
+        best = MatchResult(-1.0, None, None)
+        for scale in scales:
+            result = self._match_scale(haystack, template, confidence, scale, downsample)
+            if result.score > best.score:
+                best = result
+            if best.box is not None:
+                break
+        return best
+
+    def _level_for(self, width, height):
+        level = 0
+        while level < self.levels and min(width, height) >> (level + 1) >= self.min_side:
+            level += 1
+        return level
+
+    def _match_scale(self, haystack, template, confidence, scale, downsample=None):
+        needle = template.scaled(scale)
+        th, tw = needle.shape[:2]
+        hh, hw = haystack.shape[:2]
+        if hh < th or hw < tw:
+            return MatchResult(-1.0, None, scale)
+        level = self._level_for(tw, th)
+        if level == 0:
+            result = self._scores(haystack, needle)
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            box = Box(x, y, tw, th) if score >= confidence else None
+            return MatchResult(score, box, scale)
+
+        factor = 1 << level
+        if downsample is not None:
+            small = downsample(factor)
+        else:
+            size = (hw // factor, hh // factor)
+            small = cv2.resize(haystack, size, dst=self._buffer(('small', size), size[::-1]),
+                               interpolation=cv2.INTER_AREA)
+        small_needle = template.downsampled(scale, level)
+        sh, sw = small_needle.shape[:2]
+        coarse = self._scores(small, small_needle, 'coarse')
+        threshold = confidence - self.coarse_margin
+        best = MatchResult(-1.0, None, scale)
+        for i in range(self.candidates):
+            _, coarse_score, _, (cx, cy) = cv2.minMaxLoc(coarse)
+            if coarse_score < threshold:
+                if i == 0:
+                    # 候補が無い場合は縮小画像でのスコアを目安として返す
+                    best = MatchResult(coarse_score, None, scale)
+                break
+            # 同じ山を再び拾わないよう、候補の近傍を潰しておく
+            coarse[max(0, cy - sh // 2):cy + sh // 2 + 1, max(0, cx - sw // 2):cx + sw // 2 + 1] = -1.0
+            # 元の解像度で候補の周辺だけを照合する
+            pad = factor + 2
+            x0 = max(0, cx * factor - pad)
+            y0 = max(0, cy * factor - pad)
+            x1 = min(hw, cx * factor + tw + pad)
+            y1 = min(hh, cy * factor + th + pad)
+            if x1 - x0 < tw or y1 - y0 < th:
+                continue
+            refined = self._scores(haystack[y0:y1, x0:x1], needle)
+            _, score, _, (x, y) = cv2.minMaxLoc(refined)
+            if score > best.score:
+                box = Box(x0 + x, y0 + y, tw, th) if score >= confidence else None
+                best = MatchResult(score, box, scale)
+        return best
+
 
 class LoLAutoAccept:
     def __init__(self, config=None):
-        pyautogui.FAILSAFE = True
-        self.config = config or load_config()
+        # 設定は不変なスナップショットとして持ち、差し替えは publish_config で行う
+        self.config = freeze_config(config or load_config())
+        self.published_config = self.config
         self.button_image = self.config['images']['accept_button']
         # イメージフォルダ
         if getattr(sys, 'frozen', False):
             image_dir = sys._MEIPASS
         else:
             image_dir = str(Path(__file__).resolve().parent.parent)
-        abs_path = os.path.join(image_dir, 'resources', self.button_image)
-        if not os.path.exists(abs_path):
+        self.image_dir = image_dir
+        self.templates = TemplateRegistry(self.config, image_dir)
+        abs_path = self.templates.path('accept_button')
+        if not self.templates.available('accept_button'):
             logging.error(f"ボタン画像が見つかりません: {abs_path}")
             sys.exit(1)
-        logging.info(f"ボタン画像読み込み: {self.button_image}")
+        self.templates.get('accept_button')
+        if self.templates.pack is None:
+            logging.info(f"ボタン画像読み込み: {self.button_image}")
+        else:
+            logging.info(f"テンプレートパックを使用します: {', '.join(self.templates.names())}")
         self.button_image_path = abs_path
         self.confidence = self.config['template_matching']['confidence']
         self.interval_sec = self.config['template_matching']['interval_sec']
+        matching_config = get_section(self.config, 'template_matching')
+        # パックがあればコンパイル済みの解像度の倍率だけを試す（実行時に拡大縮小しない）
+        self.scales = self.templates.scales() or matching_config['scales']
+        self.matcher = PyramidMatcher(levels=matching_config['pyramid_levels'])
+        # 最後に一致した倍率。次回はその倍率から試す
+        self.scale_hints = {}
+        self.scheduler = Scheduler(self.config)
+        gate_config = get_section(self.config, 'change_gate')
+        self.change_gate = ChangeGate(threshold=gate_config['threshold']) if gate_config['enabled'] else None
+        self.gate_downscale = gate_config['downscale']
+        # 色の署名で対象が写っていないフレームを照合前に除外する
+        prefilter_config = get_section(self.config, 'prefilter')
+        self.prefilter = None
+        if prefilter_config['enabled']:
+            self.prefilter = ColorPrefilter(step=prefilter_config['step'], slack=prefilter_config['slack'])
+        roi_config = get_section(self.config, 'roi')
+        self.roi = RoiStore(get_data_path('roi_cache.json'),
+                            padding=roi_config['padding'], max_misses=roi_config['max_misses'])
+        # 照合スコアを記録し、calibration.py で confidence を求められるようにする
+        self.scores = None
+        if get_section(self.config, 'calibration')['record_scores']:
+            self.scores = ScoreHistograms(get_data_path('score_histograms.json'))
+        self.capture_config = get_section(self.config, 'capture')
+        self.capture = create_backend(self.config)
+        # 複数ディスプレイの場合はクライアントがあるディスプレイだけをキャプチャする
+        self.display_config = get_section(self.config, 'displays')
+        self.displays = self._create_display_tracker()
+        self.sweep_pool = None
+        # クリック後はボタンが消えたことを確かめるまで成功とみなさない
+        self.verifier = ClickVerifier(self.config, click=self._click)
+        # 確認中のボタンの周辺（スクリーン座標）
+        self.probe_region = None
+        # worker_processes が 1 以上ならマッチングを別プロセスで行う
+        self.worker_processes = matching_config['worker_processes']
+        self.match_pool = None
+        if self.worker_processes > 0:
+            self.match_pool = MatchWorkerPool(self.config, image_dir, self.worker_processes)
         self.last_error_time = 0
         self.error_cooldown = 60
 
-    def scan_screen(self):
-        """画面をスキャンしてマッチング画面の承認ボタンを探す"""
+    def publish_config(self, config):
+        """新しい設定を公開する。スキャン中の値は変えず、次のキャプチャの前に反映される
+
+        参照の代入だけで差し替えるので、監視スレッドとの間でロックは要らない
+        """
+        self.published_config = freeze_config(config)
+
+    def apply_published_config(self):
+        """公開された設定が今のものと違えば反映する。キャプチャするスレッドから呼ぶ
+
+        反映できなければ以前の設定のまま使い続け、False を返す
+        """
+        config = self.published_config
+        if config is self.config:
+            return True
         try:
-            # 画面上でボタン画像を探す（より寛容なマッチング）
-            button_pos = pyautogui.locateOnScreen(self.button_image_path, confidence=self.confidence)
-            
-            if button_pos is not None:
-                # ボタンが見つかった場合、中央をクリック
-                center = pyautogui.center(button_pos)
-                pyautogui.click(center)
-                logging.info("承認ボタンをクリックしました")
-                # クリック後に少し待機
-                time.sleep(2)
-                return True
+            self.update_config(config)
+        except Exception as e:
+            logging.error(f"設定を反映できません（以前の設定を使います）: {e}")
+            # 同じ設定を毎回反映し直さないよう、公開された設定も元に戻す
+            if self.published_config is config:
+                self.published_config = self.config
             return False
-            
-        except pyautogui.ImageNotFoundException:
-            # 画像が見つからない場合は正常な状態なのでエラーとして扱わない
+        return True
+
+    def update_config(self, config):
+        """設定を反映する。画像が変わったテンプレートはここで読み込み直す
+
+        失敗しうるもの（キャプチャ方式・ワーカープロセス・テンプレートパック・確認の設定）を
+        すべて作ってから一度に差し替える。途中で例外が出たら作ったものを閉じて送出し、
+        それまでの設定とオブジェクトはそのまま残る
+        """
+        config = freeze_config(config)
+        matching_config = get_section(config, 'template_matching')
+        gate_config = get_section(config, 'change_gate')
+        prefilter_config = get_section(config, 'prefilter')
+        capture_config = get_section(config, 'capture')
+        display_config = get_section(config, 'displays')
+        roi_config = get_section(config, 'roi')
+        verifier = ClickVerifier(config, click=self._click, clock=self.verifier.clock)
+        pack = self.templates.prepare(config)
+        capture = self.capture
+        displays = self.displays
+        match_pool = self.match_pool
+        worker_processes = matching_config['worker_processes']
+        created = []
+        try:
+            if capture_config != self.capture_config:
+                capture = create_backend(config)
+                created.append(capture)
+            if capture is not self.capture or display_config != self.display_config:
+                displays = self._create_display_tracker(capture, display_config)
+            if worker_processes != self.worker_processes:
+                match_pool = None
+                if worker_processes > 0:
+                    match_pool = MatchWorkerPool(config, self.image_dir, worker_processes)
+                    created.append(match_pool)
+        except BaseException:
+            for resource in created:
+                resource.close()
+            raise
+
+        # ここから先は失敗しない差し替えだけ
+        old_capture, old_pool = self.capture, self.match_pool
+        self.config = config
+        self.published_config = config
+        self.confidence = matching_config['confidence']
+        self.interval_sec = matching_config['interval_sec']
+        self.templates.apply(config, pack)
+        self.scales = self.templates.scales() or matching_config['scales']
+        self.matcher.levels = matching_config['pyramid_levels']
+        self.capture, self.capture_config = capture, capture_config
+        self.displays, self.display_config = displays, display_config
+        self.match_pool, self.worker_processes = match_pool, worker_processes
+        # 確認中のクリックは新しい設定の間隔・期限で続ける
+        verifier.pending, self.verifier = self.verifier.pending, verifier
+        self.scheduler.configure(config)
+        if not gate_config['enabled']:
+            self.change_gate = None
+        elif self.change_gate is None:
+            self.change_gate = ChangeGate(threshold=gate_config['threshold'])
+        else:
+            self.change_gate.threshold = gate_config['threshold']
+        self.gate_downscale = gate_config['downscale']
+        if not prefilter_config['enabled']:
+            self.prefilter = None
+        elif self.prefilter is None:
+            self.prefilter = ColorPrefilter(step=prefilter_config['step'], slack=prefilter_config['slack'])
+        else:
+            self.prefilter.configure(prefilter_config['step'], prefilter_config['slack'])
+        self.roi.padding = roi_config['padding']
+        self.roi.max_misses = roi_config['max_misses']
+        if old_capture is not capture:
+            old_capture.close()
+        if old_pool is not match_pool:
+            if old_pool is not None:
+                old_pool.close()
+        elif match_pool is not None:
+            match_pool.update_config(config)
+        self._reload_templates()
+        logging.info("設定を反映しました")
+
+    def _reload_templates(self):
+        """ファイル名や内容が変わったテンプレートを検出の前に読み込んでおく"""
+        for name in self.templates.names():
+            if not self.templates.available(name):
+                continue
+            try:
+                self.templates.get(name)
+            except ValueError as e:
+                logging.error(f"テンプレートを読み込めません: {e}")
+
+    def _create_display_tracker(self, capture=None, display_config=None):
+        """ディスプレイが 2 つ以上あれば DisplayTracker を返す。1 つなら None（画面全体を扱う）"""
+        capture = capture or self.capture
+        display_config = display_config or self.display_config
+        if not display_config['enabled']:
+            return None
+        displays = capture.displays()
+        if not displays:
+            return None
+        logging.info(f"ディスプレイを {len(displays)} 個検出しました")
+        return DisplayTracker(displays, sweep_after=display_config['sweep_after'])
+
+    def grab_frame(self):
+        """設定されたキャプチャ方式でキャプチャする
+
+        複数ディスプレイの場合は、最後にクライアントが見つかったディスプレイだけを対象にする
+        """
+        self.apply_published_config()
+        with metrics.timer('capture'):
+            if self.displays is not None:
+                return self.capture.grab_display(self.displays.preferred)
+            return self.capture.grab()
+
+    def locate(self, name, frame):
+        """キャプチャ済みフレームからテンプレートを探す。見つからなければ None"""
+        search = self._prepare_search(name, frame)
+        if search is None:
+            return None
+        start = time.perf_counter()
+        if self.match_pool is not None:
+            result = self.match_pool.match(frame, [search.job], self.confidence)[name]
+        else:
+            result = self._match(frame, search)
+        return self._finish_search(frame, search, result, (time.perf_counter() - start) * 1000)
+
+    def _match(self, frame, search):
+        """このプロセスで照合する。粗い段はフレームのピラミッドから探索範囲を切り出して使う"""
+        # pyautogui(pyscreeze) の confidence 指定時と同じ正規化相互相関
+        return self.matcher.match(search.haystack, search.template, self.confidence, search.job[2],
+                                  downsample=lambda factor: frame.thumbnail(factor, search.region))
+
+    def _prepare_search(self, name, frame):
+        """探索範囲を決める。色や変化の有無から照合を省略できる場合は None"""
+        template = self.templates.get(name)
+        if template.std == 0:
+            return None
+        # 前回見つかった位置の周辺だけを探す
+        region = self.roi.search_region(name, frame.width, frame.height)
+        # 署名の色が足りなければ写っていないので、グレースケール化も照合もしない
+        if self.prefilter is not None:
+            box = self.roi.last_box(name, frame.width, frame.height) if region is not None else None
+            with metrics.timer('prefilter'):
+                possible = self.prefilter.check(template, frame, region, min(self.scales), box)
+            if not possible:
+                metrics.increment('prefilter_rejects')
+                self.roi.record_miss(name)
+                return None
+        haystack = frame.gray
+        if region is not None:
+            x0, y0, x1, y1 = region
+            haystack = frame.gray[y0:y1, x0:x1]
+        # 前回見つからなかったときから探索範囲が変わっていなければ、結果も同じなので省略する
+        context = thumb = None
+        if self.change_gate is not None:
+            context = (frame.origin, region, template.mtime, self.confidence, tuple(self.scales))
+            thumb = frame.thumbnail(self.gate_downscale, region)
+            if self.change_gate.should_skip(name, context, thumb):
+                # 画面が変わっていないので ROI の見逃しには数えない（数えると全画面探索に戻って照合し直してしまう）
+                metrics.increment('match_skipped')
+                return None
+        job = (name, region, self._scales_for(name, frame))
+        return Search(name, template, region, haystack, context, thumb, job)
+
+    def _finish_search(self, frame, search, result, elapsed_ms):
+        """照合結果を ROI・変化検出・計測に反映し、フレーム座標の Box を返す"""
+        name = search.name
+        search.template.record_match(elapsed_ms)
+        metrics.observe('match', elapsed_ms)
+        if self.scores is not None:
+            self.scores.record(name, frame.width, frame.height, result.score)
+        gate = self.change_gate
+        if result.box is None:
+            self.roi.record_miss(name)
+            if gate is not None and search.thumb is not None:
+                gate.record_negative(name, search.context, search.thumb)
+            return None
+        if gate is not None:
+            gate.invalidate(name)
+        self.scale_hints[name] = result.scale
+        x0, y0 = search.region[:2] if search.region is not None else (0, 0)
+        box = Box(x0 + result.box.left, y0 + result.box.top, result.box.width, result.box.height)
+        self.roi.record_hit(name, frame.width, frame.height, box)
+        return box
+
+    def locate_any(self, name, frame):
+        """frame で探し、なければ必要に応じて他のディスプレイも並列に探す
+
+        (見つかったフレーム, Box) を返す。見つからなければ (frame, None)。
+        他のディスプレイで見つかった場合は、以降そのディスプレイをキャプチャする
+        """
+        box = self.locate(name, frame)
+        tracker = self.displays
+        if tracker is None:
+            return frame, box
+        if box is not None:
+            tracker.record_hit(name)
+            return frame, box
+        if not tracker.record_miss(name):
+            return frame, None
+        with metrics.timer('sweep'):
+            found = self._sweep(name, tracker.others())
+        if found is None:
+            return frame, None
+        display, other, result = found
+        tracker.prefer(display)
+        if self.change_gate is not None:
+            self.change_gate.invalidate(name)
+        self.scale_hints[name] = result.scale
+        self.roi.record_hit(name, other.width, other.height, result.box)
+        return other, result.box
+
+    def _sweep(self, name, displays):
+        """他のディスプレイをスレッドごとにキャプチャ・照合する（OpenCV は GIL を手放す）"""
+        if not displays:
+            return None
+        if self.sweep_pool is None:
+            self.sweep_pool = ThreadPoolExecutor(thread_name_prefix='display')
+        template = self.templates.get(name)
+
+        def search(display):
+            frame = self.capture.grab_display(display, sweep=True)
+            return display, frame, self.matcher.match(frame.gray, template, self.confidence,
+                                                      self._scales_for(name, frame), downsample=frame.thumbnail)
+
+        for display, frame, result in self.sweep_pool.map(search, displays):
+            if result.box is not None:
+                return display, frame, result
+        return None
+
+    def _scales_for(self, name, frame=None):
+        """最後に一致した倍率、なければフレームの解像度向けにコンパイルされた倍率から試す"""
+        first = self.scale_hints.get(name)
+        if first is None and frame is not None:
+            first = self.templates.scale_for(frame.width, frame.height)
+        if first is None or first not in self.scales:
+            return self.scales
+        return [first] + [s for s in self.scales if s != first]
+
+    def detect_all(self, frame, names=None):
+        """1 フレームに対して複数のテンプレートを照合し、{名前: Box または None} を返す
+
+        全テンプレートの探索範囲を先に決め（色や変化で省略できるものはここで外れる）、残りを
+        同じフレームのグレースケールとピラミッドの上で照合する。共有するのは前処理（グレースケール化・
+        縮小・探索範囲の切り出し）までで、相関の計算はテンプレートごとに行う。したがって所要時間は
+        照合 1 回分ではなく、省略されなかったテンプレートの相関の計算の合計になる
+        （周波数領域で画面側の変換を共有する方式も試したが、正規化の計算が重く matchTemplate より遅かった）。
+        names を省略すると config.json の images のうち画像が存在するものすべてが対象になる
+        （decline_button / champ_select / in_game を追加すれば client_state で状態を判定できる）
+        """
+        if names is None:
+            names = [name for name in self.templates.names() if self.templates.available(name)]
+        with metrics.timer('detect_all'):
+            hits = dict.fromkeys(names)
+            searches = [s for s in (self._prepare_search(name, frame) for name in names) if s is not None]
+            if not searches:
+                return hits
+            if self.match_pool is not None:
+                # ワーカープロセスでは全テンプレートを同時に照合する
+                start = time.perf_counter()
+                results = self.match_pool.match(frame, [s.job for s in searches], self.confidence)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                for search in searches:
+                    hits[search.name] = self._finish_search(frame, search, results[search.name], elapsed_ms)
+                return hits
+            for search in searches:
+                start = time.perf_counter()
+                result = self._match(frame, search)
+                hits[search.name] = self._finish_search(frame, search, result, (time.perf_counter() - start) * 1000)
+            return hits
+
+    def detect_state(self, frame, hits):
+        """照合済みの hits に状態判定用のテンプレートの結果を足して、クライアントの状態を返す
+
+        状態判定用のテンプレートは images に追加されて画像があるものだけを detect_all でまとめて照合する
+        """
+        names = [name for name in STATE_TEMPLATES if name not in hits and self.templates.available(name)]
+        if names:
+            hits = {**hits, **self.detect_all(frame, names)}
+        return client_state(hits)
+
+    def close(self):
+        """キャプチャとワーカープロセスを解放する"""
+        if self.match_pool is not None:
+            self.match_pool.close()
+            self.match_pool = None
+        if self.sweep_pool is not None:
+            self.sweep_pool.shutdown()
+            self.sweep_pool = None
+        if self.scores is not None:
+            self.scores.flush()
+        self.capture.close()
+
+    def scan_stats(self):
+        """テンプレートごとの読み込み・マッチング時間とマッチング省略率"""
+        return {
+            'templates': self.templates.stats(),
+            'change_gate': self.change_gate.stats() if self.change_gate is not None else {},
+            'prefilter': self.prefilter.stats() if self.prefilter is not None else {},
+        }
+
+    def locate_on_screen(self, name):
+        """画面をキャプチャしてテンプレートを探す"""
+        return self.locate(name, self.grab_frame())
+
+    def scan_frame(self, frame):
+        """フレームから承認ボタンを探し、見つかればクリックする。エラーはそのまま送出する
+
+        クリック後は待たずに戻り、以降のティックでボタンが消えたかを確かめる。
+        確認できたティックで True を返す
+        """
+        if self.verifier.pending is not None:
+            return self._check_click(frame)
+        with metrics.timer('scan'):
+            frame, button_pos = self.locate_any('accept_button', frame)
+        if button_pos is None:
+            # ボタンが消えたら（確認に失敗した後も）速いポーリングをやめる
+            self.scheduler.observe(button=False)
+            return False
+        if self.scheduler.state != READY_CHECK:
+            history.record(BUTTON_SEEN, via='screen')
+        self.scheduler.observe(button=True)
+        # ボタンが見つかった場合、中央をクリックし、消えるまでボタンの周辺だけを確認する
+        center = frame.to_screen((button_pos.left + button_pos.width // 2,
+                                  button_pos.top + button_pos.height // 2))
+        self.probe_region = self._probe_region(button_pos, frame)
+        self.verifier.begin(center)
+        self.scheduler.set_state(VERIFYING)
+        return False
+
+    def _check_click(self, frame):
+        """クリックしたボタンが消えたかを 1 回確かめる。消えたことを確認できたら True"""
+        region = self.probe_region
+        result = self.verifier.check(lambda: self._button_visible(region, frame))
+        if result is None:
+            return False
+        metrics.increment('clicks', result.clicks)
+        metrics.observe('click', result.elapsed * 1000)
+        if not result.confirmed:
+            # 次のスキャンで改めて探す。ボタンは見えているので間隔は短い
+            self.scheduler.set_state(READY_CHECK)
+            metrics.increment('verify_failures')
+            history.record(VERIFY_FAILED, clicks=result.clicks)
+            logging.warning(f"承認ボタンが消えませんでした ({result.clicks} 回クリック)")
             return False
+        logging.info(f"承認ボタンをクリックしました ({result.clicks} 回, {result.elapsed * 1000:.0f}ms で確認)")
+        history.record(VERIFIED, via='screen', clicks=result.clicks, ms=round(result.elapsed * 1000, 1))
+        # 確認後の待機はスケジューラの post_accept 状態が担う
+        self.scheduler.set_state(POST_ACCEPT)
+        return True
+
+    def cancel_click(self):
+        """確認中のクリックを打ち切る（監視の停止時）"""
+        self.verifier.cancel()
+        self.probe_region = None
+
+    def _click(self, point):
+        history.record(CLICK, via='screen', x=int(point[0]), y=int(point[1]))
+        self.capture.click(point)
+
+    def _probe_region(self, box, frame):
+        """確認用にキャプチャする範囲（スクリーン座標）。ボタンの周囲に少し余白を取る"""
+        pad = max(8, min(box.width, box.height) // 4)
+        x0, y0 = frame.to_screen((max(0, box.left - pad), max(0, box.top - pad)))
+        x1, y1 = frame.to_screen((min(frame.width, box.left + box.width + pad),
+                                  min(frame.height, box.top + box.height + pad)))
+        return (x0, y0, x1, y1)
+
+    def _button_visible(self, region, frame=None):
+        """region で直前に一致した倍率の承認ボタンを照合する
+
+        そのティックのフレームが region を含んでいれば切り出して使い、含んでいなければ region だけをキャプチャする
+        """
+        with metrics.timer('verify'):
+            x0, y0, x1, y1 = region
+            ox, oy = frame.origin if frame is not None else (0, 0)
+            if frame is not None and ox <= x0 and oy <= y0 and x1 <= ox + frame.width and y1 <= oy + frame.height:
+                probe = frame.gray[y0 - oy:y1 - oy, x0 - ox:x1 - ox]
+            else:
+                probe = self.capture.grab_region(region).gray
+            template = self.templates.get('accept_button')
+            scale = self.scale_hints.get('accept_button', 1.0)
+            result = self.matcher.match(probe, template, self.confidence, [scale])
+        return result.box is not None
+
+    def scan_screen(self, frame=None):
+        """画面をスキャンしてマッチング画面の承認ボタンを探す
+
+        frame を渡した場合はキャプチャせずにそのフレームを使う
+        """
+        try:
+            if frame is None:
+                frame = self.grab_frame()
+            result = self.scan_frame(frame)
+            self.scheduler.on_success()
+            return result
+            
         except Exception as e:
+            self.scheduler.on_error()
             current_time = time.time()
             # エラーログの出力を制限する
             if current_time - self.last_error_time >= self.error_cooldown:
@@ -62,8 +651,8 @@ class LoLAutoAccept:
         try:
             while True:
                 self.scan_screen()
-                # 負荷軽減のため少し待機
-                time.sleep(self.interval_sec)
+                # 負荷軽減のため状態に応じて待機
+                time.sleep(self.scheduler.next_delay())
         
         except KeyboardInterrupt:
             logging.info("プログラムを終了します")
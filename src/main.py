@@ -1,12 +1,9 @@
 import logging
+import multiprocessing
 import sys
-import time
 
-from lol_auto_accept import LoLAutoAccept
-from auto_accept_gui import AutoAcceptGUI
-from controller import Controller
-from tray_icon import TrayIcon
-from config_utils import parse_arguments
+from config_utils import load_config, parse_arguments
+from startup_profile import StartupProfile
 
 # Configure logging
 logging.basicConfig(
@@ -15,44 +12,86 @@ logging.basicConfig(
 )
 
 if __name__ == "__main__":
+    # PyInstaller でビルドした場合にワーカープロセスを起動できるようにする
+    multiprocessing.freeze_support()
+
     # Parse command line arguments
     args = parse_arguments()
+    profile = StartupProfile(args.startup_profile)
     
-    # Create the auto accept instance
-    auto_accept = LoLAutoAccept()
+    with profile.stage('load_config'):
+        config = load_config()
+
+    if args.daemon:
+        # Capture and detection only; the GUI and tray can attach later with --attach
+        from daemon import run_daemon
+        run_daemon(config, profile, args.profile)
+        sys.exit(0)
+
+    if args.attach:
+        # Thin client: the daemon owns capture and detection
+        with profile.stage('import daemon_client'):
+            from daemon_client import RemoteController, connect
+        client = connect(config)
+        if client is None:
+            logging.error("デーモンに接続できません。python src/main.py --daemon で起動してください")
+            sys.exit(1)
+        controller = RemoteController(client)
+        if args.profile is not None:
+            controller.toggle_profile(args.profile)
+    else:
+        with profile.stage('import controller'):
+            from controller import Controller
+
+        # Templates, cv2 and the capture backend load in the background
+        # while the tray icon / window appears
+        controller = Controller()
+        if args.profile is not None:
+            # Sample from the start so template loading and the first scans are included
+            controller.start_profile(args.profile, config)
+        controller.initialize_async(config, profile)
     
     if args.nogui:
-        # Run in background mode without GUI
-        controller = Controller(auto_accept)
-        tray_icon = TrayIcon(controller)
-        # Set tray_icon reference in controller
-        controller.tray_icon = tray_icon
+        # Run in background mode without GUI (tkinter is never imported)
+        with profile.stage('import tray_icon'):
+            from tray_icon import TrayIcon
+        with profile.stage('TrayIcon()'):
+            tray_icon = TrayIcon(controller)
         tray_icon.run()
+        profile.mark('tray visible')
+        profile.report('tray visible')
         
-        # Start monitoring automatically in nogui mode
-        controller.start()
+        # Start monitoring automatically in nogui mode (an attached daemon keeps its own state)
+        if not args.attach:
+            controller.start()
         
         # Keep the main thread alive
         try:
-            while controller.running:
-                time.sleep(1)
+            # exit() は終了処理を終えると exited をセットする（Ctrl+C を受け付けるよう 1 秒ごとに戻る）
+            while not controller.exited.wait(1):
+                pass
         except KeyboardInterrupt:
             logging.info("キーボード割り込みによりプログラムを終了します。")
         finally:
             controller.exit()
     else:
         # Run with GUI
-        controller = Controller(auto_accept)
-        gui = AutoAcceptGUI(controller)
+        with profile.stage('import auto_accept_gui'):
+            from auto_accept_gui import AutoAcceptGUI
+        with profile.stage('AutoAcceptGUI()'):
+            gui = AutoAcceptGUI(controller)
         
         # Set the controller's GUI reference
         controller.gui = gui
         
         # Create and run the tray icon
-        tray_icon = TrayIcon(controller)
-        # Set tray_icon reference in controller
-        controller.tray_icon = tray_icon
+        with profile.stage('import tray_icon'):
+            from tray_icon import TrayIcon
+        with profile.stage('TrayIcon()'):
+            tray_icon = TrayIcon(controller)
         tray_icon.run()
+        profile.mark('window and tray visible')
+        profile.report('window and tray visible')
         
         # Run the GUI
         gui.run()
@@ -0,0 +1,142 @@
+import logging
+import multiprocessing
+import queue
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config_utils import get_section
+from templates import TemplateRegistry
+
+
+def _attach(name):
+    # 3.13 以降は子プロセス側で resource_tracker に登録しない（解放は親が行う）
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(config, image_dir, requests, results):
+    """ワーカープロセス本体。テンプレートは起動時に一度だけ読み込む"""
+    # spawn されたプロセスは pyautogui や tkinter を読み込まない
+    from lol_auto_accept import PyramidMatcher
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    registry = TemplateRegistry(config, image_dir)
+    matcher = PyramidMatcher(levels=get_section(config, 'template_matching')['pyramid_levels'])
+    segment = None
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        if message[0] == 'config':
+            registry.update_config(message[1])
+            matcher.levels = get_section(message[1], 'template_matching')['pyramid_levels']
+            continue
+        _, job_id, shm_name, shape, name, region, confidence, scales = message
+        try:
+            if segment is None or segment.name != shm_name:
+                if segment is not None:
+                    segment.close()
+                segment = _attach(shm_name)
+            gray = np.ndarray(shape, dtype=np.uint8, buffer=segment.buf)
+            if region is not None:
+                x0, y0, x1, y1 = region
+                gray = gray[y0:y1, x0:x1]
+            result = matcher.match(gray, registry.get(name), confidence, scales)
+            # ndarray のビューを残したまま close できないので先に手放す
+            del gray
+            results.put((job_id, tuple(result), None))
+        except Exception as e:
+            results.put((job_id, None, str(e)))
+    if segment is not None:
+        segment.close()
+
+
+class MatchWorkerPool:
+    """テンプレートマッチングを別プロセスで行う
+
+    フレームは共有メモリにコピーして渡し（pickle しない）、結果はキューで受け取る。
+    呼び出し側は結果を待つ間 GIL を手放すので、Tk や pystray のスレッドは止まらない。
+    """
+
+    def __init__(self, config, image_dir, processes=1, timeout=5.0):
+        context = multiprocessing.get_context('spawn')
+        self.timeout = timeout
+        self.results = context.Queue()
+        self.requests = [context.Queue() for _ in range(processes)]
+        self.processes = [
+            context.Process(target=_worker_main, args=(config, image_dir, requests, self.results),
+                            name=f'match-worker-{i}', daemon=True)
+            for i, requests in enumerate(self.requests)
+        ]
+        for process in self.processes:
+            process.start()
+        self.segment = None
+        self.frame = None
+        self.shape = None
+        self.job_id = 0
+        self.next_worker = 0
+        logging.info(f"マッチング用ワーカープロセスを起動しました: {processes}")
+
+    def update_config(self, config):
+        for requests in self.requests:
+            requests.put(('config', config))
+
+    def _publish(self, frame):
+        """フレームのグレースケール画像を共有メモリに書き込む。同じフレームなら書き込まない"""
+        if self.frame is frame:
+            return
+        gray = frame.gray
+        if self.segment is None or self.segment.size < gray.nbytes:
+            self._release_segment()
+            self.segment = shared_memory.SharedMemory(create=True, size=gray.nbytes)
+        np.ndarray(gray.shape, dtype=np.uint8, buffer=self.segment.buf)[...] = gray
+        self.frame = frame
+        self.shape = gray.shape
+
+    def match(self, frame, jobs, confidence):
+        """jobs は (name, region, scales) のリスト。{name: MatchResult} を返す"""
+        from lol_auto_accept import MatchResult
+
+        self._publish(frame)
+        pending = {}
+        for name, region, scales in jobs:
+            self.job_id += 1
+            requests = self.requests[self.next_worker % len(self.requests)]
+            self.next_worker += 1
+            requests.put(('match', self.job_id, self.segment.name, self.shape, name, region,
+                          confidence, list(scales)))
+            pending[self.job_id] = name
+        results = {}
+        while pending:
+            try:
+                job_id, result, error = self.results.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError("マッチング用ワーカーから応答がありません") from None
+            name = pending.pop(job_id, None)
+            if name is None:
+                # タイムアウトした過去のジョブの応答は捨てる
+                continue
+            if error is not None:
+                raise RuntimeError(f"ワーカーでのマッチングに失敗しました ({name}): {error}")
+            results[name] = MatchResult(*result)
+        return results
+
+    def _release_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+            self.frame = None
+
+    def close(self):
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self._release_segment()
+        logging.info("マッチング用ワーカープロセスを停止しました")
@@ -0,0 +1,230 @@
+import bisect
+import logging
+import threading
+import time
+
+# ヒストグラムのバケット境界（ミリ秒）
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Series:
+    """1 つの計測区間の記録
+
+    直近 size 件はリングバッファに、全期間の分布は累積バケットに持つ。
+    書き込みはスキャンスレッドだけが行うのでロックは取らない。
+    読み出し側はコピーを取ってから集計するため、多少古い値が混ざっても問題ない。
+    """
+
+    def __init__(self, size=512):
+        self.values = [0.0] * size
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def observe(self, value):
+        self.values[self.count % self.size] = value
+        self.count += 1
+        self.total += value
+        self.buckets[bisect.bisect_left(BUCKETS_MS, value)] += 1
+
+    def recent(self):
+        count = self.count
+        if count < self.size:
+            return self.values[:count]
+        return list(self.values)
+
+    def summary(self):
+        values = sorted(self.recent())
+        if not values:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'p50': round(values[len(values) // 2], 3),
+            'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+            'max': round(values[-1], 3),
+        }
+
+
+class _Timer:
+    __slots__ = ('series', 'start')
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe((time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class _NullTimer:
+    """計測無効時に返す何もしないタイマー。毎回同じインスタンスを使う"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+def stats_line(summary, names=('capture', 'match', 'scan')):
+    """summary()（デーモンから受け取ったものでもよい）から GUI のステータス欄に出す 1 行を作る"""
+    parts = []
+    for name in names:
+        series = summary.get(name)
+        if series and series['count']:
+            parts.append(f"{name} {series['p50']:.1f}/{series['p95']:.1f}ms")
+    return " | ".join(parts)
+
+
+class Metrics:
+    """capture / match / click / sleep などの所要時間を記録する"""
+
+    def __init__(self):
+        self.enabled = False
+        self.series = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def _series(self, name):
+        series = self.series.get(name)
+        if series is None:
+            with self.lock:
+                series = self.series.setdefault(name, Series())
+        return series
+
+    def timer(self, name):
+        """with metrics.timer('match'): のように使う。無効時はほぼコストなし"""
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self._series(name))
+
+    def observe(self, name, value_ms):
+        if self.enabled:
+            self._series(name).observe(value_ms)
+
+    def increment(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """直近の計測値の p50 / p95 / max（ミリ秒）"""
+        return {name: series.summary() for name, series in list(self.series.items())}
+
+    def stats_line(self, names=('capture', 'match', 'scan')):
+        """GUI のステータス欄に出す 1 行"""
+        return stats_line(self.summary(), names)
+
+    def prometheus_text(self):
+        """Prometheus のテキスト形式"""
+        lines = [
+            '# HELP lol_auto_accept_stage_seconds Time spent in each stage of the scan loop.',
+            '# TYPE lol_auto_accept_stage_seconds histogram',
+        ]
+        for name, series in sorted(self.series.items()):
+            cumulative = 0
+            buckets = list(series.buckets)
+            for bound, count in zip(BUCKETS_MS, buckets):
+                cumulative += count
+                lines.append(f'lol_auto_accept_stage_seconds_bucket{{stage="{name}",le="{bound / 1000:g}"}} {cumulative}')
+            cumulative += buckets[-1]
+            lines.append(f'lol_auto_accept_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {cumulative}')
+            lines.append(f'lol_auto_accept_stage_seconds_sum{{stage="{name}"}} {series.total / 1000:.6f}')
+            lines.append(f'lol_auto_accept_stage_seconds_count{{stage="{name}"}} {cumulative}')
+        lines.append('# HELP lol_auto_accept_events_total Number of events by kind.')
+        lines.append('# TYPE lol_auto_accept_events_total counter')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'lol_auto_accept_events_total{{event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """定期的なログ出力と Prometheus 形式のファイル／HTTP エンドポイント"""
+
+    def __init__(self, metrics, log_interval_sec=60, prometheus_file='', prometheus_port=0):
+        self.metrics = metrics
+        self.log_interval_sec = log_interval_sec
+        self.prometheus_file = prometheus_file
+        self.prometheus_port = prometheus_port
+        self.stopped = threading.Event()
+        self.thread = None
+        self.server = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        if self.prometheus_port:
+            self._start_server()
+
+    def _start_server(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            # ローカルからのみ参照できるようにする
+            self.server = ThreadingHTTPServer(('127.0.0.1', self.prometheus_port), Handler)
+        except OSError as e:
+            logging.error(f"メトリクスエンドポイントを開始できません: {e}")
+            return
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"メトリクスを公開しました: http://127.0.0.1:{self.prometheus_port}/metrics")
+
+    def _loop(self):
+        while not self.stopped.wait(self.log_interval_sec):
+            summary = self.metrics.summary()
+            if summary:
+                logging.info(f"スキャン計測: {summary}")
+            self.write_file()
+
+    def write_file(self):
+        if not self.prometheus_file:
+            return
+        try:
+            with open(self.prometheus_file, 'w', encoding='utf-8') as f:
+                f.write(self.metrics.prometheus_text())
+        except Exception as e:
+            logging.error(f"メトリクスファイル書き込み失敗: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+        self.write_file()
+
+
+# プロセス全体で共有する計測器
+metrics = Metrics()
+
+
+def start_metrics(section):
+    """config.json の metrics セクションに従って計測を有効化する。無効なら None を返す"""
+    metrics.enabled = section['enabled']
+    if not metrics.enabled:
+        return None
+    exporter = MetricsExporter(metrics,
+                               log_interval_sec=section['log_interval_sec'],
+                               prometheus_file=section['prometheus_file'],
+                               prometheus_port=section['prometheus_port'])
+    exporter.start()
+    return exporter
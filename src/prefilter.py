@@ -0,0 +1,153 @@
+import logging
+import threading
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# HSV の量子化。彩度・明度の最下段（グレーや暗い画素）は背景に多いので判定に使わない。
+# レディチェックでは画面全体が暗くなるため、明度は最下段かどうかだけを見る
+HUE_BINS, SAT_BINS, VAL_BINS = 12, 4, 16
+HIST_RANGES = [0, 180, 0, 256, 0, 256]
+# テンプレートの有彩色画素のうち、これ未満しか占めない色は署名に含めない（縁のにじみなど）
+MIN_BIN_SHARE = 0.02
+SENTINELS = 6
+
+# bins: 署名の色（フラットなビン番号。色相・彩度の隣と、最下段以外のすべての明度を含む）
+# pixels: 署名の色の画素数（倍率 1.0）
+# sentinels: (fx, fy, 色相ビン) のタプル。fx, fy はテンプレート内の相対位置
+Signature = namedtuple('Signature', 'bins pixels sentinels')
+
+
+def _bin_index(hsv):
+    """HSV 画素（… x 3）を (色相, 彩度, 明度) のビン番号に量子化する"""
+    h = np.minimum(hsv[..., 0].astype(np.int32) * HUE_BINS // 180, HUE_BINS - 1)
+    s = hsv[..., 1].astype(np.int32) * SAT_BINS // 256
+    v = hsv[..., 2].astype(np.int32) * VAL_BINS // 256
+    return h, s, v
+
+
+def build_signature(color):
+    """BGR のテンプレート画像から色の署名を作る。特徴的な色が無ければ None（判定しない）"""
+    hsv = cv2.cvtColor(color, cv2.COLOR_BGR2HSV)
+    h, s, v = _bin_index(hsv)
+    chromatic = (s > 0) & (v > 0)
+    if chromatic.sum() < 16:
+        return None
+    flat = h * SAT_BINS + s
+    counts = np.bincount(flat[chromatic], minlength=HUE_BINS * SAT_BINS)
+    selected = np.flatnonzero(counts >= counts.sum() * MIN_BIN_SHARE)
+    pixels = int(counts[selected].sum())
+    # 拡大縮小や圧縮で色相・彩度が隣のビンにずれても数えられるよう、隣も含める
+    bins = set()
+    for index in selected:
+        hue, sat = divmod(int(index), SAT_BINS)
+        for dh in (-1, 0, 1):
+            for ds in (-1, 0, 1):
+                if 0 < sat + ds < SAT_BINS:
+                    base = (((hue + dh) % HUE_BINS) * SAT_BINS + sat + ds) * VAL_BINS
+                    bins.update(range(base + 1, base + VAL_BINS))
+    # 歩哨画素: テンプレートを 3x2 に分けた各区画で最も彩度の高い署名色の画素
+    in_signature = np.isin(flat, selected) & chromatic
+    saturation = np.where(in_signature, hsv[..., 1].astype(np.int32), -1)
+    height, width = saturation.shape
+    sentinels = []
+    for row in range(2):
+        for col in range(3):
+            y0, y1 = row * height // 2, (row + 1) * height // 2
+            x0, x1 = col * width // 3, (col + 1) * width // 3
+            cell = saturation[y0:y1, x0:x1]
+            if cell.size == 0 or cell.max() < 0:
+                continue
+            y, x = np.unravel_index(int(cell.argmax()), cell.shape)
+            sentinels.append(((x0 + x + 0.5) / width, (y0 + y + 0.5) / height, int(h[y0 + y, x0 + x])))
+    return Signature(np.array(sorted(bins)), pixels, tuple(sentinels[:SENTINELS]))
+
+
+class ColorPrefilter:
+    """テンプレートの色の署名で、対象が写っているはずのないフレームを照合前に除外する
+
+    1. ROI に前回の位置があれば、その位置の歩哨画素を数点だけ読む。署名の色なら照合に進む
+    2. 探索範囲を step 画素おきに間引いた HSV のヒストグラムで、署名の色の画素数を数える。
+       最小倍率のテンプレートが持つ画素数の slack 倍に満たなければ、写っていないと判定する
+
+    色の判定は必要条件だけなので、除外しない（照合に進む）側に倒してある。
+    """
+
+    def __init__(self, step=8, slack=0.5):
+        self.step = step
+        self.slack = slack
+        self.signatures = {}
+        self.lock = threading.Lock()
+        self.checks = {}
+        self.rejects = {}
+        self.probe_passes = {}
+
+    def configure(self, step, slack):
+        self.step = step
+        self.slack = slack
+
+    def signature(self, template):
+        """テンプレートの署名。テンプレートが読み込み直されたら作り直す"""
+        cached = self.signatures.get(template.name)
+        if cached is not None and cached[0] is template:
+            return cached[1]
+        if template.signature is not None:
+            signature = template.signature
+        else:
+            signature = build_signature(template.color) if template.color is not None else None
+        if signature is None:
+            logging.info(f"{template.name} は特徴的な色が無いため色による事前判定を行いません")
+        with self.lock:
+            self.signatures[template.name] = (template, signature)
+        return signature
+
+    def check(self, template, frame, region, min_scale, box=None):
+        """対象が写っている可能性があれば True。False なら照合を省略してよい"""
+        signature = self.signature(template)
+        if signature is None:
+            return True
+        name = template.name
+        self.checks[name] = self.checks.get(name, 0) + 1
+        if box is not None and self._probe(signature, frame, box):
+            self.probe_passes[name] = self.probe_passes.get(name, 0) + 1
+            return True
+        # 間引いた画像に写るはずの署名色の画素数。少なすぎると判定が不安定なので判定しない
+        expected = signature.pixels * min_scale * min_scale / (self.step * self.step)
+        if expected * self.slack < 4:
+            return True
+        sample = frame.color_sample(self.step, region)
+        hist = cv2.calcHist([sample], [0, 1, 2], None, [HUE_BINS, SAT_BINS, VAL_BINS], HIST_RANGES)
+        if hist.ravel()[signature.bins].sum() >= expected * self.slack:
+            return True
+        self.rejects[name] = self.rejects.get(name, 0) + 1
+        return False
+
+    def _probe(self, signature, frame, box):
+        """前回の位置の歩哨画素の 2/3 以上が署名の色相なら True"""
+        sentinels = signature.sentinels
+        if not sentinels:
+            return False
+        left, top, width, height = box
+        xs = np.array([min(frame.width - 1, left + int(fx * width)) for fx, _, _ in sentinels])
+        ys = np.array([min(frame.height - 1, top + int(fy * height)) for _, fy, _ in sentinels])
+        pixels = np.ascontiguousarray(frame.image[ys, xs][None])
+        h, s, v = _bin_index(cv2.cvtColor(pixels, cv2.COLOR_RGB2HSV)[0])
+        matched = 0
+        for (_, _, hue), ph, ps, pv in zip(sentinels, h, s, v):
+            if ps > 0 and pv > 0 and min((ph - hue) % HUE_BINS, (hue - ph) % HUE_BINS) <= 1:
+                matched += 1
+        return matched * 3 >= len(sentinels) * 2
+
+    def stats(self):
+        """テンプレートごとの除外率"""
+        return {
+            name: {
+                'checks': checks,
+                'rejects': self.rejects.get(name, 0),
+                'probe_passes': self.probe_passes.get(name, 0),
+                'reject_ratio': round(self.rejects.get(name, 0) / checks, 3),
+            }
+            for name, checks in self.checks.items()
+        }
+
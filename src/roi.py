@@ -0,0 +1,69 @@
+import json
+import logging
+
+from config_utils import write_atomic
+
+
+class RoiStore:
+    """テンプレートが最後に見つかった位置を解像度ごとに記憶し、探索範囲を絞り込む"""
+
+    def __init__(self, path, padding=40, max_misses=5):
+        self.path = path
+        self.padding = padding
+        self.max_misses = max_misses
+        self.misses = {}
+        self.regions = self._load()
+
+    def _load(self):
+        # path が None の場合はディスクに保存しない（ベンチマークなど）
+        if self.path is None:
+            return {}
+        try:
+            if self.path.exists():
+                return json.loads(self.path.read_text(encoding='utf-8'))
+        except Exception as e:
+            logging.error(f"ROIファイル読み込み失敗: {e}")
+        return {}
+
+    def _save(self):
+        if self.path is None:
+            return
+        try:
+            write_atomic(self.path, json.dumps(self.regions, indent=4))
+        except Exception as e:
+            logging.error(f"ROIファイル保存失敗: {e}")
+
+    @staticmethod
+    def resolution_key(width, height):
+        return f"{width}x{height}"
+
+    def search_region(self, name, width, height):
+        """探索範囲 (x0, y0, x1, y1) を返す。全画面を探すべきときは None"""
+        box = self.regions.get(self.resolution_key(width, height), {}).get(name)
+        if box is None:
+            return None
+        # 連続で見つからなかった場合は位置が変わった可能性があるので全画面を探す
+        if self.misses.get(name, 0) >= self.max_misses:
+            self.misses[name] = 0
+            return None
+        left, top, w, h = box
+        return (max(0, left - self.padding),
+                max(0, top - self.padding),
+                min(width, left + w + self.padding),
+                min(height, top + h + self.padding))
+
+    def last_box(self, name, width, height):
+        """最後に見つかった位置 (left, top, width, height)。なければ None"""
+        return self.regions.get(self.resolution_key(width, height), {}).get(name)
+
+    def record_hit(self, name, width, height, box):
+        self.misses[name] = 0
+        regions = self.regions.setdefault(self.resolution_key(width, height), {})
+        box = [int(v) for v in box]
+        if regions.get(name) != box:
+            regions[name] = box
+            logging.info(f"ROIを更新しました: {name} {box}")
+            self._save()
+
+    def record_miss(self, name):
+        self.misses[name] = self.misses.get(name, 0) + 1
@@ -0,0 +1,163 @@
+"""スキャンのスレッドを一定時間サンプリングするプロファイラ
+
+sys._current_frames で対象スレッドのスタックを interval_sec ごとに読み取り、
+終了時に次の 2 つを output_dir に書き出す。外部ツールを使わないので凍結ビルドでも動く。
+
+    profile-YYYYmmdd-HHMMSS.collapsed   折りたたみスタック（flamegraph.pl や speedscope で表示できる）
+    profile-YYYYmmdd-HHMMSS.json        段階（キャプチャ・色変換・照合・ロック待ちなど）ごとの時間の要約
+
+段階はスタックを末端から順にたどり、最初に STAGES に当てはまったフレームで決める。
+ワーカープロセスの中はサンプリングできないので、照合をワーカーに任せている間は lock（結果待ち）になる。
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+# (段階, モジュールのファイル名, 関数名の集合。None ならそのモジュールのすべての関数)
+STAGES = [
+    ('verify', 'verify.py', None),
+    ('capture', 'capture_backends.py', None),
+    ('colour', 'capture.py', {'gray', 'thumbnail', 'color_sample', '_scratch'}),
+    ('change_gate', 'capture.py', {'should_skip', 'record_negative'}),
+    ('prefilter', 'prefilter.py', None),
+    ('match', 'lol_auto_accept.py', {'match', '_match_scale', '_scores', '_sweep', 'search'}),
+    ('match', 'match_worker.py', None),
+    ('history', 'history.py', None),
+    # threading.py はスレッドの根にもあるので、待ちの関数だけを数える
+    ('lock', 'threading.py', {'wait', 'acquire', 'join', '_wait_for_tstate_lock'}),
+    ('lock', 'queue.py', {'get', 'put'}),
+    ('lock', '_base.py', {'result', 'wait'}),
+    # コアループが次のティックを待っている
+    ('idle', 'selectors.py', None),
+]
+TOP_FUNCTIONS = 15
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def classify(codes):
+    """末端から根へ並べたコードオブジェクトの列から段階を決める"""
+    for code in codes:
+        filename = os.path.basename(code.co_filename)
+        for stage, module, functions in STAGES:
+            if filename == module and (functions is None or code.co_name in functions):
+                return stage
+    return 'other'
+
+
+class SamplingProfiler:
+    """名前が threads のいずれかで始まるスレッドを duration_sec の間サンプリングする
+
+    on_finish(paths) は結果を書き出した後にサンプリングのスレッドで呼ばれる
+    （paths は {'collapsed': Path, 'summary': Path}、書き出せなければ None）。
+    """
+
+    def __init__(self, threads, interval_sec=0.005, duration_sec=30.0, output_dir=None, on_finish=None):
+        self.threads = tuple(threads)
+        self.interval_sec = interval_sec
+        self.duration_sec = duration_sec
+        self.output_dir = Path(output_dir) if output_dir else Path.cwd()
+        self.on_finish = on_finish
+        self.stacks = Counter()
+        self.stages = Counter()
+        self.functions = Counter()
+        self.samples = 0
+        self.rounds = 0
+        self.elapsed = 0.0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self.thread.start()
+        logging.info(f"プロファイルを開始しました（{self.duration_sec:g} 秒, {self.interval_sec * 1000:g}ms ごと）")
+
+    def stop(self):
+        """期間の途中で止める。結果はそこまでのサンプルで書き出す"""
+        self.stopped.set()
+
+    def _targets(self):
+        return {thread.ident: thread.name for thread in threading.enumerate()
+                if thread.name.startswith(self.threads)}
+
+    def _run(self):
+        start = time.perf_counter()
+        deadline = start + self.duration_sec
+        while not self.stopped.is_set() and time.perf_counter() < deadline:
+            self.sample()
+            self.stopped.wait(self.interval_sec)
+        self.elapsed = time.perf_counter() - start
+        try:
+            paths = self.write()
+        except OSError as e:
+            logging.error(f"プロファイルを書き出せません: {e}")
+            paths = None
+        if self.on_finish:
+            self.on_finish(paths)
+
+    def sample(self):
+        """対象スレッドのスタックを 1 回ずつ記録する"""
+        targets = self._targets()
+        frames = sys._current_frames()
+        self.rounds += 1
+        for ident, name in targets.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            self.samples += 1
+            self.stages[classify(codes)] += 1
+            self.functions[_frame_label(codes[0])] += 1
+            self.stacks[';'.join([name] + [_frame_label(code) for code in reversed(codes)])] += 1
+
+    def summary(self):
+        """段階ごとのサンプル数・割合と推定時間（ミリ秒）"""
+        # 実際の間隔はサンプリング自体の時間だけ長くなるので、経過時間から逆算する
+        per_sample_ms = self.elapsed * 1000 / max(1, self.rounds)
+        total = max(1, self.samples)
+        return {
+            'threads': list(self.threads),
+            'duration_sec': round(self.elapsed, 2),
+            'interval_ms': self.interval_sec * 1000,
+            'samples': self.samples,
+            'stages': {
+                stage: {
+                    'samples': count,
+                    'percent': round(count * 100 / total, 1),
+                    'estimated_ms': round(count * per_sample_ms, 1),
+                }
+                for stage, count in self.stages.most_common()
+            },
+            'top_functions': [
+                {'function': label, 'samples': count, 'percent': round(count * 100 / total, 1)}
+                for label, count in self.functions.most_common(TOP_FUNCTIONS)
+            ],
+        }
+
+    def write(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stem = self.output_dir / f"profile-{datetime.now():%Y%m%d-%H%M%S}"
+        collapsed = stem.with_suffix('.collapsed')
+        summary_path = stem.with_suffix('.json')
+        collapsed.write_text(''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()),
+                             encoding='utf-8')
+        summary = self.summary()
+        summary_path.write_text(json.dumps(summary, indent=2), encoding='utf-8')
+        stages = ', '.join(f"{stage} {info['percent']}%" for stage, info in summary['stages'].items())
+        logging.info(f"プロファイルを保存しました: {collapsed} ({summary['samples']} サンプル: {stages})")
+        return {'collapsed': collapsed, 'summary': summary_path}
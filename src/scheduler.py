@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+
+from config_utils import get_section
+
+IDLE = 'idle'
+IN_QUEUE = 'in_queue'
+READY_CHECK = 'ready_check'
+VERIFYING = 'verifying'
+POST_ACCEPT = 'post_accept'
+
+
+class Scheduler:
+    """状態ごとのポーリング間隔とエラー時の指数バックオフを管理する
+
+    idle:        マッチング画面も承認ボタンも見えていない。template_matching.interval_sec ごとに見る
+    in_queue:    マッチング画面が見えている。承認ボタンがいつ出てもよいよう速めに見る
+    ready_check: 承認ボタンが見えている。最速で見る
+    verifying:   クリックしたボタンが消えたか確かめている。verify.interval_sec ごとに見る
+    post_accept: 承認直後。しばらくスキャンを止める
+
+    状態は observe に渡された検出結果から決める（監視中かどうかでは決めない）。
+    """
+
+    def __init__(self, config, clock=time.monotonic):
+        self.clock = clock
+        self.state = IDLE
+        self.errors = 0
+        self.paused_until = 0.0
+        # 最後に確かめたときに見えていたか
+        self.queue_visible = False
+        self.button_visible = False
+        self.lock = threading.Lock()
+        self.configure(config)
+
+    def configure(self, config):
+        section = get_section(config, 'scheduler')
+        with self.lock:
+            self.intervals = {
+                # 待機中の間隔は従来どおり template_matching.interval_sec に従う
+                IDLE: get_section(config, 'template_matching')['interval_sec'],
+                IN_QUEUE: section['in_queue_sec'],
+                READY_CHECK: section['ready_check_sec'],
+                VERIFYING: get_section(config, 'verify')['interval_sec'],
+            }
+            self.post_accept_sec = section['post_accept_sec']
+            self.backoff_max_sec = section['backoff_max_sec']
+
+    def set_state(self, state):
+        """状態を直接決める。それまでの検出結果は忘れる（次の observe から決め直す）"""
+        with self.lock:
+            self.queue_visible = False
+            self.button_visible = False
+            self._set(state)
+            if state == POST_ACCEPT:
+                self.paused_until = self.clock() + self.post_accept_sec
+
+    def observe(self, queue=None, button=None):
+        """検出結果から状態を決める。None はそのティックで確かめていないもの
+
+        承認ボタンが見えていれば ready_check、マッチング画面が見えていれば in_queue、
+        どちらも見えなければ idle に戻す。クリックの確認中と承認直後の待機中は変えない。
+        """
+        with self.lock:
+            if queue is not None:
+                self.queue_visible = queue
+            if button is not None:
+                self.button_visible = button
+            if self.state == VERIFYING or (self.state == POST_ACCEPT and self.paused_until > self.clock()):
+                return
+            self._set(self._observed_state())
+
+    def _observed_state(self):
+        if self.button_visible:
+            return READY_CHECK
+        return IN_QUEUE if self.queue_visible else IDLE
+
+    def _set(self, state):
+        if state != self.state:
+            logging.debug(f"スケジューラ状態: {self.state} -> {state}")
+            self.state = state
+
+    def on_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def on_success(self):
+        with self.lock:
+            self.errors = 0
+
+    def paused(self):
+        """承認直後の待機中かどうか"""
+        with self.lock:
+            return self.state == POST_ACCEPT and self.paused_until > self.clock()
+
+    def verifying(self):
+        """クリックしたボタンが消えたか確かめている最中かどうか"""
+        with self.lock:
+            return self.state == VERIFYING
+
+    def next_delay(self):
+        """次のティックまでの待ち時間（秒）"""
+        with self.lock:
+            if self.state == POST_ACCEPT:
+                remaining = self.paused_until - self.clock()
+                if remaining > 0:
+                    return remaining
+                # 承認後の待機が終わったら、次の検出結果が出るまで待機中の間隔に戻る
+                self._set(self._observed_state())
+            delay = self.intervals[self.state]
+            if self.errors:
+                delay = min(self.backoff_max_sec, delay * (2 ** min(self.errors, 16)))
+            return delay
@@ -0,0 +1,54 @@
+import threading
+import time
+
+
+class StartupProfile:
+    """起動時の import と初期化の所要時間を記録し、--startup-profile 指定時に表示する"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.records = []
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        """with profile.stage('import tkinter'): のように区間を計測する"""
+        return _Stage(self, name)
+
+    def mark(self, name):
+        """起動からの経過時間を記録する（トレイ表示や検出準備完了など）"""
+        self._add(name, None, time.perf_counter())
+
+    def _add(self, name, start, end):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.records.append((name, start, end, threading.current_thread().name))
+
+    def report(self, title):
+        if not self.enabled:
+            return
+        with self.lock:
+            records = list(self.records)
+        lines = [f"--- startup profile: {title} ---",
+                 f"{'stage':40} {'thread':12} {'ms':>9} {'at(ms)':>9}"]
+        for name, start, end, thread in records:
+            elapsed = f"{(end - start) * 1000:9.1f}" if start is not None else f"{'':9}"
+            lines.append(f"{name:40} {thread[:12]:12} {elapsed} {(end - self.origin) * 1000:9.1f}")
+        print("\n".join(lines), flush=True)
+
+
+class _Stage:
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile._add(self.name, self.start, time.perf_counter())
+        return False
@@ -0,0 +1,302 @@
+"""テンプレートパックのコンパイルと読み込み
+
+    python src/template_pack.py               # resources/templates.json をコンパイルしてキャッシュを作る
+    python src/template_pack.py --locale en_US --force
+
+resources/templates.json（マニフェスト）には、テンプレートごとに解像度・ロケール別の画像を並べる。
+
+    {"base_resolution": "1280x720",
+     "default_locale": "ja_JP",
+     "resolutions": ["1024x576", "1280x720", "1600x900", "1920x1080"],
+     "templates": {"accept_button": [{"file": "accept_button.png", "resolution": "1280x720",
+                                      "locale": "ja_JP"}]}}
+
+resolutions のクライアント解像度ごとに、最も近い画像からグレースケール・ピラミッドの縮小画像・
+色の署名を前処理し、1 つの配列ファイル（.npy）と索引（.json）に書き出す。起動時は索引だけを読み、
+配列はメモリマップで参照するので、画像のデコードや拡大縮小は行わない。
+マニフェストと画像の内容のハッシュが変わったらコンパイルし直す。読み込んだ後に画像やマニフェストが
+更新されたかは更新時刻で確かめられる（TemplatePack.stale）。
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config_utils import get_data_path, write_atomic
+from prefilter import Signature, build_signature
+from templates import Template
+
+MANIFEST = 'templates.json'
+CACHE_INDEX = 'template_cache.json'
+# 前処理の方法を変えたら上げる（古いキャッシュを使わないように）
+CACHE_VERSION = 1
+# Template.downsampled と同じ縮小画像をこの段数まで用意する
+PYRAMID_LEVELS = 3
+
+
+def parse_resolution(text):
+    width, height = (int(v) for v in text.lower().split('x'))
+    return width, height
+
+
+def load_manifest(resource_dir):
+    """マニフェストを読む。無ければ None（config.json の images を使う）"""
+    path = Path(resource_dir) / MANIFEST
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def source_files(manifest):
+    """テンプレートごとに、マニフェストが参照する画像ファイル（resources からの相対パス）"""
+    return {name: sorted({variant['file'] for variant in variants})
+            for name, variants in manifest['templates'].items()}
+
+
+def source_stamp(resource_dir, manifest):
+    """マニフェストと参照する画像の更新時刻・サイズ。パックが古くなったかの判定に使う"""
+    files = sorted({file for names in source_files(manifest).values() for file in names})
+    stamp = []
+    for file in [MANIFEST] + files:
+        try:
+            stat = (Path(resource_dir) / file).stat()
+            stamp.append((file, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append((file, None, None))
+    return tuple(stamp)
+
+
+def content_hash(resource_dir, manifest, locale):
+    """マニフェスト・参照する画像・ロケール・前処理の版から作るキャッシュの鍵"""
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION}:{locale}:{PYRAMID_LEVELS}".encode())
+    digest.update(json.dumps(manifest, sort_keys=True).encode())
+    for name in sorted(manifest['templates']):
+        for variant in manifest['templates'][name]:
+            digest.update(variant['file'].encode())
+            digest.update((Path(resource_dir) / variant['file']).read_bytes())
+    return digest.hexdigest()
+
+
+def _select_variant(variants, locale, resolution, base_resolution):
+    """ロケールが一致するものを優先し、その中から高さが resolution に最も近い画像を選ぶ
+
+    拡大より縮小のほうが劣化が少ないので、同じ差なら大きい画像を選ぶ
+    """
+    localized = [v for v in variants if v.get('locale') == locale]
+    candidates = localized or [v for v in variants if not v.get('locale')] or variants
+    height = resolution[1]
+
+    def distance(variant):
+        variant_height = parse_resolution(variant.get('resolution', base_resolution))[1]
+        return (abs(variant_height - height), variant_height < height)
+
+    return min(candidates, key=distance)
+
+
+def _decode(path, flags):
+    image = cv2.imdecode(np.fromfile(str(path), dtype=np.uint8), flags)
+    if image is None:
+        raise ValueError(f"画像をデコードできません: {path}")
+    return image
+
+
+def _resize(image, factor):
+    if factor == 1.0:
+        return image
+    size = (max(1, round(image.shape[1] * factor)), max(1, round(image.shape[0] * factor)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA if factor < 1.0 else cv2.INTER_LINEAR)
+
+
+def compile_pack(resource_dir, manifest, locale):
+    """マニフェストの全テンプレートを解像度ごとに前処理し、(配列の辞書, 索引) を返す
+
+    倍率はベース解像度に対する高さの比で、config.json の scales と同じ尺度
+    """
+    base = manifest['base_resolution']
+    base_height = parse_resolution(base)[1]
+    resolutions = [parse_resolution(r) for r in manifest['resolutions']]
+    if parse_resolution(base) not in resolutions:
+        resolutions.insert(0, parse_resolution(base))
+    arrays = {}
+    templates = {}
+    for name, variants in manifest['templates'].items():
+        scales = {}
+        for resolution in resolutions:
+            variant = _select_variant(variants, locale, resolution, base)
+            variant_height = parse_resolution(variant.get('resolution', base))[1]
+            gray = _decode(Path(resource_dir) / variant['file'], cv2.IMREAD_GRAYSCALE)
+            scaled = np.ascontiguousarray(_resize(gray, resolution[1] / variant_height))
+            scale = round(resolution[1] / base_height, 4)
+            key = f"{name}@{scale}"
+            arrays[key] = scaled
+            for level in range(1, PYRAMID_LEVELS + 1):
+                factor = 1 << level
+                size = (max(1, scaled.shape[1] // factor), max(1, scaled.shape[0] // factor))
+                arrays[f"{key}/{level}"] = cv2.resize(scaled, size, interpolation=cv2.INTER_AREA)
+            scales[str(scale)] = {'key': key, 'file': variant['file']}
+        base_variant = _select_variant(variants, locale, parse_resolution(base), base)
+        signature = build_signature(_decode(Path(resource_dir) / base_variant['file'], cv2.IMREAD_COLOR))
+        templates[name] = {
+            'scales': scales,
+            'signature': None if signature is None else {
+                'bins': [int(b) for b in signature.bins],
+                'pixels': signature.pixels,
+                'sentinels': [list(s) for s in signature.sentinels],
+            },
+        }
+    return arrays, {
+        'templates': templates,
+        'scales': [round(r[1] / base_height, 4) for r in resolutions],
+        'resolutions': {f"{r[0]}x{r[1]}": round(r[1] / base_height, 4) for r in resolutions},
+    }
+
+
+def _write_cache(index_path, digest, arrays, index):
+    """配列を 1 つの .npy にまとめ、索引を最後に置き換える（読み手は常に揃った組を見る）"""
+    index_path = Path(index_path)
+    blob_path = index_path.with_name(f"{index_path.stem}-{digest[:12]}.npy")
+    offsets = {}
+    position = 0
+    for key, array in arrays.items():
+        offsets[key] = [position, list(array.shape)]
+        position += array.nbytes
+    blob = np.empty(position, dtype=np.uint8)
+    for key, array in arrays.items():
+        offset, _ = offsets[key]
+        blob[offset:offset + array.nbytes] = array.reshape(-1)
+    temp_path = blob_path.with_name(blob_path.name + '.tmp')
+    with open(temp_path, 'wb') as f:
+        np.save(f, blob)
+    os.replace(temp_path, blob_path)
+    write_atomic(index_path, json.dumps({'hash': digest, 'blob': blob_path.name, 'arrays': offsets, **index}))
+    # 以前のハッシュの配列ファイルは消す
+    for stale in index_path.parent.glob(f"{index_path.stem}-*.npy"):
+        if stale != blob_path:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+
+
+class TemplatePack:
+    """コンパイル済みのテンプレートパック。配列はメモリマップした 1 つのファイルのビュー
+
+    files はテンプレートごとにマニフェストが参照する画像、stamp は読み込む前に取った source_stamp
+    """
+
+    def __init__(self, digest, index, blob, resource_dir=None, manifest=None, stamp=None):
+        self.digest = digest
+        self.resource_dir = resource_dir
+        self.manifest = manifest
+        self.files = source_files(manifest) if manifest is not None else {}
+        self.stamp = stamp
+        self.scales = index['scales']
+        self.templates = {}
+        views = {key: blob[offset:offset + int(np.prod(shape))].reshape(shape)
+                 for key, (offset, shape) in index['arrays'].items()}
+        self.resolutions = {parse_resolution(r): scale for r, scale in index['resolutions'].items()}
+        for name, entry in index['templates'].items():
+            self.templates[name] = self._template(name, entry, views)
+
+    def _template(self, name, entry, views):
+        scaled = {float(scale): views[info['key']] for scale, info in entry['scales'].items()}
+        base = scaled.get(1.0)
+        if base is None:
+            raise ValueError(f"ベース解像度の画像がありません: {name}")
+        # mtime の代わりにハッシュを使う（変化検出の文脈に含まれる）
+        template = Template(name, f"pack:{name}", self.digest, base, 0.0)
+        template._scaled.update(scaled)
+        for scale, info in entry['scales'].items():
+            for level in range(1, PYRAMID_LEVELS + 1):
+                template._downsampled[(float(scale), level)] = views[f"{info['key']}/{level}"]
+        signature = entry.get('signature')
+        if signature is not None:
+            template.signature = Signature(np.array(signature['bins']), signature['pixels'],
+                                           tuple(tuple(s) for s in signature['sentinels']))
+        return template
+
+    def names(self):
+        return list(self.templates)
+
+    def get(self, name):
+        return self.templates[name]
+
+    def covers(self, name, file):
+        """file がマニフェストで name の画像として挙がっているか"""
+        return file in self.files.get(name, ())
+
+    def stale(self):
+        """読み込んだ後にマニフェストや画像が更新されたか"""
+        if self.stamp is None:
+            return False
+        return source_stamp(self.resource_dir, self.manifest) != self.stamp
+
+    def scale_for(self, width, height):
+        """フレームの解像度に対応する倍率。パックに無い解像度なら None"""
+        return self.resolutions.get((width, height))
+
+
+def load_pack(resource_dir, locale='', index_path=None, force=False):
+    """キャッシュが最新なら読み込み、古ければコンパイルし直して TemplatePack を返す
+
+    マニフェストが無ければ None
+    """
+    manifest = load_manifest(resource_dir)
+    if manifest is None:
+        return None
+    locale = locale or manifest.get('default_locale', '')
+    index_path = Path(index_path) if index_path else get_data_path(CACHE_INDEX)
+    # ハッシュより先に取る（途中で更新されたら次の確認で古いと分かるように）
+    stamp = source_stamp(resource_dir, manifest)
+    digest = content_hash(resource_dir, manifest, locale)
+    index = None
+    if not force and index_path.exists():
+        try:
+            index = json.loads(index_path.read_text(encoding='utf-8'))
+        except ValueError:
+            index = None
+    if index is not None and index.get('hash') == digest:
+        try:
+            blob = np.load(index_path.with_name(index['blob']), mmap_mode='r')
+            return TemplatePack(digest, index, blob, resource_dir, manifest, stamp)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"テンプレートキャッシュを読み込めません。作り直します: {e}")
+    start = time.perf_counter()
+    arrays, index = compile_pack(resource_dir, manifest, locale)
+    _write_cache(index_path, digest, arrays, index)
+    logging.info(f"テンプレートパックをコンパイルしました: {len(index['templates'])} テンプレート, "
+                 f"{len(index['scales'])} 解像度 ({(time.perf_counter() - start) * 1000:.1f}ms)")
+    index = json.loads(index_path.read_text(encoding='utf-8'))
+    blob = np.load(index_path.with_name(index['blob']), mmap_mode='r')
+    return TemplatePack(digest, index, blob, resource_dir, manifest, stamp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='テンプレートパックをコンパイルする')
+    parser.add_argument('--locale', default='', help='使用するロケール（省略時はマニフェストの default_locale）')
+    parser.add_argument('--force', action='store_true', help='キャッシュが最新でもコンパイルし直す')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    resource_dir = Path(getattr(sys, '_MEIPASS', Path(__file__).resolve().parent.parent)) / 'resources'
+    start = time.perf_counter()
+    pack = load_pack(resource_dir, args.locale, force=args.force)
+    if pack is None:
+        sys.exit(f"マニフェストがありません: {resource_dir / MANIFEST}")
+    print(f"{len(pack.templates)} templates, scales={pack.scales}, "
+          f"loaded in {(time.perf_counter() - start) * 1000:.1f}ms")
+    for name, template in pack.templates.items():
+        sizes = ', '.join(f"{scale}:{image.shape[1]}x{image.shape[0]}" for scale, image in sorted(template._scaled.items()))
+        print(f"  {name}: {sizes}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import logging
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from config_utils import get_section
+
+# pyautogui.locateOnScreen と同じ (left, top, width, height) 形式
+Box = namedtuple('Box', 'left top width height')
+
+
+class Template:
+    """デコード済みのテンプレート画像と統計情報"""
+
+    def __init__(self, name, path, mtime, image, load_ms, color=None):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.image = image
+        # 色による事前判定 (prefilter) 用の BGR 画像と、コンパイル済みパックの場合は署名
+        self.color = color
+        self.signature = None
+        self.height, self.width = image.shape[:2]
+        # TM_CCOEFF_NORMED は分散ゼロのテンプレートでは定義されないため事前に確認しておく
+        self.mean = float(image.mean())
+        self.std = float(image.std())
+        self.load_ms = load_ms
+        self._scaled = {}
+        self._downsampled = {}
+        self.match_count = 0
+        self.match_ms_total = 0.0
+        self.match_ms_last = 0.0
+
+    def scaled(self, scale):
+        """倍率を掛けたテンプレート。倍率ごとに一度だけ生成する"""
+        image = self._scaled.get(scale)
+        if image is None:
+            if scale == 1.0:
+                image = self.image
+            else:
+                size = (max(1, round(self.width * scale)), max(1, round(self.height * scale)))
+                interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+                image = cv2.resize(self.image, size, interpolation=interpolation)
+                image.flags.writeable = False
+            self._scaled[scale] = image
+        return image
+
+    def downsampled(self, scale, level):
+        """ピラミッドの level 段目 (1/2**level) に縮小したテンプレート"""
+        key = (scale, level)
+        image = self._downsampled.get(key)
+        if image is None:
+            source = self.scaled(scale)
+            factor = 1 << level
+            size = (max(1, source.shape[1] // factor), max(1, source.shape[0] // factor))
+            image = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+            image.flags.writeable = False
+            self._downsampled[key] = image
+        return image
+
+    def record_match(self, elapsed_ms):
+        self.match_count += 1
+        self.match_ms_total += elapsed_ms
+        self.match_ms_last = elapsed_ms
+
+
+class TemplateRegistry:
+    """config.json の images をグレースケール配列として一度だけ読み込み、使い回す
+
+    resources/templates.json（テンプレートパック）があれば、そちらのコンパイル済みの
+    解像度別テンプレートを使う（template_pack.py）。ただし images がマニフェストに無い画像を
+    指しているテンプレートは、その画像を直接読み込む。パックの画像やマニフェストが更新されたら
+    次の取得時に読み込み直す（内容が変わっていればコンパイルし直す）。更新の確認は画像の数だけ
+    stat するので、取得のたびではなく check_interval_sec ごと（と設定の差し替え時）に行う
+    """
+
+    def __init__(self, config, image_dir, check_interval_sec=1.0, clock=time.monotonic):
+        self.image_dir = image_dir
+        self._images = {}
+        self._templates = {}
+        self.check_interval_sec = check_interval_sec
+        self.clock = clock
+        # 次にパックの更新を確かめる時刻
+        self.next_check = 0.0
+        self.pack = None
+        self.pack_section = get_section(config, 'template_pack')
+        self.update_config(config)
+
+    def update_config(self, config):
+        """設定を差し替える。ファイル名が変わったテンプレートだけ次回取得時に再読み込みされる
+
+        テンプレートパックは内容のハッシュを確かめ、変わっていればコンパイルし直す
+        """
+        self.apply(config, self.prepare(config))
+
+    def prepare(self, config):
+        """設定のテンプレートパックを読み込む（今の状態は変えない）。apply に渡す"""
+        return self._load_pack(get_section(config, 'template_pack'))
+
+    def _load_pack(self, section):
+        if not section['enabled']:
+            return None
+        from template_pack import load_pack
+
+        try:
+            return load_pack(os.path.join(self.image_dir, 'resources'), section['locale'])
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"テンプレートパックを読み込めません。images の画像を使います: {e}")
+            return None
+
+    def apply(self, config, pack):
+        """prepare で読み込んだパックとともに設定を差し替える。例外は送出しない"""
+        self._images = dict(config.get('images', {}))
+        self.pack_section = get_section(config, 'template_pack')
+        for name in list(self._templates):
+            if self._templates[name].path != self.path(name):
+                del self._templates[name]
+        if pack is None or self.pack is None or pack.digest != self.pack.digest:
+            self.pack = pack
+        # 設定を差し替えたら次の取得ですぐに確かめる
+        self.next_check = 0.0
+
+    def _refresh_pack(self):
+        """パックの元の画像やマニフェストが更新されていれば読み込み直す（check_interval_sec に 1 回だけ確かめる）"""
+        if self.pack is None:
+            return
+        now = self.clock()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval_sec
+        if self.pack.stale():
+            logging.info("テンプレートパックの画像が更新されたため読み込み直します")
+            self.pack = self._load_pack(self.pack_section)
+
+    def _from_pack(self, name):
+        """name をパックから取るか。images がマニフェストに無い画像を指していれば画像を直接使う"""
+        if self.pack is None or name not in self.pack.templates:
+            return False
+        image = self._images.get(name)
+        return image is None or self.pack.covers(name, image)
+
+    def names(self):
+        names = list(self.pack.names()) if self.pack is not None else []
+        return names + [name for name in self._images if name not in names]
+
+    def scales(self):
+        """パックの解像度に対応する倍率。パックが無ければ None（config.json の scales を使う）"""
+        return list(self.pack.scales) if self.pack is not None else None
+
+    def scale_for(self, width, height):
+        """フレームの解像度に合わせてコンパイルされた倍率。無ければ None"""
+        return self.pack.scale_for(width, height) if self.pack is not None else None
+
+    def path(self, name):
+        rel = self._images.get(name)
+        if rel is None:
+            return None
+        return os.path.join(self.image_dir, 'resources', rel)
+
+    def available(self, name):
+        """画像ファイルが存在するテンプレートかどうか"""
+        if self._from_pack(name):
+            return True
+        path = self.path(name)
+        return path is not None and os.path.exists(path)
+
+    def get(self, name):
+        """テンプレートを返す。パックの元の画像や、画像ファイルの更新時刻が変わっていれば読み込み直す"""
+        self._refresh_pack()
+        if self._from_pack(name):
+            return self.pack.get(name)
+        path = self.path(name)
+        if path is None:
+            raise KeyError(f"未定義のテンプレートです: {name}")
+        mtime = os.stat(path).st_mtime_ns
+        template = self._templates.get(name)
+        if template is None or template.mtime != mtime:
+            template = self._load(name, path, mtime)
+            self._templates[name] = template
+        return template
+
+    def _load(self, name, path, mtime):
+        start = time.perf_counter()
+        # cv2.imread は非 ASCII パスを扱えないため、バイト列からデコードする
+        data = np.fromfile(path, dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+        color = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if image is None or color is None:
+            raise ValueError(f"画像をデコードできません: {path}")
+        image = np.ascontiguousarray(image)
+        image.flags.writeable = False
+        color.flags.writeable = False
+        load_ms = (time.perf_counter() - start) * 1000
+        logging.info(f"テンプレート読み込み: {name} ({image.shape[1]}x{image.shape[0]}, {load_ms:.1f}ms)")
+        return Template(name, path, mtime, image, load_ms, color)
+
+    def stats(self):
+        """テンプレートごとの読み込み・マッチング時間"""
+        result = {}
+        templates = dict(self._templates)
+        if self.pack is not None:
+            templates.update((name, t) for name, t in self.pack.templates.items() if self._from_pack(name))
+        for name, t in templates.items():
+            result[name] = {
+                'load_ms': round(t.load_ms, 3),
+                'matches': t.match_count,
+                'match_ms_avg': round(t.match_ms_total / t.match_count, 3) if t.match_count else 0.0,
+                'match_ms_last': round(t.match_ms_last, 3),
+            }
+        return result
@@ -1,5 +1,3 @@
-import pystray
-from PIL import Image
 from threading import Thread
 import logging
 import os
@@ -7,6 +5,10 @@ from pathlib import Path
 
 class TrayIcon:
     def __init__(self, controller, icon_path=None):
+        # pystray と PIL はトレイを使うときだけ読み込む
+        import pystray
+        from PIL import Image
+        self.pystray = pystray
         self.controller = controller
         
         # Default icon path if not provided
@@ -32,6 +34,9 @@ class TrayIcon:
         try:
             # Store monitoring state - initialize from controller
             self.is_monitoring = controller.monitoring
+            self.is_profiling = False
+            # The menu only reads a flag, so messages are applied on the core loop thread
+            controller.ui.subscribe(self.on_ui_message)
             
             # Create the icon
             self.icon = pystray.Icon(
@@ -46,10 +51,12 @@ class TrayIcon:
             raise
     
     def _create_menu(self):
+        pystray = self.pystray
         return pystray.Menu(
             pystray.MenuItem('開く', self._handle_open),
             pystray.MenuItem('開始', self._handle_start, checked=lambda item: self.is_monitoring),
             pystray.MenuItem('停止', self._handle_stop, checked=lambda item: not self.is_monitoring),
+            pystray.MenuItem('プロファイル', self._handle_profile, checked=lambda item: self.is_profiling),
             pystray.MenuItem('終了', self._handle_exit)
         )
     
@@ -62,10 +69,20 @@ class TrayIcon:
     def _handle_stop(self):
         self.controller.stop()
     
+    def _handle_profile(self):
+        self.controller.toggle_profile()
+
     def _handle_exit(self):
         self.shutdown()
         self.controller.exit()
     
+    def on_ui_message(self, kind, value):
+        """Apply a message from the controller's core loop"""
+        if kind == 'monitoring':
+            self.update_menu_state(value[0])
+        elif kind == 'profile':
+            self.is_profiling = value[0]
+
     def update_menu_state(self, is_monitoring):
         """Update the tray icon menu to reflect the current monitoring state"""
         self.is_monitoring = is_monitoring
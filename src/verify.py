@@ -0,0 +1,82 @@
+import logging
+import time
+from collections import namedtuple
+
+from config_utils import get_section
+
+# confirmed: ボタンが消えたことを確認できたか / clicks: クリック回数 / elapsed: 所要秒数
+VerifyResult = namedtuple('VerifyResult', 'confirmed clicks elapsed')
+
+
+class ClickVerifier:
+    """クリック後にボタンの周辺だけを確認し、消えるまでクリックを再試行する
+
+    フェードイン中のクリックは無視されることがあるため、クリックしただけでは成功とみなさない。
+    確認は待ち合わせずに進める。begin でクリックしたら、以降のティックごとに check を呼ぶ
+    （ティックの間隔はスケジューラの verifying 状態が interval_sec にする）。
+    click / clock は差し替えられるので、リプレイや偽の時計でも同じ手順を再現できる。
+    """
+
+    def __init__(self, config, click, clock=time.monotonic):
+        self.click = click
+        self.clock = clock
+        # 確認中のクリック。確認していなければ None
+        self.pending = None
+        self.configure(config)
+
+    def configure(self, config):
+        section = get_section(config, 'verify')
+        self.window_sec = float(section['window_sec'])
+        self.interval_sec = float(section['interval_sec'])
+        self.retry_sec = float(section['retry_sec'])
+        self.max_clicks = int(section['max_clicks'])
+        self.confirm_misses = max(1, int(section['confirm_misses']))
+
+    def begin(self, point):
+        """point をクリックし、確認を始める"""
+        start = self.clock()
+        self.click(point)
+        self.pending = _Pending(point, start, start + self.window_sec)
+
+    def check(self, visible):
+        """確認を 1 回進める。まだ決まらなければ None、決まれば VerifyResult を返す
+
+        visible() が confirm_misses 回続けて False になれば成功とする。ボタンが残っていれば
+        retry_sec ごとに max_clicks 回までクリックし直す。window_sec を過ぎても消えなければ
+        失敗（呼び出し側は次のスキャンで改めて探す）
+        """
+        pending = self.pending
+        if not visible():
+            pending.misses += 1
+            if pending.misses >= self.confirm_misses:
+                return self._finish(True)
+        else:
+            pending.misses = 0
+            now = self.clock()
+            if pending.clicks < self.max_clicks and now - pending.last_click >= self.retry_sec:
+                logging.info("承認ボタンが残っているため再度クリックします")
+                self.click(pending.point)
+                pending.clicks += 1
+                pending.last_click = now
+        if self.clock() >= pending.deadline:
+            return self._finish(False)
+        return None
+
+    def cancel(self):
+        self.pending = None
+
+    def _finish(self, confirmed):
+        pending, self.pending = self.pending, None
+        return VerifyResult(confirmed, pending.clicks, self.clock() - pending.start)
+
+
+class _Pending:
+    """確認中のクリック 1 回分の状態"""
+
+    def __init__(self, point, start, deadline):
+        self.point = point
+        self.start = start
+        self.deadline = deadline
+        self.clicks = 1
+        self.last_click = start
+        self.misses = 0
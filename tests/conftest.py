@@ -0,0 +1,16 @@
+"""テスト共通設定: src と benchmarks をインポートできるようにし、合成コーパスを用意する"""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+
+@pytest.fixture(scope='session')
+def corpus(tmp_path_factory):
+    """解像度・状態ごとに 2 枚ずつの合成コーパス（ディスプレイ不要）"""
+    import make_corpus
+    return make_corpus.generate(tmp_path_factory.mktemp('corpus'), per_state=2, seed=0)
@@ -0,0 +1,45 @@
+"""台本再生シミュレーションで承認の見逃し・誤クリック・遅延を確認する"""
+import argparse
+
+import accept_latency
+import pytest
+
+# 受け付けまでの p95 の予算（benchmarks/accept_latency.py の既定値と同じ）
+MAX_P95_MS = 1500.0
+# 予算の判定に使うタイムラインの数。p95 を解像度ごとにも見られるだけの標本にする
+BUDGET_TIMELINES = 2000
+
+
+def simulation_args(seed, timelines=15, lobby_sec=(0.5, 5.0), queue_sec=(1.0, 20.0)):
+    return argparse.Namespace(
+        resolution=None, timelines=timelines, seed=seed,
+        lobby_sec=lobby_sec, queue_sec=queue_sec, fade_ms=150.0, accept_window=7.0,
+        # 実際の処理時間を含めないので、マシンの速さによらず同じ結果になる
+        cpu_scale=0.0,
+    )
+
+
+def test_every_ready_check_is_accepted_within_budget(corpus):
+    # 既定の待ち時間での短い確認。統計的な予算の判定は test_budget_holds_over_thousands_of_timelines で行う
+    for seed in (0, 1):
+        result = accept_latency.run(corpus, simulation_args(seed))
+        assert result['missed'] == 0, f"seed={seed}"
+        assert result['false_clicks'] == 0, f"seed={seed}"
+        assert result['accepted'] == result['timelines']
+        assert result['accept_ms']['p95'] <= MAX_P95_MS, f"seed={seed}: {result['accept_ms']}"
+
+
+
+@pytest.mark.slow
+def test_budget_holds_over_thousands_of_timelines(corpus):
+    # 遅延はボタンが出る時刻とティックの位相で決まるので、待ち時間は短くしてその分タイムラインを増やす
+    args = simulation_args(2, timelines=BUDGET_TIMELINES, lobby_sec=(0.5, 2.0), queue_sec=(1.0, 5.0))
+    result = accept_latency.run(corpus, args)
+    assert result['missed'] == 0
+    assert result['false_clicks'] == 0
+    assert result['accepted'] == BUDGET_TIMELINES
+    assert result['accept_ms']['p95'] <= MAX_P95_MS, result['accept_ms']
+    by_resolution = result['accept_ms_by_resolution']
+    assert len(by_resolution) == len(result['corpus']['resolutions'])
+    for resolution, stats in by_resolution.items():
+        assert stats['p95'] <= MAX_P95_MS, f"{resolution}: {stats}"
@@ -0,0 +1,99 @@
+"""照合スコアのヒストグラムと、大津の方法による confidence の推奨値"""
+import json
+import sys
+
+import pytest
+
+import calibration
+import config_utils
+from calibration import BINS, ScoreHistograms, calibrate, calibrate_all
+
+NEGATIVE_SCORES = [0.30, 0.35, 0.40, 0.45]
+POSITIVE_SCORES = [0.85, 0.90, 0.95]
+
+
+def histogram(scores, repeat=25):
+    counts = [0] * BINS
+    for score in scores:
+        counts[calibration._bin(score)] += repeat
+    return counts
+
+
+def separated():
+    return [a + b for a, b in zip(histogram(NEGATIVE_SCORES), histogram(POSITIVE_SCORES))]
+
+
+def test_threshold_sits_between_the_two_peaks():
+    result = calibrate(separated())
+    assert result.negative_high == 0.46
+    assert result.positive_low == 0.85
+    assert result.threshold == pytest.approx((0.46 + 0.85) / 2, abs=0.001)
+    assert result.margin > 0
+    assert (result.negatives, result.positives) == (100, 75)
+
+
+def test_too_few_samples_give_no_result():
+    assert calibrate([0] * BINS) is None
+    assert calibrate(histogram([0.4])) is None
+    assert calibrate([a + b for a, b in zip(histogram(NEGATIVE_SCORES), histogram([0.9], repeat=5))]) is None
+
+
+def test_overall_threshold_satisfies_every_template():
+    other = [a + b for a, b in zip(histogram([0.55]), histogram([0.80]))]
+    results, overall = calibrate_all({('1280x720', 'accept_button'): separated(),
+                                      ('1280x720', 'matching_screen'): other})
+    assert all(result is not None for result in results.values())
+    assert overall.negative_high == 0.56
+    assert overall.positive_low == 0.80
+    assert 0.56 < overall.threshold < 0.80
+
+
+def test_histograms_persist(tmp_path):
+    path = tmp_path / 'score_histograms.json'
+    scores = ScoreHistograms(path, flush_every=3)
+    for score in (0.1, 0.9, 0.95):
+        scores.record('accept_button', 1280, 720, score)
+    # flush_every 件ごとに書き出す
+    assert path.exists()
+    loaded = dict(ScoreHistograms(path).items())
+    counts = loaded[('1280x720', 'accept_button')]
+    assert sum(counts) == 3
+    assert counts[calibration._bin(0.9)] == 1
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    config_path = tmp_path / 'config.json'
+    config_path.write_text(json.dumps(config_utils.DEFAULT_CONFIG), encoding='utf-8')
+    monkeypatch.setattr(config_utils, 'get_config_path', lambda: config_path)
+    monkeypatch.setattr(calibration, 'get_data_path', lambda name: tmp_path / name)
+    return tmp_path, config_path
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['calibration.py', *args])
+    calibration.main()
+
+
+def write_histograms(directory, counts):
+    (directory / 'score_histograms.json').write_text(
+        json.dumps({'1280x720': {'accept_button': counts}}), encoding='utf-8')
+
+
+def test_write_updates_confidence(files, monkeypatch):
+    directory, config_path = files
+    write_histograms(directory, separated())
+    run_main(monkeypatch)
+    # --write を付けなければ表示だけ
+    assert json.loads(config_path.read_text(encoding='utf-8'))['template_matching']['confidence'] == 0.7
+    run_main(monkeypatch, '--write')
+    expected = calibrate(separated()).threshold
+    assert json.loads(config_path.read_text(encoding='utf-8'))['template_matching']['confidence'] == expected
+
+
+def test_write_refuses_overlapping_scores(files, monkeypatch):
+    directory, config_path = files
+    # スコアが切れ目なく分布していると、2 つの山の間に余裕 (margin) が無い
+    write_histograms(directory, histogram([i / 100 for i in range(30, 90)], repeat=5))
+    run_main(monkeypatch, '--write')
+    assert json.loads(config_path.read_text(encoding='utf-8'))['template_matching']['confidence'] == 0.7
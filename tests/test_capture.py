@@ -0,0 +1,50 @@
+"""フレームリングとディスプレイごとのキャプチャ、変化検出による照合の省略"""
+import cv2
+import numpy as np
+from memory_report import MemoryBackend
+from run_benchmarks import OFFLINE_OVERRIDES, create_auto_accept, load_corpus
+
+from capture_backends import ReplayBackend
+
+
+def test_sweep_does_not_overwrite_current_frame(tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / f'{i}.png'), rng.integers(0, 255, (60, 160, 3), dtype=np.uint8))
+    # 4 つのディスプレイに対してリングは 1 枠だけ
+    backend = ReplayBackend(str(tmp_path), displays=[[i * 40, 0, 40, 60] for i in range(4)], ring_size=1)
+    displays = backend.displays()
+    frame = backend.grab_display(displays[0])
+    image, gray = frame.image.copy(), frame.gray.copy()
+    # 他のディスプレイのグレースケール化もそれぞれの枠に書き込まれる
+    swept = [backend.grab_display(display, sweep=True).gray for display in displays[1:]]
+    assert len(swept) == 3
+    assert np.array_equal(frame.image, image)
+    assert np.array_equal(frame.gray, gray)
+    # 次のティックのキャプチャはリングの枠を使い回す
+    assert backend.grab_display(displays[0]).slot is frame.slot
+
+
+def test_static_screen_stops_matching(corpus):
+    manifest, frames = load_corpus(corpus)
+
+    def image(state):
+        return next(cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for entry, image in frames
+                    if entry['resolution'] == '1280x720' and entry['state'] == state)
+
+    # 色による事前判定を切り、変化検出だけで省略されることを確かめる
+    auto_accept = create_auto_accept(corpus, None, prefilter=False, overrides=OFFLINE_OVERRIDES)
+    auto_accept.capture.close()
+    try:
+        # ボタンの位置を ROI に覚えさせてから、変化のないロビー画面を見続ける
+        auto_accept.capture = MemoryBackend([image('ready_check')])
+        assert auto_accept.locate('accept_button', auto_accept.grab_frame()) is not None
+        auto_accept.capture = MemoryBackend([image('lobby')])
+        for _ in range(30):
+            assert auto_accept.locate('accept_button', auto_accept.grab_frame()) is None
+        # 最初の 1 回だけ照合し、ROI の全画面探索にも戻らない
+        stats = auto_accept.change_gate.stats()['accept_button']
+        assert stats['checks'] == 31
+        assert stats['skips'] == 29
+    finally:
+        auto_accept.close()
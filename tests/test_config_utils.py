@@ -0,0 +1,134 @@
+"""設定ファイルの読み込み・検証と、置き換えによる保存"""
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+import config_utils
+from config_utils import (
+    DEFAULT_CONFIG,
+    ConfigWatcher,
+    FrozenDict,
+    load_config,
+    validate_config,
+    write_atomic,
+)
+
+posix_only = pytest.mark.skipif(sys.platform == 'win32', reason='パーミッションは POSIX のみ')
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@posix_only
+def test_write_atomic_keeps_existing_mode(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text('{}', encoding='utf-8')
+    os.chmod(path, 0o640)
+    write_atomic(path, '{"a": 1}')
+    assert json.loads(path.read_text(encoding='utf-8')) == {'a': 1}
+    assert mode(path) == 0o640
+
+
+@posix_only
+def test_write_atomic_new_file_follows_umask(tmp_path):
+    path = tmp_path / 'roi_cache.json'
+    write_atomic(path, '{}')
+    assert mode(path) == 0o666 & ~config_utils._UMASK
+    # 認証キーのように明示したときだけ本人専用にする
+    key = tmp_path / 'daemon.key'
+    write_atomic(key, 'secret', mode=0o600)
+    assert mode(key) == 0o600
+    assert not [p for p in tmp_path.iterdir() if p.suffix == '.tmp']
+
+
+def test_invalid_config_falls_back_to_defaults(tmp_path, monkeypatch):
+    path = tmp_path / 'config.json'
+    text = json.dumps({'template_matching': {'confidence': 2}})
+    path.write_text(text, encoding='utf-8')
+    monkeypatch.setattr(config_utils, 'get_config_path', lambda: path)
+    config = load_config()
+    assert config == DEFAULT_CONFIG
+    # 利用者のファイルは上書きしない
+    assert path.read_text(encoding='utf-8') == text
+    # フォールバックはデフォルト設定の複製なので、書き換えてもデフォルトは変わらない
+    config['template_matching']['confidence'] = 0.5
+    assert DEFAULT_CONFIG['template_matching']['confidence'] == 0.7
+
+
+def test_valid_config_is_loaded(tmp_path, monkeypatch):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'template_matching': {'confidence': 0.8}}), encoding='utf-8')
+    monkeypatch.setattr(config_utils, 'get_config_path', lambda: path)
+    assert load_config()['template_matching']['confidence'] == 0.8
+
+
+@pytest.mark.parametrize('config, message', [
+    ({'template_matching': {'confidence': 1.5}}, 'confidence'),
+    ({'template_matching': {'scales': []}}, 'scales'),
+    ({'roi': {'max_misses': 0}}, 'roi.max_misses'),
+    ({'history': {'backups': -1}}, 'history.backups'),
+    ({'capture': {'replay_displays': [[0, 0, 100]]}}, 'capture.replay_displays'),
+    ({'metrics': {'prometheus_port': 70000}}, 'metrics.prometheus_port'),
+    ({'reload': {'enabled': 'yes'}}, 'reload.enabled'),
+    ({'scheduler': {'in_queue_sec': -1}}, 'scheduler.in_queue_sec'),
+    ({'images': {'matching_screen': 'matching.png'}}, 'accept_button'),
+    ({'verify': []}, 'verify'),
+])
+def test_validation_rejects_bad_values(config, message):
+    with pytest.raises(ValueError, match=message):
+        validate_config(config)
+
+
+def test_validation_accepts_defaults_and_partial_configs():
+    assert validate_config(json.loads(json.dumps(DEFAULT_CONFIG)))
+    # 古い config.json に無い項目はデフォルト値で補って確かめる
+    assert validate_config({'template_matching': {'confidence': 0.8}})
+
+
+def write_config(path, confidence):
+    # 更新時刻の分解能が粗いファイルシステムでも変更が分かるよう、大きさも変える
+    config = {'template_matching': {'confidence': confidence}, 'padding': 'x' * int(confidence * 100)}
+    write_atomic(path, json.dumps(config))
+
+
+def test_watcher_reports_valid_changes_and_skips_rejected_ones(tmp_path):
+    path = tmp_path / 'config.json'
+    write_config(path, 0.7)
+    received = []
+    accept = [True]
+
+    def on_change(config):
+        received.append(config)
+        return accept[0]
+
+    watcher = ConfigWatcher(on_change, path=path)
+    # 起動時の内容は読み込み済みとみなす
+    assert not watcher.check()
+
+    write_config(path, 0.8)
+    assert watcher.check()
+    assert isinstance(received[-1], FrozenDict)
+    assert received[-1]['template_matching']['confidence'] == 0.8
+    assert not watcher.check()
+
+    # 検証に通らない内容は通知せず、同じ内容では何度も読み直さない
+    write_config(path, 1.5)
+    assert not watcher.check()
+    assert watcher.rejected is not None
+    assert not watcher.check()
+    assert len(received) == 1
+
+    # 反映に失敗した（on_change が False を返した）場合も以前の設定のまま
+    accept[0] = False
+    write_config(path, 0.9)
+    assert not watcher.check()
+    assert len(received) == 2
+    assert not watcher.check()
+    assert len(received) == 2
+    accept[0] = True
+    assert watcher.check(force=True)
+    assert watcher.rejected is None
@@ -0,0 +1,119 @@
+"""常駐デーモンを同じプロセスで起動し、RemoteController から操作して待機中の負荷を確かめる"""
+import json
+import sys
+import threading
+import time
+
+import cv2
+import pytest
+from memory_report import MemoryBackend
+from run_benchmarks import OFFLINE_OVERRIDES, create_auto_accept, load_corpus
+
+import config_utils
+from controller import Controller
+from daemon import ControlServer
+from daemon_client import ControlClient, RemoteController, read_authkey
+
+# idle（監視・自動開始ともオフ）の CPU 予算。benchmarks/idle_budget.py の既定は 0.2% だが、
+# 測る時間が 2 秒と短く、状態の問い合わせの処理も含むので少し余裕を持たせる（実測 0.05% 程度）
+MAX_IDLE_CPU_PERCENT = 0.5
+MEASURE_SEC = 2.0
+
+
+def exit_off_main_thread(controller):
+    """GUI の無い exit はメインスレッドで sys.exit するので、デーモンと同じく別スレッドで呼ぶ"""
+    thread = threading.Thread(target=controller.exit)
+    thread.start()
+    thread.join(10)
+
+
+@pytest.fixture
+def daemon(corpus, tmp_path):
+    manifest, frames = load_corpus(corpus)
+    images = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for entry, image in frames
+              if entry['state'] == 'lobby' and entry['resolution'] == '1280x720'][:1]
+    auto_accept = create_auto_accept(corpus, None, overrides=OFFLINE_OVERRIDES)
+    auto_accept.capture.close()
+    auto_accept.capture = MemoryBackend(images)
+    controller = Controller(auto_accept)
+    if sys.platform == 'win32':
+        address = rf'\\.\pipe\lol_auto_accept_test_{tmp_path.name}'
+    else:
+        address = str(tmp_path / 'daemon.sock')
+    server = ControlServer(controller, address, tmp_path / 'daemon.key')
+    server.start()
+    assert controller.ready.wait(10)
+    yield server
+    exit_off_main_thread(controller)
+    server.close()
+
+
+def connect(server):
+    return RemoteController(ControlClient(server.address, read_authkey(server.key_path)))
+
+
+def measure(remote, seconds):
+    before = remote.status()
+    start = time.monotonic()
+    time.sleep(seconds)
+    after = remote.status()
+    elapsed = time.monotonic() - start
+    return after['captures'] - before['captures'], (after['cpu_sec'] - before['cpu_sec']) / elapsed * 100
+
+
+def test_remote_start_status_stop(daemon):
+    remote = connect(daemon)
+    try:
+        assert remote.ready.is_set()
+        assert remote.status()['monitoring'] is False
+        remote.start()
+        status = remote.status()
+        assert status['monitoring'] is True
+        assert 'accept_button' in status['detectors']
+        remote.stop()
+        status = remote.status()
+        assert status['monitoring'] is False
+        assert status['detectors'] == []
+    finally:
+        exit_off_main_thread(remote)
+
+
+def test_idle_daemon_does_not_capture(daemon):
+    remote = connect(daemon)
+    try:
+        remote.set_options(auto_start=False, auto_stop=False)
+        captures, cpu_percent = measure(remote, MEASURE_SEC)
+        assert captures == 0
+        assert cpu_percent <= MAX_IDLE_CPU_PERCENT
+        # 自動開始だけをオンにすると、画面が変わらないロビーでは待機中の間隔（1 秒）でしかキャプチャしない
+        remote.set_options(auto_start=True)
+        captures, _ = measure(remote, MEASURE_SEC)
+        assert 1 <= captures <= MEASURE_SEC + 1
+    finally:
+        exit_off_main_thread(remote)
+
+
+def test_remote_save_and_stats(daemon, tmp_path, monkeypatch):
+    # 接続した GUI には手元の設定が無いので、保存はデーモンが使っている設定で行う
+    path = tmp_path / 'config.json'
+    monkeypatch.setattr(config_utils, 'get_config_path', lambda: path)
+    remote = connect(daemon)
+    try:
+        assert remote.save_config() is True
+        saved = json.loads(path.read_text(encoding='utf-8'))
+        assert saved == json.loads(json.dumps(daemon.controller.auto_accept.config))
+        stats = remote.stats()
+        assert stats['metrics_enabled'] is False
+        assert isinstance(stats['metrics'], dict)
+    finally:
+        exit_off_main_thread(remote)
+
+
+def test_shutdown_exits_the_daemon(daemon):
+    remote = connect(daemon)
+    quit_seen = threading.Event()
+    remote.ui.subscribe(lambda kind, value: kind == 'quit' and quit_seen.set())
+    remote.client.request('shutdown')
+    assert daemon.controller.exited.wait(10)
+    assert quit_seen.wait(5)
+    assert remote.exited.is_set()
@@ -0,0 +1,38 @@
+"""履歴ファイルの追記とローテーション"""
+import json
+
+from history import EventLog
+
+MAX_BYTES = 200
+
+
+def write_events(path, backups, count=50):
+    log = EventLog()
+    log.configure(path, MAX_BYTES, backups)
+    for i in range(count):
+        log.record('click', x=i, y=i)
+    log.close()
+
+
+def newest_event(tmp_path):
+    # 最後の書き込みでちょうどずらした場合は、現在のファイルはまだ作られていない
+    path = tmp_path / 'history.jsonl'
+    if not path.exists():
+        path = tmp_path / 'history.1.jsonl'
+    return json.loads(path.read_text(encoding='utf-8').splitlines()[-1])
+
+
+def test_rotation_keeps_backups(tmp_path):
+    write_events(tmp_path / 'history.jsonl', backups=2)
+    names = {p.name for p in tmp_path.iterdir()}
+    assert {'history.1.jsonl', 'history.2.jsonl'} <= names <= {'history.jsonl', 'history.1.jsonl', 'history.2.jsonl'}
+    assert all(p.stat().st_size < MAX_BYTES * 2 for p in tmp_path.iterdir())
+    assert newest_event(tmp_path)['x'] == 49
+
+
+def test_rotation_without_backups_truncates(tmp_path):
+    path = tmp_path / 'history.jsonl'
+    write_events(path, backups=0)
+    # 古いファイルは作らず、現在のファイルも max_bytes を超えたら捨てる
+    assert {p.name for p in tmp_path.iterdir()} <= {'history.jsonl'}
+    assert not path.exists() or path.stat().st_size < MAX_BYTES
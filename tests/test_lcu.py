@@ -0,0 +1,68 @@
+"""クライアント API のクライアントと LcuWatcher を代用サーバー (lcu_mock) に対して動かす"""
+import threading
+import time
+
+import pytest
+
+from lcu import EVENTS, GAMEFLOW_URI, READY_CHECK_URI, LcuClient, LcuWatcher, read_lockfile
+from lcu_mock import MockLcuServer
+
+
+@pytest.fixture
+def mock_lcu(tmp_path):
+    mock = MockLcuServer().start(str(tmp_path / 'lockfile'))
+    yield mock
+    mock.stop()
+
+
+def wait_subscribed(mock, timeout=2.0):
+    """購読の要求はサーバー側で非同期に処理されるので、登録されるまで待つ"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with mock.lock:
+            if any(events >= set(EVENTS.values()) for _, events in mock.subscribers):
+                return
+        time.sleep(0.01)
+    raise AssertionError("購読が登録されませんでした")
+
+
+def test_client_requests_and_events(mock_lcu):
+    client = LcuClient(read_lockfile(mock_lcu.lockfile))
+    try:
+        assert client.gameflow_phase() == 'None'
+        assert client.ready_check() is None
+        client.connect()
+        wait_subscribed(mock_lcu)
+        mock_lcu.set_phase('Matchmaking')
+        assert client.receive(timeout=2) == (GAMEFLOW_URI, 'Update', 'Matchmaking')
+        mock_lcu.pop_ready_check()
+        assert client.receive(timeout=2)[:2] == (GAMEFLOW_URI, 'Update')
+        uri, event_type, data = client.receive(timeout=2)
+        assert (uri, event_type, data['state']) == (READY_CHECK_URI, 'Create', 'InProgress')
+        client.accept()
+        assert mock_lcu.accepts == 1
+        assert client.ready_check()['playerResponse'] == 'Accepted'
+    finally:
+        client.close()
+
+
+def test_watcher_accepts_ready_check_in_progress(mock_lcu):
+    # 接続前に始まっていたレディチェックも接続時の問い合わせで承認する
+    mock_lcu.set_phase('Matchmaking')
+    mock_lcu.pop_ready_check()
+    phases = []
+    accepted = threading.Event()
+    config = {'lcu': {'enabled': True, 'lockfile': mock_lcu.lockfile, 'retry_sec': 0.05}}
+
+    def on_ready_check(data):
+        if data.get('playerResponse') == 'None' and watcher.accept():
+            accepted.set()
+
+    watcher = LcuWatcher(config, on_ready_check=on_ready_check, on_phase=phases.append)
+    watcher.start()
+    try:
+        assert accepted.wait(5)
+        assert mock_lcu.accepts == 1
+        assert phases == ['ReadyCheck']
+    finally:
+        watcher.stop()
@@ -0,0 +1,51 @@
+"""スキャンを繰り返してもメモリを確保し続けないことを tracemalloc で確認する"""
+import tracemalloc
+
+import cv2
+from memory_report import MemoryBackend
+from run_benchmarks import BENCH_DIR, DETECTORS, create_auto_accept, load_corpus
+
+SCANS = 10000
+RESOLUTION = '1024x576'
+# 1024x576 のグレースケール 1 枚で 576KB。フレームを 1 枚でも確保し直せばこれを超える
+MAX_SCAN_PEAK_KB = 256
+# 1 スキャンにつき 1 個でもオブジェクトが残れば 10,000 スキャンでこれを超える
+MAX_GROWTH_KB = 64
+
+
+def test_scans_do_not_allocate_frames_or_grow(corpus):
+    manifest, frames = load_corpus(corpus)
+    images = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for entry, image in frames
+              if entry['resolution'] == RESOLUTION]
+    auto_accept = create_auto_accept(corpus, None, overrides={'history': {'enabled': False}})
+    auto_accept.capture.close()
+    auto_accept.capture = MemoryBackend(images)
+
+    def scan():
+        auto_accept.detect_all(auto_accept.grab_frame(), DETECTORS)
+
+    # バッファやテンプレートのキャッシュが一通り確保されるまで回してから測る
+    for _ in range(len(images) * 2):
+        scan()
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.take_snapshot()
+        max_peak_kb = 0
+        for _ in range(SCANS):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            scan()
+            max_peak_kb = max(max_peak_kb, (tracemalloc.get_traced_memory()[1] - before) / 1024)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        auto_accept.close()
+
+    # 測定側（このファイルや tracemalloc 自身）の確保は数えない
+    source = str(BENCH_DIR.parent / 'src' / '*')
+    growth = snapshot.filter_traces([tracemalloc.Filter(True, source)]).compare_to(
+        baseline.filter_traces([tracemalloc.Filter(True, source)]), 'lineno')
+    growth_kb = sum(stat.size_diff for stat in growth) / 1024
+    assert max_peak_kb <= MAX_SCAN_PEAK_KB
+    assert growth_kb <= MAX_GROWTH_KB, [str(stat) for stat in growth[:5]]
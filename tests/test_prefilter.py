@@ -0,0 +1,72 @@
+"""色の署名による事前判定が、写っていない画面を除外し、写っている画面を除外しないこと"""
+import cv2
+import numpy as np
+import pytest
+from run_benchmarks import BENCH_DIR
+
+from capture import Frame
+from prefilter import ColorPrefilter
+from templates import TemplateRegistry
+
+CONFIG = {'images': {'accept_button': 'accept_button.png'}, 'template_pack': {'enabled': False}}
+MIN_SCALE = 0.8
+
+
+@pytest.fixture(scope='module')
+def template():
+    return TemplateRegistry(CONFIG, str(BENCH_DIR.parent)).get('accept_button')
+
+
+def screen(template=None, scale=1.0, at=(400, 500), tone=30):
+    """暗い灰色の 1280x720 の画面。template を渡すとその色の画像を scale 倍で at に貼る"""
+    image = np.full((720, 1280, 3), tone, np.uint8)
+    box = None
+    if template is not None:
+        button = cv2.cvtColor(template.color, cv2.COLOR_BGR2RGB)
+        if scale != 1.0:
+            button = cv2.resize(button, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        x, y = at
+        h, w = button.shape[:2]
+        image[y:y + h, x:x + w] = button
+        box = (x, y, w, h)
+    return Frame(image), box
+
+
+def test_frames_without_the_signature_colour_are_rejected(template):
+    prefilter = ColorPrefilter()
+    for tone in (0, 30, 128, 220):
+        frame, _ = screen(tone=tone)
+        assert not prefilter.check(template, frame, None, MIN_SCALE)
+    assert prefilter.stats()['accept_button']['reject_ratio'] == 1.0
+
+
+@pytest.mark.parametrize('scale', [MIN_SCALE, 1.0, 1.5])
+def test_frames_with_the_button_are_never_rejected(template, scale):
+    prefilter = ColorPrefilter()
+    frame, box = screen(template, scale)
+    assert prefilter.check(template, frame, None, MIN_SCALE)
+    # 探索範囲をボタンの周辺に絞っても除外しない
+    x, y, w, h = box
+    assert prefilter.check(template, frame, (x - 40, y - 40, x + w + 40, y + h + 40), MIN_SCALE)
+    assert prefilter.stats()['accept_button']['rejects'] == 0
+
+
+def test_sentinels_at_the_last_position_skip_the_histogram(template):
+    prefilter = ColorPrefilter()
+    frame, box = screen(template)
+    assert prefilter.check(template, frame, None, MIN_SCALE, box)
+    assert prefilter.stats()['accept_button']['probe_passes'] == 1
+    # ボタンが消えた画面では歩哨画素が外れ、ヒストグラムでも除外される
+    empty, _ = screen()
+    assert not prefilter.check(template, empty, None, MIN_SCALE, box)
+    assert prefilter.stats()['accept_button']['probe_passes'] == 1
+
+
+def test_templates_without_distinct_colours_are_always_checked(template):
+    prefilter = ColorPrefilter()
+    flat = TemplateRegistry(CONFIG, str(BENCH_DIR.parent)).get('accept_button')
+    flat.color = np.full_like(template.color, 128)
+    flat.signature = None
+    frame, _ = screen()
+    assert prefilter.signature(flat) is None
+    assert prefilter.check(flat, frame, None, MIN_SCALE)
@@ -0,0 +1,59 @@
+"""設定の反映は全部成功するか、何も変えないか"""
+import json
+
+import pytest
+from run_benchmarks import OFFLINE_OVERRIDES, create_auto_accept
+
+from config_utils import ConfigWatcher, write_atomic
+from controller import Controller
+
+
+@pytest.fixture
+def auto_accept(corpus):
+    auto_accept = create_auto_accept(corpus, None, overrides=OFFLINE_OVERRIDES)
+    yield auto_accept
+    auto_accept.close()
+
+
+def changed(auto_accept, **capture):
+    """confidence と変化検出を変え、capture を上書きした設定"""
+    config = json.loads(json.dumps(auto_accept.config))
+    config['template_matching']['confidence'] = 0.9
+    config['change_gate']['enabled'] = False
+    config['capture'].update(capture)
+    return config
+
+
+def test_failed_update_keeps_every_previous_setting(auto_accept, tmp_path):
+    before = (auto_accept.config, auto_accept.confidence, auto_accept.capture, auto_accept.change_gate)
+    # キャプチャ方式の作成が失敗するので、それより前に決まった値も反映しない
+    bad = changed(auto_accept, replay_path=str(tmp_path / 'missing'))
+    auto_accept.publish_config(bad)
+    assert auto_accept.apply_published_config() is False
+    assert (auto_accept.config, auto_accept.confidence, auto_accept.capture, auto_accept.change_gate) == before
+    # 公開された設定も元に戻り、次のティックで反映し直さない
+    assert auto_accept.published_config is auto_accept.config
+
+    auto_accept.publish_config(changed(auto_accept))
+    assert auto_accept.apply_published_config() is True
+    assert auto_accept.confidence == 0.9
+    assert auto_accept.change_gate is None
+
+
+def test_reload_through_watcher_and_controller(auto_accept, tmp_path):
+    controller = Controller(auto_accept, threaded=False)
+    path = tmp_path / 'config.json'
+    write_atomic(path, json.dumps(auto_accept.config))
+    messages = []
+    controller.ui.subscribe(lambda kind, value: messages.append((kind, value)))
+    watcher = ConfigWatcher(controller._on_config_change, path=path)
+
+    write_atomic(path, json.dumps(changed(auto_accept, replay_path=str(tmp_path / 'missing'))))
+    assert not watcher.check()
+    assert auto_accept.confidence != 0.9
+    assert watcher.rejected is not None
+
+    write_atomic(path, json.dumps(changed(auto_accept)))
+    assert watcher.check()
+    assert auto_accept.confidence == 0.9
+    assert messages == [('config', False), ('config', True)]
@@ -0,0 +1,59 @@
+"""ROI の記憶と、見つからない状態が続いたときの全画面探索への戻り"""
+from roi import RoiStore
+
+
+def test_no_region_before_the_first_hit():
+    store = RoiStore(None)
+    assert store.search_region('accept_button', 1280, 720) is None
+    assert store.last_box('accept_button', 1280, 720) is None
+
+
+def test_hit_gives_a_padded_region_clipped_to_the_frame():
+    store = RoiStore(None, padding=40)
+    store.record_hit('accept_button', 1280, 720, (500, 400, 200, 60))
+    assert store.search_region('accept_button', 1280, 720) == (460, 360, 740, 500)
+    store.record_hit('accept_button', 1280, 720, (10, 680, 1260, 30))
+    assert store.search_region('accept_button', 1280, 720) == (0, 640, 1280, 720)
+
+
+def test_regions_are_kept_per_resolution():
+    store = RoiStore(None)
+    store.record_hit('accept_button', 1280, 720, (500, 400, 200, 60))
+    assert store.search_region('accept_button', 1920, 1080) is None
+    assert store.last_box('accept_button', 1280, 720) == [500, 400, 200, 60]
+
+
+def test_repeated_misses_fall_back_to_the_full_screen_once():
+    store = RoiStore(None, max_misses=3)
+    store.record_hit('accept_button', 1280, 720, (500, 400, 200, 60))
+    for _ in range(2):
+        store.record_miss('accept_button')
+    assert store.search_region('accept_button', 1280, 720) is not None
+    store.record_miss('accept_button')
+    assert store.search_region('accept_button', 1280, 720) is None
+    # 全画面を一度探したら回数を数え直し、記憶した範囲に戻る
+    assert store.search_region('accept_button', 1280, 720) is not None
+
+
+def test_hit_resets_the_miss_count():
+    store = RoiStore(None, max_misses=2)
+    store.record_hit('accept_button', 1280, 720, (500, 400, 200, 60))
+    store.record_miss('accept_button')
+    store.record_hit('accept_button', 1280, 720, (500, 400, 200, 60))
+    store.record_miss('accept_button')
+    assert store.search_region('accept_button', 1280, 720) is not None
+
+
+def test_regions_survive_a_restart(tmp_path):
+    path = tmp_path / 'roi.json'
+    RoiStore(path).record_hit('accept_button', 1280, 720, (500, 400, 200, 60))
+    assert path.exists()
+    assert list(tmp_path.iterdir()) == [path]
+    restored = RoiStore(path)
+    assert restored.last_box('accept_button', 1280, 720) == [500, 400, 200, 60]
+
+
+def test_broken_file_starts_empty(tmp_path):
+    path = tmp_path / 'roi.json'
+    path.write_text('{broken', encoding='utf-8')
+    assert RoiStore(path).regions == {}
@@ -0,0 +1,96 @@
+"""検出結果によるスケジューラの状態遷移と、エラー時のバックオフ"""
+import pytest
+
+from scheduler import IDLE, IN_QUEUE, POST_ACCEPT, READY_CHECK, VERIFYING, Scheduler
+
+CONFIG = {
+    'template_matching': {'interval_sec': 1.0},
+    'scheduler': {'in_queue_sec': 0.25, 'ready_check_sec': 0.1, 'post_accept_sec': 3.0, 'backoff_max_sec': 30.0},
+    'verify': {'interval_sec': 0.05},
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    return Scheduler(CONFIG, clock=clock)
+
+
+def test_state_follows_what_is_on_screen(scheduler):
+    assert scheduler.state == IDLE
+    assert scheduler.next_delay() == 1.0
+    scheduler.observe(queue=True)
+    assert scheduler.state == IN_QUEUE
+    assert scheduler.next_delay() == 0.25
+    # ボタンはマッチング画面より優先する。確かめていない方 (None) は前回の結果を使う
+    scheduler.observe(button=True)
+    assert scheduler.state == READY_CHECK
+    assert scheduler.next_delay() == 0.1
+    scheduler.observe(queue=False)
+    assert scheduler.state == READY_CHECK
+    scheduler.observe(button=False)
+    assert scheduler.state == IDLE
+
+
+def test_verifying_keeps_its_interval_until_decided(scheduler):
+    scheduler.observe(button=True)
+    scheduler.set_state(VERIFYING)
+    assert scheduler.verifying()
+    assert scheduler.next_delay() == 0.05
+    # 確認中はマッチング画面の検出結果で状態を変えない
+    scheduler.observe(queue=True)
+    assert scheduler.state == VERIFYING
+
+
+def test_post_accept_pauses_then_returns_to_observed_state(scheduler, clock):
+    scheduler.set_state(POST_ACCEPT)
+    assert scheduler.paused()
+    assert scheduler.next_delay() == 3.0
+    scheduler.observe(queue=True)
+    assert scheduler.state == POST_ACCEPT
+    clock.now = 1.0
+    assert scheduler.next_delay() == 2.0
+    clock.now = 3.5
+    assert not scheduler.paused()
+    # 待機が終わったら、待機中に見えていたもの（マッチング画面）から状態を決める
+    assert scheduler.next_delay() == 0.25
+    assert scheduler.state == IN_QUEUE
+
+
+def test_set_state_forgets_previous_observations(scheduler, clock):
+    scheduler.observe(queue=True, button=True)
+    scheduler.set_state(POST_ACCEPT)
+    clock.now = 3.5
+    # 承認前に見えていたボタンで ready_check に戻らない
+    assert scheduler.next_delay() == 1.0
+    assert scheduler.state == IDLE
+
+
+def test_errors_back_off_exponentially_up_to_the_limit(scheduler):
+    scheduler.observe(queue=True)
+    scheduler.on_error()
+    assert scheduler.next_delay() == 0.5
+    scheduler.on_error()
+    assert scheduler.next_delay() == 1.0
+    for _ in range(20):
+        scheduler.on_error()
+    assert scheduler.next_delay() == 30.0
+    scheduler.on_success()
+    assert scheduler.next_delay() == 0.25
+
+
+def test_configure_changes_intervals(scheduler):
+    scheduler.configure({**CONFIG, 'template_matching': {'interval_sec': 2.0}})
+    assert scheduler.next_delay() == 2.0
@@ -0,0 +1,55 @@
+"""テンプレートの取得とテンプレートパックの更新確認"""
+from run_benchmarks import BENCH_DIR
+
+from templates import TemplateRegistry
+
+CONFIG = {'images': {'accept_button': 'accept_button.png'}, 'template_pack': {'enabled': False}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingPack:
+    """stale() の呼び出しを数えるだけのパック"""
+
+    digest = 'fake'
+
+    def __init__(self, template):
+        self.templates = {'accept_button': template}
+        self.stale_checks = 0
+
+    def covers(self, name, file):
+        return True
+
+    def get(self, name):
+        return self.templates[name]
+
+    def stale(self):
+        self.stale_checks += 1
+        return False
+
+
+def test_pack_staleness_is_checked_at_most_once_per_interval():
+    clock = Clock()
+    registry = TemplateRegistry(CONFIG, str(BENCH_DIR.parent), check_interval_sec=1.0, clock=clock)
+    pack = CountingPack(registry.get('accept_button'))
+    registry.pack = pack
+    # スキャンのたびにテンプレートを取得しても、ファイルの確認は間隔ごとに 1 回
+    for _ in range(100):
+        assert registry.get('accept_button') is pack.templates['accept_button']
+    assert pack.stale_checks == 1
+    clock.now += 0.5
+    registry.get('accept_button')
+    assert pack.stale_checks == 1
+    clock.now += 0.5
+    registry.get('accept_button')
+    assert pack.stale_checks == 2
+    # 設定を差し替えたらすぐに確かめ直す
+    registry.apply(CONFIG, pack)
+    registry.get('accept_button')
+    assert pack.stale_checks == 3
@@ -0,0 +1,105 @@
+"""クリック後の確認をティックに分けて進め、コアループを待たせないこと"""
+import threading
+
+import cv2
+from memory_report import MemoryBackend
+from run_benchmarks import OFFLINE_OVERRIDES, create_auto_accept, load_corpus
+
+from core_loop import CoreLoop
+from scheduler import POST_ACCEPT, VERIFYING
+from verify import ClickVerifier
+
+VERIFY = {'verify': {'window_sec': 2.0, 'interval_sec': 0.05, 'retry_sec': 0.3,
+                     'max_clicks': 3, 'confirm_misses': 2}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_verifier():
+    clock = Clock()
+    clicks = []
+    return ClickVerifier(VERIFY, click=clicks.append, clock=clock), clock, clicks
+
+
+def test_verifier_retries_until_the_button_disappears():
+    verifier, clock, clicks = make_verifier()
+    verifier.begin((10, 20))
+    assert clicks == [(10, 20)]
+    clock.now = 0.1
+    assert verifier.check(lambda: True) is None
+    # retry_sec を過ぎてもボタンが残っていればクリックし直す
+    clock.now = 0.4
+    assert verifier.check(lambda: True) is None
+    assert len(clicks) == 2
+    clock.now = 0.45
+    assert verifier.check(lambda: False) is None
+    clock.now = 0.5
+    result = verifier.check(lambda: False)
+    assert result.confirmed and result.clicks == 2
+    assert verifier.pending is None
+
+
+def test_verifier_gives_up_after_the_window():
+    verifier, clock, clicks = make_verifier()
+    verifier.begin((10, 20))
+    result = None
+    while result is None:
+        clock.now += 0.05
+        result = verifier.check(lambda: True)
+    assert not result.confirmed
+    assert result.clicks == 3 == len(clicks)
+    assert clock.now >= 2.0
+
+
+def test_scan_frame_returns_while_verifying(corpus):
+    manifest, frames = load_corpus(corpus)
+
+    def image(state):
+        return next(cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for entry, image in frames
+                    if entry['resolution'] == '1280x720' and entry['state'] == state)
+
+    auto_accept = create_auto_accept(corpus, None, overrides={**OFFLINE_OVERRIDES, **VERIFY})
+    auto_accept.capture.close()
+    try:
+        auto_accept.capture = MemoryBackend([image('ready_check')])
+        # クリックしたら待たずに戻り、次のティックまでの間隔は確認の間隔になる
+        assert not auto_accept.scan_frame(auto_accept.grab_frame())
+        assert auto_accept.scheduler.state == VERIFYING
+        assert auto_accept.scheduler.next_delay() == 0.05
+        # 確認中はスキャン済みのフレームのボタンの周辺だけを見る
+        auto_accept.capture = MemoryBackend([image('champ_select')])
+        assert not auto_accept.scan_frame(auto_accept.grab_frame())
+        assert auto_accept.scan_frame(auto_accept.grab_frame())
+        assert auto_accept.scheduler.state == POST_ACCEPT
+    finally:
+        auto_accept.close()
+
+
+def test_offload_keeps_the_loop_responsive():
+    core = CoreLoop()
+    core.start()
+    release = threading.Event()
+    results = []
+    delivered = threading.Event()
+
+    def deliver(result):
+        results.append((result, threading.current_thread() is core.thread))
+        delivered.set()
+
+    try:
+        core.offload(lambda: release.wait(5) and 'accepted', deliver)
+        # ブロックする処理の実行中もループは他の依頼を処理できる
+        assert core.run(lambda: 'tick', timeout=1) == 'tick'
+        assert not delivered.is_set()
+        release.set()
+        assert delivered.wait(5)
+        # 結果はループのスレッドで受け取る
+        assert results == [('accepted', True)]
+    finally:
+        core.stop()